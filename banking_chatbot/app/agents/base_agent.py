@@ -1,6 +1,8 @@
 
 
+import asyncio
 import json
+import logging
 from typing import List
 from autogen_core import RoutedAgent, message_handler, MessageContext, FunctionCall
 from autogen_core.models import (
@@ -16,7 +18,19 @@ from autogen_core.tools import Tool
 
 from autogen_core import TopicId
 
-from app.messages.message_types import UserTask, AgentResponse
+from app.messages.message_types import (
+    UserTask,
+    AgentResponse,
+    AgentResponseDelta,
+    ProgressEvent,
+    SpeculativeTask,
+    SpeculativeResult,
+)
+from app.runtime.deadline import DEGRADED_REPLY, TurnDeadline
+from app.model_clients.circuit_breaker import UNAVAILABLE_REPLY, CircuitOpenError
+from app.model_clients.request_context import request_scope
+
+logger = logging.getLogger(__name__)
 
 
 class BankingAIAgent(RoutedAgent):
@@ -29,6 +43,12 @@ class BankingAIAgent(RoutedAgent):
         delegate_tools: List[Tool],
         my_topic_type: str,
         user_topic_type: str,
+        max_parallel_tool_calls: int = 4,
+        tool_call_timeout: float = 30.0,
+        context_budget=None,
+        stream_responses: bool = False,
+        max_tool_iterations: int = 5,
+        read_only_tools: List[str] = None,
     ) -> None:
         super().__init__(agent_type)
 
@@ -46,38 +66,79 @@ class BankingAIAgent(RoutedAgent):
         self._my_topic_type = my_topic_type
         self._user_topic_type = user_topic_type
 
+        self._speculation = None
+
+        self._tool_call_semaphore = asyncio.Semaphore(max_parallel_tool_calls)
+        self._tool_call_timeout = tool_call_timeout
+        # Only these may run concurrently or be timed out; any other tool is
+        # assumed to change state.
+        self._read_only_tools = set(read_only_tools or [])
+
+        self._context_budget = context_budget
+        self._stream_responses = stream_responses
+        self._max_tool_iterations = max_tool_iterations
+
     @message_handler
     async def handle_task(self, message: UserTask, ctx: MessageContext) -> None:
-       
-        llm_result = await self._model_client.create(
-            messages=[self._system_message] + message.context,
-            tools=self._tool_schema + self._delegate_tool_schema,
-            cancellation_token=ctx.cancellation_token,
-        )
-        print(f"\n*** {self.id.type} initial LLM response ***\n{llm_result.content}", flush=True)
+        # Model calls made while handling the task are accounted to this session and hop.
+        with request_scope(ctx.topic_id.source, message.hop):
+            await self._handle_task(message, ctx)
 
-        
+    async def _handle_task(self, message: UserTask, ctx: MessageContext) -> None:
+        session_id = ctx.topic_id.source
+        deadline = TurnDeadline(message.deadline)
+        if deadline.expired():
+            await self._publish_degraded_reply(message, session_id, "turn deadline passed before the agent started")
+            return
+        token = deadline.link(ctx.cancellation_token)
+        try:
+            llm_result = await self._run_tool_loop(message, token, session_id)
+        except asyncio.CancelledError:
+            if not deadline.expired():
+                raise
+            await self._publish_degraded_reply(message, session_id, "turn deadline exceeded")
+            return
+        except CircuitOpenError as e:
+            await self._publish_degraded_reply(message, session_id, str(e), UNAVAILABLE_REPLY)
+            return
+        except Exception as e:
+            await self._publish_degraded_reply(message, session_id, f"model call failed: {e!r}", UNAVAILABLE_REPLY)
+            return
+        finally:
+            deadline.close()
+
+        if llm_result is None:
+            await self._publish_degraded_reply(
+                message, session_id, f"tool loop hit the {self._max_tool_iterations} iteration cap"
+            )
+            return
+
+        assert isinstance(llm_result.content, str)
+        message.context.append(AssistantMessage(content=llm_result.content, source=self.id.type))
+
+        await self.publish_message(
+    AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
+    topic_id=TopicId(self._user_topic_type, session_id),
+)
+
+    async def _run_tool_loop(self, message: UserTask, cancellation_token, session_id: str):
+        # Returns the final text result, or None if the model is still asking for
+        # tools after max_tool_iterations rounds.
+        llm_result = await self._first_llm_result(message.context, cancellation_token, session_id)
+        logger.debug("%s initial LLM response: %s", self.id.type, llm_result.content)
+
+        iterations = 0
         while (
-            isinstance(llm_result.content, list) 
+            isinstance(llm_result.content, list)
+            and llm_result.content
             and all(isinstance(m, FunctionCall) for m in llm_result.content)
         ):
-            tool_call_results: List[FunctionExecutionResult] = []
-
+            iterations += 1
+            if iterations > self._max_tool_iterations:
+                return None
             for call in llm_result.content:
-                arguments = json.loads(call.arguments)
-                if call.name in self._tools:
-                    
-                    result = await self._tools[call.name].run_json(arguments, ctx.cancellation_token)
-                    tool_call_results.append(
-                        FunctionExecutionResult(
-                            call_id=call.id,
-                            content=self._tools[call.name].return_value_as_string(result),
-                            is_error=False,
-                            name=call.name
-                        )
-                    )
-                else:
-                    raise ValueError(f"Unexpected tool called: {call.name}")
+                await self._report_progress(f"calling_tool:{call.name}", session_id)
+            tool_call_results = await self._execute_tool_calls(llm_result.content, cancellation_token)
 
             
             message.context.extend([
@@ -85,18 +146,138 @@ class BankingAIAgent(RoutedAgent):
                 FunctionExecutionResultMessage(content=tool_call_results),
             ])
 
-            llm_result = await self._model_client.create(
-                messages=[self._system_message] + message.context,
+            llm_result = await self._create(message.context, cancellation_token, session_id)
+            logger.debug("%s subsequent LLM response: %s", self.id.type, llm_result.content)
+        return llm_result
+
+    async def _publish_degraded_reply(self, message: UserTask, session_id: str, reason: str, reply: str = DEGRADED_REPLY):
+        print(f"[{self.id.type}] Sending degraded reply: {reason}", flush=True)
+        message.context.append(AssistantMessage(content=reply, source=self.id.type))
+        await self.publish_message(
+            AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
+            topic_id=TopicId(self._user_topic_type, session_id),
+        )
+
+    async def _report_progress(self, stage: str, session_id: str):
+        await self.publish_message(ProgressEvent(stage=stage), topic_id=TopicId(self._user_topic_type, session_id))
+
+    async def _execute_tool_calls(self, calls: List[FunctionCall], cancellation_token) -> List[FunctionExecutionResult]:
+        # Consecutive read-only calls run concurrently (bounded by the semaphore);
+        # a state-changing call waits for everything before it and runs alone, so
+        # the model's order is kept wherever it can matter.
+        results = []
+        reads = []
+        for call in calls:
+            if call.name in self._read_only_tools:
+                reads.append(call)
+                continue
+            results += await asyncio.gather(*(self._execute_tool_call(c, cancellation_token) for c in reads))
+            reads = []
+            results.append(await self._execute_tool_call(call, cancellation_token))
+        results += await asyncio.gather(*(self._execute_tool_call(c, cancellation_token) for c in reads))
+        return results
+
+    async def _execute_tool_call(self, call: FunctionCall, cancellation_token) -> FunctionExecutionResult:
+        if call.name not in self._tools:
+            return FunctionExecutionResult(
+                call_id=call.id, content=f"Error: unexpected tool called: {call.name}", is_error=True, name=call.name
+            )
+        tool = self._tools[call.name]
+        # A timed-out write may still land, so state-changing tools are not timed out.
+        timeout = self._tool_call_timeout if call.name in self._read_only_tools else None
+        async with self._tool_call_semaphore:
+            try:
+                arguments = json.loads(call.arguments)
+                result = await asyncio.wait_for(tool.run_json(arguments, cancellation_token), timeout=timeout)
+            except asyncio.TimeoutError:
+                print(f"[{self.id.type}] Tool {call.name} timed out after {self._tool_call_timeout}s", flush=True)
+                return FunctionExecutionResult(
+                    call_id=call.id,
+                    content=f"Error: {call.name} timed out after {self._tool_call_timeout} seconds.",
+                    is_error=True,
+                    name=call.name,
+                )
+            except Exception as e:
+                print(f"[{self.id.type}] Tool {call.name} failed: {e}", flush=True)
+                return FunctionExecutionResult(
+                    call_id=call.id, content=f"Error: {e}", is_error=True, name=call.name
+                )
+        return FunctionExecutionResult(
+            call_id=call.id,
+            content=tool.return_value_as_string(result),
+            is_error=False,
+            name=call.name
+        )
+
+    @message_handler
+    async def handle_speculative_task(self, message: SpeculativeTask, ctx: MessageContext) -> SpeculativeResult:
+        # Runs the first LLM call for a handoff the classifier has not confirmed yet.
+        # If the matching UserTask arrives, handle_task picks up this result instead
+        # of calling the model again; otherwise the classifier cancels ctx.cancellation_token.
+        with request_scope(self.id.key, message.hop):
+            task = asyncio.ensure_future(self._create(message.context, ctx.cancellation_token))
+        self._speculation = (self._speculation_key(message.context), task)
+        llm_result = await task
+        return SpeculativeResult(
+            prompt_tokens=llm_result.usage.prompt_tokens,
+            completion_tokens=llm_result.usage.completion_tokens,
+        )
+
+    async def _create(self, context: List[LLMMessage], cancellation_token, session_id: str = None):
+        # With a session to stream to, text chunks go to the user as they arrive;
+        # the caller still gets the complete CreateResult and appends it once.
+        # include_usage makes the stream end with real token counts, which the
+        # usage ledger and the rate limiter's token refund rely on.
+        if not self._stream_responses or session_id is None:
+            return await self._model_client.create(
+                messages=self._llm_messages(context),
                 tools=self._tool_schema + self._delegate_tool_schema,
-                cancellation_token=ctx.cancellation_token,
+                cancellation_token=cancellation_token,
             )
-            print(f"\n*** {self.id.type} subsequent LLM response ***\n{llm_result.content}", flush=True)
+        llm_result = None
+        deltas = []
+        async for chunk in self._model_client.create_stream(
+            messages=self._llm_messages(context),
+            tools=self._tool_schema + self._delegate_tool_schema,
+            extra_create_args={"stream_options": {"include_usage": True}},
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, str):
+                if chunk:
+                    deltas.append(chunk)
+                    await self.publish_message(
+                        AgentResponseDelta(reply_to_topic_type=self._my_topic_type, delta=chunk),
+                        topic_id=TopicId(self._user_topic_type, session_id),
+                    )
+            else:
+                llm_result = chunk
+        if llm_result is not None and llm_result.content == []:
+            # The OpenAI client returns content=[] when the text came in a single
+            # delta; rebuild it from what was streamed.
+            llm_result = llm_result.model_copy(update={"content": "".join(deltas)})
+        return llm_result
 
-        
-        assert isinstance(llm_result.content, str)
-        message.context.append(AssistantMessage(content=llm_result.content, source=self.id.type))
+    def _llm_messages(self, context: List[LLMMessage]) -> List[LLMMessage]:
+        if self._context_budget is None:
+            return [self._system_message] + context
+        return self._context_budget.fit(self.id.type, self._system_message, context)
 
-        await self.publish_message(
-    AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
-    topic_id=TopicId(self._user_topic_type, ctx.topic_id.source),
-)
+    async def _first_llm_result(self, context: List[LLMMessage], cancellation_token, session_id: str = None):
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None and speculation[0] == self._speculation_key(context):
+            key, task = speculation
+            # The speculation was started under the classifier's token; tie it
+            # to this turn's token too so the deadline cancels it.
+            if cancellation_token is not None:
+                cancellation_token.link_future(task)
+            await asyncio.wait([task])
+            if cancellation_token is not None and cancellation_token.is_cancelled():
+                raise asyncio.CancelledError()
+            if not task.cancelled() and task.exception() is None:
+                print(f"[{self.id.type}] Using speculative LLM result", flush=True)
+                return task.result()
+        return await self._create(context, cancellation_token, session_id)
+
+    @staticmethod
+    def _speculation_key(context: List[LLMMessage]):
+        return len(context), tuple(str(m.content) for m in context[-3:])
@@ -8,7 +8,7 @@ from app.tools.transaction_tools import check_balance_tool, make_payment_tool
 from app.agents.retail_sub_agents import CheckBalanceAgent, MakePaymentAgent
 from app.agents.retail_banking_agent import RetailBankingAgent
 
-async def register_retail_banking_agent(runtime, model_client: ChatCompletionClient):
+async def register_retail_banking_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await RetailBankingAgent.register(
         runtime,
         type="RetailBanking",
@@ -25,6 +25,7 @@ async def register_retail_banking_agent(runtime, model_client: ChatCompletionCli
                 )
             ),
             model_client=model_client,
+            **agent_options,
         )
     )
     
@@ -55,7 +56,7 @@ async def register_make_payment_agent(runtime, model_client):
     )
 
 
-async def register_corporate_banking_agent(runtime, model_client: ChatCompletionClient):
+async def register_corporate_banking_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="CorporateBanking",
@@ -69,6 +70,7 @@ async def register_corporate_banking_agent(runtime, model_client: ChatCompletion
             delegate_tools=[],
             my_topic_type="CorporateBanking",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
@@ -76,7 +78,7 @@ async def register_corporate_banking_agent(runtime, model_client: ChatCompletion
     )
 
 
-async def register_investment_banking_agent(runtime, model_client: ChatCompletionClient):
+async def register_investment_banking_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="InvestmentBanking",
@@ -90,6 +92,7 @@ async def register_investment_banking_agent(runtime, model_client: ChatCompletio
             delegate_tools=[],
             my_topic_type="InvestmentBanking",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
@@ -97,7 +100,7 @@ async def register_investment_banking_agent(runtime, model_client: ChatCompletio
     )
 
 
-async def register_wealth_management_agent(runtime, model_client: ChatCompletionClient):
+async def register_wealth_management_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="WealthManagement",
@@ -111,6 +114,7 @@ async def register_wealth_management_agent(runtime, model_client: ChatCompletion
             delegate_tools=[],
             my_topic_type="WealthManagement",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
@@ -118,7 +122,7 @@ async def register_wealth_management_agent(runtime, model_client: ChatCompletion
     )
 
 
-async def register_risk_management_agent(runtime, model_client: ChatCompletionClient):
+async def register_risk_management_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="RiskManagement",
@@ -132,6 +136,7 @@ async def register_risk_management_agent(runtime, model_client: ChatCompletionCl
             delegate_tools=[],
             my_topic_type="RiskManagement",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
@@ -139,7 +144,7 @@ async def register_risk_management_agent(runtime, model_client: ChatCompletionCl
     )
 
 
-async def register_insurance_agent(runtime, model_client: ChatCompletionClient):
+async def register_insurance_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="Insurance",
@@ -153,6 +158,7 @@ async def register_insurance_agent(runtime, model_client: ChatCompletionClient):
             delegate_tools=[],
             my_topic_type="Insurance",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
@@ -160,7 +166,7 @@ async def register_insurance_agent(runtime, model_client: ChatCompletionClient):
     )
 
 
-async def register_it_ops_agent(runtime, model_client: ChatCompletionClient):
+async def register_it_ops_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="ITOps",
@@ -174,6 +180,7 @@ async def register_it_ops_agent(runtime, model_client: ChatCompletionClient):
             delegate_tools=[],
             my_topic_type="ITOps",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
@@ -181,7 +188,7 @@ async def register_it_ops_agent(runtime, model_client: ChatCompletionClient):
     )
 
 
-async def register_payments_agent(runtime, model_client: ChatCompletionClient, conversation_state_accessor):
+async def register_payments_agent(runtime, model_client: ChatCompletionClient, conversation_state_accessor, **agent_options):
     agent_type = await PaymentsAgent.register(
         runtime,
         type="Payments",
@@ -210,13 +217,14 @@ Remember:
 """
             ),
             model_client=model_client,
-            conversation_state_accessor=conversation_state_accessor
+            conversation_state_accessor=conversation_state_accessor,
+            **agent_options,
         )
     )
     await runtime.add_subscription(TypeSubscription(topic_type="Payments", agent_type=agent_type.type))
 
 
-async def register_capital_treasury_agent(runtime, model_client: ChatCompletionClient):
+async def register_capital_treasury_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="CapitalTreasury",
@@ -230,6 +238,7 @@ async def register_capital_treasury_agent(runtime, model_client: ChatCompletionC
             delegate_tools=[],
             my_topic_type="CapitalTreasury",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
@@ -237,7 +246,7 @@ async def register_capital_treasury_agent(runtime, model_client: ChatCompletionC
     )
 
 
-async def register_analytics_agent(runtime, model_client: ChatCompletionClient):
+async def register_analytics_agent(runtime, model_client: ChatCompletionClient, **agent_options):
     agent_type = await BankingAIAgent.register(
         runtime,
         type="Analytics",
@@ -251,6 +260,7 @@ async def register_analytics_agent(runtime, model_client: ChatCompletionClient):
             delegate_tools=[],
             my_topic_type="Analytics",
             user_topic_type="User",
+            **agent_options,
         )
     )
     await runtime.add_subscription(
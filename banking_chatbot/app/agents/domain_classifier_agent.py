@@ -1,17 +1,33 @@
-import json
-from autogen_core import RoutedAgent, message_handler, MessageContext, FunctionCall, TopicId
+import asyncio
+import time
+from autogen_core import (
+    AgentId,
+    CancellationToken,
+    RoutedAgent,
+    message_handler,
+    MessageContext,
+    TopicId,
+)
 from autogen_core.models import (
     SystemMessage,
     AssistantMessage,
     UserMessage,
     ChatCompletionClient,
-    FunctionExecutionResult,
-    FunctionExecutionResultMessage,
 )
 from autogen_core.tools import Tool
 
-from app.messages.message_types import UserTask, AgentResponse, DomainClassifierOutput
-from app.messages.message_types import MyMessageType
+from app.messages.message_types import UserTask, AgentResponse, SpeculativeTask
+from app.routing.handoff import build_handoff_context
+from app.routing.classification_context import RollingClassificationContext
+from app.context.summarizer import is_summary_message
+from app.runtime.deadline import DEGRADED_REPLY, TurnDeadline
+from app.model_clients.request_context import request_scope
+from app.routing.routing_stats import SpeculationStats
+from app.routing.classification_prompt import (
+    build_classification_prompt,
+    classification_fingerprint,
+    parse_agent_name,
+)
 
 
 class DomainClassifierAgent(RoutedAgent):
@@ -25,6 +41,16 @@ class DomainClassifierAgent(RoutedAgent):
         user_topic_type: str,
         
         conversation_state_accessor=None,
+        local_classifier=None,
+        local_confidence_threshold: float = 0.8,
+        routing_stats=None,
+        classification_cache=None,
+        classification_batcher=None,
+        speculative_routing: bool = False,
+        speculation_min_confidence: float = 0.3,
+        speculation_stats=None,
+        routing_dataset=None,
+        shadow_evaluator=None,
     ):
         super().__init__(description)
         self._system_message = system_message
@@ -37,13 +63,34 @@ class DomainClassifierAgent(RoutedAgent):
         
         self._conversation_state_accessor = conversation_state_accessor
 
+        self._local_classifier = local_classifier
+        self._local_confidence_threshold = local_confidence_threshold
+        self._routing_stats = routing_stats
+
+        self._classification_cache = classification_cache
+        self._prompt_fingerprint = classification_fingerprint(system_message)
+        self._classification_batcher = classification_batcher
+
+        self._classification_context = RollingClassificationContext()
+
+        self._speculative_routing = speculative_routing and local_classifier is not None
+        self._speculation_min_confidence = speculation_min_confidence
+        self._speculation_stats = speculation_stats or SpeculationStats()
+
+        self._routing_dataset = routing_dataset
+        self._shadow_evaluator = shadow_evaluator
+
     @message_handler
     async def handle_task(self, message: UserTask, ctx: MessageContext) -> None:
+        with request_scope(ctx.topic_id.source, message.hop):
+            await self._handle_task(message, ctx)
+
+    async def _handle_task(self, message: UserTask, ctx: MessageContext) -> None:
         session_id = ctx.topic_id.source
 
         
         if self._conversation_state_accessor is not None:
-            st = self._conversation_state_accessor.get_status(session_id)
+            st = await self._conversation_state_accessor.get_status(session_id)
         else:
             st = "fresh"
 
@@ -59,7 +106,7 @@ class DomainClassifierAgent(RoutedAgent):
                 followup_prompt = "Great! Do you have any additional queries? (yes/no)"
                 message.context.append(AssistantMessage(content=followup_prompt, source=self.id.type))
                 if self._conversation_state_accessor:
-                    self._conversation_state_accessor.set_status(session_id, "ask_additional")
+                    await self._conversation_state_accessor.set_status(session_id, "ask_additional")
                 await self.publish_message(
                     AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
                     topic_id=TopicId(self._user_topic_type, session_id),
@@ -69,7 +116,7 @@ class DomainClassifierAgent(RoutedAgent):
                 followup_prompt = "Would you like a follow-up on the same issue? (yes/no)"
                 message.context.append(AssistantMessage(content=followup_prompt, source=self.id.type))
                 if self._conversation_state_accessor:
-                    self._conversation_state_accessor.set_status(session_id, "ask_followup")
+                    await self._conversation_state_accessor.set_status(session_id, "ask_followup")
                 await self.publish_message(
                     AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
                     topic_id=TopicId(self._user_topic_type, session_id),
@@ -80,8 +127,8 @@ class DomainClassifierAgent(RoutedAgent):
             if user_input in ["yes", "y"]:
                 
                 if self._conversation_state_accessor:
-                    self._conversation_state_accessor.reset(session_id)
-                    self._conversation_state_accessor.reset_messages(session_id)
+                    await self._conversation_state_accessor.reset(session_id)
+                    await self._conversation_state_accessor.reset_messages(session_id)
     
                 
                 new_prompt = "Okay, I've cleared the old conversation. Please type your new query now."
@@ -95,7 +142,7 @@ class DomainClassifierAgent(RoutedAgent):
                 end_msg = "Thank you! Have a great day!"
                 message.context.append(AssistantMessage(content=end_msg, source=self.id.type))
                 if self._conversation_state_accessor:
-                    self._conversation_state_accessor.reset(session_id)
+                    await self._conversation_state_accessor.reset(session_id)
                 await self.publish_message(
                     AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
                     topic_id=TopicId(self._user_topic_type, session_id),
@@ -105,10 +152,10 @@ class DomainClassifierAgent(RoutedAgent):
 
         if st == "ask_followup":
             if user_input in ["yes", "y"]:
-                last_agent = self._conversation_state_accessor.get_last_agent(session_id) if self._conversation_state_accessor else None
+                last_agent = await self._conversation_state_accessor.get_last_agent(session_id) if self._conversation_state_accessor else None
                 if last_agent:
-                    self._conversation_state_accessor.set_status(session_id, "follow_up")
-                    self._conversation_state_accessor.set_last_agent(session_id, last_agent)
+                    await self._conversation_state_accessor.set_status(session_id, "follow_up")
+                    await self._conversation_state_accessor.set_last_agent(session_id, last_agent)
                     msg_text = "Please describe your follow-up question regarding the same issue."
                     message.context.append(AssistantMessage(content=msg_text, source=self.id.type))
                     await self.publish_message(
@@ -119,7 +166,7 @@ class DomainClassifierAgent(RoutedAgent):
             end_msg = "Thank you! Have a wonderful day!"
             message.context.append(AssistantMessage(content=end_msg, source=self.id.type))
             if self._conversation_state_accessor:
-                self._conversation_state_accessor.reset(session_id)
+                await self._conversation_state_accessor.reset(session_id)
             await self.publish_message(
                 AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
                 topic_id=TopicId(self._user_topic_type, session_id),
@@ -127,50 +174,74 @@ class DomainClassifierAgent(RoutedAgent):
             return
 
         
-        user_content = ""
-        for m in message.context:
+        newest_input = ""
+        for m in reversed(message.context):
             if isinstance(m, UserMessage):
-                user_content += m.content + "\n"
-
-        classification_prompt = (
-    "You are an expert banking domain classifier. Your task is to decide which domain is relevant.\n"
-    "Possible agent names: RetailBankingAgent, CorporateBusinessBankingAgent, InvestmentBankingAgent,\n"
-    "WealthManagementAgent, RiskManagementAgent, InsuranceAgent, ITOpsAgent, PaymentsAgent,\n"
-    "CapitalTreasuryAgent, AnalyticsAgent\n\n"
-    f"User query: {user_content}\n\n"
-    "Respond with JSON: {\"agent_name\": \"OneOfTheAbove\"}\n"
-    "If the user wants to do a normal payment or personal transaction, use RetailBankingAgent, "
-    "not PaymentsAgent. Only route to PaymentsAgent if the user specifically reports a mismatch "
-    "or discrepancy or some failure in the payment process.\n"
-    "Examples:\n"
-    "User: \"How do I pay John 100?\" => Agent: \"RetailBankingAgent\"\n"
-    "User: \"My payment success isn't reflecting in the system\" => Agent: \"PaymentsAgent\""
-)
-
-
-        llm_result = await self._model_client.create(
-            messages=[
-                self._system_message,
-                UserMessage(content=classification_prompt, source="System"),
-            ],
-            cancellation_token=ctx.cancellation_token,
+                newest_input = m.content
+                break
+        self._classification_context.observe_context_length(
+            len(message.context), compacted=bool(message.context) and is_summary_message(message.context[0])
         )
+        user_content = self._classification_context.build_input(newest_input)
+        last_agent = self._classification_context.last_agent
 
-        print(f"\n*** DomainClassifierAgent LLM response ***\n{llm_result.content}", flush=True)
+        decision_start = time.perf_counter()
+        prediction = self._predict_locally(newest_input)
+        agent_name = self._accept_local_prediction(prediction)
+        source = "local"
+        if agent_name is None:
+            # Keyed on the newest input and the last routed agent: the full
+            # rolling history would make nearly every multi-turn key unique, but
+            # a follow-up like "what are the fees?" depends on where it follows.
+            agent_name = self._lookup_cache(newest_input, last_agent)
+            source = "cache"
 
-        agent_name = "RetailBankingAgent"
-        try:
-            content = llm_result.content.strip()
-            json_start = content.find("{")
-            json_end = content.rfind("}") + 1
-            json_str = content[json_start:json_end]
-            cls_output = DomainClassifierOutput.model_validate_json(json_str)
-            agent_name = cls_output.agent_name
-        except Exception as e:
-            print(f"Classification parse error: {e} => defaulting to RetailBankingAgent")
+        speculation = None
+        if agent_name is None and self._speculative_routing:
+            speculation = await self._start_speculation(prediction, message.context, session_id, ctx, message.hop + 1)
+
+        if agent_name is None:
+            agent_name, source = await self._classify_before_deadline(
+                user_content, newest_input, last_agent, TurnDeadline(message.deadline), ctx.cancellation_token, prediction
+            )
+            if agent_name is None:
+                if speculation is not None:
+                    _, _, _, _, spec_token, _ = speculation
+                    spec_token.cancel()
+                await self._publish_degraded_reply(message, session_id)
+                return
 
         print(f"Classified domain as: {agent_name}")
+        self._classification_context.update(newest_input, agent_name)
+        if self._shadow_evaluator is not None:
+            self._shadow_evaluator.observe(newest_input, agent_name, time.perf_counter() - decision_start, source)
+
+        if speculation is not None:
+            predicted, spec_tool, spec_topic, spec_context, spec_token, spec_task = speculation
+            if predicted == agent_name:
+                print(f"Speculation on {predicted} confirmed, committing speculative result.", flush=True)
+                self._speculation_stats.record_hit()
+                spec_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                await self._publish_handoff(
+                    spec_context, predicted, spec_tool, spec_topic, session_id, message.deadline, message.hop + 1
+                )
+                return
+            print(f"Speculation on {predicted} rejected (classifier chose {agent_name}), cancelling.", flush=True)
+            spec_token.cancel()
+            spec_task.add_done_callback(
+                lambda t, c=spec_context: self._speculation_stats.record_miss(self._speculation_tokens(t, c))
+            )
+
+        tool, target_topic = await self._resolve_route(agent_name, ctx.cancellation_token)
+
+        print(f"Forwarding user task to topic: {target_topic}", flush=True)
+
+        new_context = build_handoff_context(message.context, tool.name, target_topic, self.id.type)
+        await self._publish_handoff(
+            new_context, agent_name, tool, target_topic, session_id, message.deadline, message.hop + 1
+        )
 
+    async def _resolve_route(self, agent_name: str, cancellation_token):
         agent_to_tool = {
             "RetailBankingAgent": "transfer_to_retail_banking",
             "CorporateBusinessBankingAgent": "transfer_to_corporate_banking",
@@ -189,33 +260,135 @@ class DomainClassifierAgent(RoutedAgent):
             tool_name = "transfer_to_retail_banking"
 
         tool = self._delegate_tools[tool_name]
-        result = await tool.run_json({}, ctx.cancellation_token)
-        target_topic = tool.return_value_as_string(result)
+        result = await tool.run_json({}, cancellation_token)
+        return tool, tool.return_value_as_string(result)
 
-        print(f"Forwarding user task to topic: {target_topic}", flush=True)
+    async def _publish_handoff(
+        self, new_context, agent_name: str, tool, target_topic: str, session_id: str, deadline=None, hop: int = 1
+    ):
+        if self._conversation_state_accessor is not None:
+            await self._conversation_state_accessor.set_route(session_id, agent_name, tool.name, target_topic)
+        await self.publish_message(
+            UserTask(context=new_context, deadline=deadline, hop=hop),
+            topic_id=TopicId(target_topic, source=session_id),
+        )
 
-        new_context = list(message.context)
-        new_context.append(
-            AssistantMessage(
-                content=[FunctionCall(id="auto_handoff", name=tool.name, arguments="{}")],
-                source=self.id.type,
-            )
+    async def _publish_degraded_reply(self, message: UserTask, session_id: str):
+        print("Turn deadline exceeded while classifying => sending degraded reply", flush=True)
+        message.context.append(AssistantMessage(content=DEGRADED_REPLY, source=self.id.type))
+        await self.publish_message(
+            AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
+            topic_id=TopicId(self._user_topic_type, session_id),
         )
-        new_context.append(
-            FunctionExecutionResultMessage(
-                content=[
-                    FunctionExecutionResult(
-                        call_id="auto_handoff",
-                        content=f"Transferred to {target_topic} agent. Please adopt persona immediately.",
-                        is_error=False,
-                        name=tool.name,
-                    )
-                ]
+
+    async def _start_speculation(self, prediction, context, session_id: str, ctx: MessageContext, hop: int = 1):
+        if prediction is None:
+            return None
+        predicted, confidence, _ = prediction
+        if confidence < self._speculation_min_confidence:
+            return None
+        tool, target_topic = await self._resolve_route(predicted, ctx.cancellation_token)
+        spec_context = build_handoff_context(context, tool.name, target_topic, self.id.type)
+        spec_token = CancellationToken()
+        ctx.cancellation_token.add_callback(spec_token.cancel)
+        spec_task = asyncio.create_task(
+            self.send_message(
+                SpeculativeTask(context=spec_context, hop=hop),
+                AgentId(target_topic, session_id),
+                cancellation_token=spec_token,
             )
         )
+        self._speculation_stats.record_attempt()
+        print(f"Speculatively starting {target_topic} ({predicted}, confidence {confidence:.2f})", flush=True)
+        return predicted, tool, target_topic, spec_context, spec_token, spec_task
 
-        new_topic = TopicId(target_topic, source=ctx.topic_id.source)
-        await self.publish_message(
-            UserTask(context=new_context),
-            topic_id=new_topic,
-        )
+    def _speculation_tokens(self, spec_task, spec_context) -> int:
+        if not spec_task.cancelled() and spec_task.exception() is None:
+            result = spec_task.result()
+            return result.prompt_tokens + result.completion_tokens
+        # Cancelled before the reply arrived: the prompt was still sent, so
+        # estimate what it cost.
+        try:
+            return self._model_client.count_tokens(spec_context)
+        except Exception:
+            return 0
+
+    def _predict_locally(self, user_content: str):
+        if self._local_classifier is None:
+            return None
+        start = time.perf_counter()
+        agent_name, confidence = self._local_classifier.predict(user_content)
+        return agent_name, confidence, time.perf_counter() - start
+
+    def _accept_local_prediction(self, prediction):
+        if prediction is None:
+            return None
+        agent_name, confidence, elapsed = prediction
+        if confidence < self._local_confidence_threshold:
+            print(f"Local classifier unsure ({agent_name}, {confidence:.2f}) => asking LLM")
+            return None
+        if self._routing_stats is not None:
+            self._routing_stats.record_local(agent_name, elapsed)
+        print(f"Local classifier routed to {agent_name} (confidence {confidence:.2f})")
+        return agent_name
+
+    def _lookup_cache(self, query: str, last_agent: str = None):
+        if self._classification_cache is None:
+            return None
+        agent_name = self._classification_cache.get(query, self._prompt_fingerprint, last_agent)
+        if agent_name is not None:
+            print(f"Classification cache hit => {agent_name}")
+        return agent_name
+
+    async def _classify_before_deadline(
+        self, user_content: str, query: str, last_agent: str, deadline: TurnDeadline, cancellation_token, prediction=None
+    ):
+        # Returns (agent_name, source): (None, None) if the turn deadline passes
+        # before the LLM answers. If the LLM is unavailable the local prediction
+        # is used whatever its confidence, with source "fallback".
+        if deadline.expired():
+            return None, None
+        token = deadline.link(cancellation_token)
+        start = time.perf_counter()
+        try:
+            agent_name = await self._classify_with_llm(user_content, query, last_agent, token)
+        except asyncio.CancelledError:
+            if not deadline.expired():
+                raise
+            return None, None
+        except Exception as e:
+            agent_name = prediction[0] if prediction is not None else "RetailBankingAgent"
+            print(f"LLM classification unavailable ({e!r}) => routing to {agent_name}", flush=True)
+            return agent_name, "fallback"
+        finally:
+            deadline.close()
+        if self._routing_stats is not None:
+            self._routing_stats.record_llm(agent_name, time.perf_counter() - start)
+        return agent_name, "llm"
+
+    async def _classify_with_llm(self, user_content: str, query: str, last_agent: str, cancellation_token) -> str:
+        if self._classification_batcher is not None:
+            agent_name = await self._classification_batcher.classify(user_content, cancellation_token)
+        else:
+            classification_prompt = build_classification_prompt(user_content)
+
+            llm_result = await self._model_client.create(
+                messages=[
+                    self._system_message,
+                    UserMessage(content=classification_prompt, source="System"),
+                ],
+                cancellation_token=cancellation_token,
+            )
+
+            print(f"\n*** DomainClassifierAgent LLM response ***\n{llm_result.content}", flush=True)
+
+            agent_name = parse_agent_name(llm_result.content)
+
+        if agent_name is None:
+            print("Could not parse classification => defaulting to RetailBankingAgent")
+            return "RetailBankingAgent"
+        if self._classification_cache is not None:
+            self._classification_cache.put(query, self._prompt_fingerprint, agent_name, last_agent)
+        if self._routing_dataset is not None:
+            self._routing_dataset.record(query, agent_name, classifier_input=user_content)
+        return agent_name
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from autogen_core import message_handler, MessageContext, TopicId
 from autogen_core.models import (
@@ -6,12 +7,13 @@ from autogen_core.models import (
     UserMessage,
     ChatCompletionClient,
 )
-from app.messages.message_types import UserTask, AgentResponse
+from app.messages.message_types import UserTask, AgentResponse, SpeculativeTask, SpeculativeResult
 from app.agents.base_agent import BankingAIAgent
+from app.runtime.deadline import TurnDeadline
 from app.tools.transaction_tools import lookup_transaction_tool, fix_core_banking_status_tool
 
 class PaymentsAgent(BankingAIAgent):
-    def __init__(self, system_message: SystemMessage, model_client: ChatCompletionClient, conversation_state_accessor):
+    def __init__(self, system_message: SystemMessage, model_client: ChatCompletionClient, conversation_state_accessor, **agent_options):
         super().__init__(
             agent_type="PaymentsAgent",
             system_message=system_message,
@@ -20,12 +22,17 @@ class PaymentsAgent(BankingAIAgent):
             delegate_tools=[],
             my_topic_type="Payments",
             user_topic_type="User",
+            read_only_tools=[lookup_transaction_tool.name],
+            **agent_options,
         )
         self._conversation_accessor = conversation_state_accessor
 
-    @message_handler
-    async def handle_task(self, message: UserTask, ctx: MessageContext) -> None:
+    async def _handle_task(self, message: UserTask, ctx: MessageContext) -> None:
         session_id = ctx.topic_id.source
+        deadline = TurnDeadline(message.deadline)
+        if deadline.expired():
+            await self._publish_degraded_reply(message, session_id, "turn deadline passed before the agent started")
+            return
 
         
         if not any(isinstance(m, UserMessage) and m.content.strip().startswith("TX") for m in message.context):
@@ -44,7 +51,17 @@ class PaymentsAgent(BankingAIAgent):
                 break
 
         
-        lookup_result = await lookup_transaction_tool.run_json({"transaction_id": transaction_id}, ctx.cancellation_token)
+        await self._report_progress(f"calling_tool:{lookup_transaction_tool.name}", session_id)
+        token = deadline.link(ctx.cancellation_token)
+        try:
+            lookup_result = await lookup_transaction_tool.run_json({"transaction_id": transaction_id}, token)
+        except asyncio.CancelledError:
+            if not deadline.expired():
+                raise
+            await self._publish_degraded_reply(message, session_id, "turn deadline exceeded during the lookup")
+            return
+        finally:
+            deadline.close()
         lookup_result_str = json.dumps(lookup_result, ensure_ascii=False)
         try:
             tx_info = json.loads(lookup_result_str)
@@ -53,6 +70,13 @@ class PaymentsAgent(BankingAIAgent):
 
        
         if tx_info.get("PaymentStatus") == "Success" and tx_info.get("CoreBankingStatus") != "Success":
+            # Don't start the fix if the user has already been waiting too long.
+            if deadline.expired():
+                await self._publish_degraded_reply(message, session_id, "turn deadline exceeded before the fix")
+                return
+            await self._report_progress(f"calling_tool:{fix_core_banking_status_tool.name}", session_id)
+            # Once started, the write is not cut short by the deadline: it may
+            # land anyway, and the user would be told it had not.
             fix_result = await fix_core_banking_status_tool.run_json({"transaction_id": transaction_id}, ctx.cancellation_token)
             fix_result_str = json.dumps(fix_result, ensure_ascii=False)
             response_text = f"Transaction {transaction_id} updated: {fix_result_str}"
@@ -62,8 +86,8 @@ class PaymentsAgent(BankingAIAgent):
             message.context.append(AssistantMessage(content=resolved_text, source=self.id.type))
 
             
-            self._conversation_accessor.set_status(session_id, "post_action")
-            self._conversation_accessor.set_last_agent(session_id, "PaymentsAgent")
+            await self._conversation_accessor.set_status(session_id, "post_action")
+            await self._conversation_accessor.set_last_agent(session_id, "PaymentsAgent")
         else:
             
             response_text = f"No discrepancy detected for transaction {transaction_id}."
@@ -73,3 +97,8 @@ class PaymentsAgent(BankingAIAgent):
             AgentResponse(context=message.context, reply_to_topic_type=self._my_topic_type),
             topic_id=TopicId(self._user_topic_type, session_id),
         )
+
+    @message_handler
+    async def handle_speculative_task(self, message: SpeculativeTask, ctx: MessageContext) -> SpeculativeResult:
+        # handle_task never calls the model, so there is nothing to start early.
+        return SpeculativeResult()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from autogen_core import message_handler, MessageContext, FunctionCall, TopicId
 from autogen_core.models import (
@@ -9,11 +10,13 @@ from autogen_core.models import (
 from autogen_core.tools import Tool
 from app.messages.message_types import UserTask, AgentResponse
 from app.agents.base_agent import BankingAIAgent
+from app.runtime.deadline import TurnDeadline
+from app.model_clients.circuit_breaker import UNAVAILABLE_REPLY
 from app.tools.transaction_tools import check_balance_tool, make_payment_tool
 
 
 class RetailBankingAgent(BankingAIAgent):
-    def __init__(self, agent_type: str, system_message: SystemMessage, model_client: ChatCompletionClient):
+    def __init__(self, agent_type: str, system_message: SystemMessage, model_client: ChatCompletionClient, **agent_options):
         super().__init__(
             agent_type=agent_type,
             system_message=system_message,
@@ -22,18 +25,33 @@ class RetailBankingAgent(BankingAIAgent):
             delegate_tools=[check_balance_tool, make_payment_tool],  
             my_topic_type="RetailBanking",
             user_topic_type="User",
+            **agent_options,
         )
 
-    @message_handler
-    async def handle_task(self, message: UserTask, ctx: MessageContext) -> None:
+    async def _handle_task(self, message: UserTask, ctx: MessageContext) -> None:
         print(f"[RetailBankingAgent] handle_task triggered with user content: "
               f"{[m.content for m in message.context if hasattr(m, 'content')]}")
 
-        llm_result = await self._model_client.create(
-            messages=[self._system_message] + message.context,
-            tools=[check_balance_tool.schema, make_payment_tool.schema],
-            cancellation_token=ctx.cancellation_token,
-        )
+        deadline = TurnDeadline(message.deadline)
+        if deadline.expired():
+            await self._publish_degraded_reply(message, ctx.topic_id.source, "turn deadline passed before the agent started")
+            return
+        token = deadline.link(ctx.cancellation_token)
+        try:
+            llm_result = await self._first_llm_result(message.context, token, ctx.topic_id.source)
+        except asyncio.CancelledError:
+            if not deadline.expired():
+                raise
+            await self._publish_degraded_reply(message, ctx.topic_id.source, "turn deadline exceeded")
+            return
+        except Exception as e:
+            # Model unavailable (breaker open or call failed): balance and payment
+            # requests don't need it, so route those by keyword.
+            print(f"[RetailBankingAgent] LLM unavailable ({e!r}) => routing locally")
+            await self._route_without_llm(message, ctx.topic_id.source)
+            return
+        finally:
+            deadline.close()
         print(f"[RetailBankingAgent] LLM raw output: {llm_result.content}")
 
         
@@ -44,13 +62,13 @@ class RetailBankingAgent(BankingAIAgent):
                 if call.name == "check_balance_func":
                     recognized_call = True
                     await self.publish_message(
-                        message,
+                        self._next_hop(message),
                         topic_id=TopicId("CheckBalance", ctx.topic_id.source)
                     )
                 elif call.name == "make_payment_func":
                     recognized_call = True
                     await self.publish_message(
-                        message,
+                        self._next_hop(message),
                         topic_id=TopicId("MakePayment", ctx.topic_id.source)
                     )
                 else:
@@ -82,3 +100,20 @@ class RetailBankingAgent(BankingAIAgent):
                 AgentResponse(context=new_context, reply_to_topic_type=self._my_topic_type),
                 topic_id=TopicId(self._user_topic_type, ctx.topic_id.source)
             )
+
+    async def _route_without_llm(self, message: UserTask, session_id: str):
+        user_text = ""
+        for m in reversed(message.context):
+            if isinstance(m, UserMessage):
+                user_text = m.content.lower()
+                break
+        if "balance" in user_text:
+            await self.publish_message(self._next_hop(message), topic_id=TopicId("CheckBalance", session_id))
+        elif any(word in user_text for word in ("pay", "transfer", "send", "receiver", "ifsc", "amount")):
+            await self.publish_message(self._next_hop(message), topic_id=TopicId("MakePayment", session_id))
+        else:
+            await self._publish_degraded_reply(message, session_id, "no local route without the LLM", UNAVAILABLE_REPLY)
+
+    @staticmethod
+    def _next_hop(message: UserTask) -> UserTask:
+        return UserTask(context=message.context, deadline=message.deadline, hop=message.hop + 1)
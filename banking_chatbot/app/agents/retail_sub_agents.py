@@ -10,6 +10,7 @@ from autogen_core.models import (
     ChatCompletionClient,
 )
 from app.messages.message_types import UserTask, AgentResponse
+from app.runtime.deadline import DEGRADED_REPLY, TurnDeadline
 
 ACC_CSV_PATH = (
     "C:/Users/akstiwari/OneDrive - Deloitte (O365D)/Desktop/Laptop Files/"
@@ -30,8 +31,11 @@ class CheckBalanceAgent(RoutedAgent):
     async def handle_task(self, message: UserTask, ctx: MessageContext) -> None:
         session_id = ctx.topic_id.source
         username = session_id
-        balance_val = self.get_balance(username)
-        response_text = f"Your current balance is ${balance_val}. Anything else I can help with?"
+        if TurnDeadline(message.deadline).expired():
+            response_text = DEGRADED_REPLY
+        else:
+            balance_val = self.get_balance(username)
+            response_text = f"Your current balance is ${balance_val}. Anything else I can help with?"
 
         new_context = list(message.context)
         new_context.append(AssistantMessage(content=response_text, source=self.id.type))
@@ -63,6 +67,15 @@ class MakePaymentAgent(RoutedAgent):
               f"{[m.content for m in message.context if hasattr(m, 'content')]}")
 
         session_id = ctx.topic_id.source
+        if TurnDeadline(message.deadline).expired():
+            new_context = list(message.context)
+            new_context.append(AssistantMessage(content=DEGRADED_REPLY, source=self.id.type))
+            await self.publish_message(
+                AgentResponse(context=new_context, reply_to_topic_type=self.metadata["type"]),
+                topic_id=TopicId("User", session_id)
+            )
+            return
+
         details = self.parse_payment_details(message.context)
         missing_fields = self.find_missing(details)
 
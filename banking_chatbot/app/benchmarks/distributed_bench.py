@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from app.benchmarks.routing_bench import CORPUS_PATH, load_corpus
+from app.benchmarks.session_store_bench import free_port
+from app.benchmarks.stub_model_client import StubChatCompletionClient
+from app.runtime.runtime_manager import RuntimeManager
+
+# Groups in the order they are handed to workers: with two workers the
+# classifier gets one process and RetailBanking and Payments share the other.
+GROUPS = ["classifier", "retail", "payments"]
+
+
+class BenchSocket:
+    """Stands in for the websocket and signals when the turn's answer arrives."""
+
+    def __init__(self):
+        self.answered = asyncio.Event()
+
+    async def send_json(self, payload: dict):
+        if payload.get("type") == "agent_response":
+            self.answered.set()
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.answered.set()
+
+
+def manager_options(args, session_store: str) -> dict:
+    corpus = load_corpus(args.corpus)
+    labels = {row["query"]: row["agent_name"] for row in corpus}
+    return {
+        "session_backend": "sqlite",
+        "session_store_url": session_store,
+        "model_client_factory": lambda model: StubChatCompletionClient(
+            labels, latency_ms=args.latency_ms, cpu_ms=args.cpu_ms, seed=args.seed
+        ),
+        "stream_responses": False,
+        "rate_limit": False,
+        "hedge_requests": False,
+        "turn_budget_seconds": args.turn_timeout,
+    }
+
+
+def split_groups(workers: int) -> List[List[str]]:
+    return [GROUPS[i::workers] for i in range(workers)]
+
+
+async def start_workers(args, workers: int, host: str, session_store: str, log_dir: str) -> list:
+    procs = []
+    for i, groups in enumerate(split_groups(workers)):
+        log_path = os.path.join(log_dir, f"worker-{workers}-{i}.log")
+        log = open(log_path, "w")
+        cmd = [
+            sys.executable, "-m", "app.benchmarks.distributed_bench",
+            "--serve-worker", ",".join(groups),
+            "--host", host,
+            "--session-store", session_store,
+            "--latency-ms", str(args.latency_ms),
+            "--cpu-ms", str(args.cpu_ms),
+            "--seed", str(args.seed),
+            "--corpus", args.corpus,
+        ]
+        procs.append((subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT), log, log_path))
+    # Wait until each worker has registered its agent types with the host.
+    give_up = time.monotonic() + 60
+    for proc, _, log_path in procs:
+        while True:
+            with open(log_path) as f:
+                if "Agent worker serving" in f.read():
+                    break
+            if proc.poll() is not None or time.monotonic() > give_up:
+                raise RuntimeError(f"Agent worker failed to start; see {log_path}")
+            await asyncio.sleep(0.1)
+    return procs
+
+
+async def drive(manager: RuntimeManager, queries: List[str], concurrency: int, turn_timeout: float, prefix: str) -> dict:
+    latencies = []
+    timeouts = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def turn(i: int, query: str):
+        nonlocal timeouts
+        session_id = f"{prefix}-{i}"
+        ws = BenchSocket()
+        async with semaphore:
+            await manager.register_websocket(session_id, ws)
+            started = time.perf_counter()
+            await manager.publish_user_message(query, session_id)
+            try:
+                await asyncio.wait_for(ws.answered.wait(), timeout=turn_timeout)
+                latencies.append((time.perf_counter() - started) * 1000)
+            except asyncio.TimeoutError:
+                timeouts += 1
+            manager.unregister_websocket(session_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(turn(i, q) for i, q in enumerate(queries)))
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies or [0.0], [50, 95, 99])
+    return {
+        "turns": len(queries),
+        "answered": len(latencies),
+        "timeouts": timeouts,
+        "seconds": round(elapsed, 3),
+        "turns_per_s": round(len(latencies) / elapsed, 2),
+        "latency_ms": {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)},
+    }
+
+
+async def run_workers(workers: int, queries: List[str], args, work_dir: str) -> dict:
+    session_store = os.path.join(work_dir, f"sessions-{workers}.db")
+    options = manager_options(args, session_store)
+    procs = []
+    if workers == 0:
+        manager = RuntimeManager(**options)
+    else:
+        host = f"localhost:{free_port()}"
+        manager = RuntimeManager(agent_host_address=host, remote_agent_groups=GROUPS, **options)
+    # Agents print every step; keep that out of the report.
+    with open(os.path.join(work_dir, f"frontend-{workers}.log"), "w") as log, contextlib.redirect_stdout(log):
+        await manager.start_runtime()
+        try:
+            if workers:
+                procs = await start_workers(args, workers, host, session_store, work_dir)
+            await drive(manager, queries[: args.concurrency], args.concurrency, args.turn_timeout, "warmup")
+            result = await drive(manager, queries, args.concurrency, args.turn_timeout, "bench")
+        finally:
+            for proc, worker_log, _ in procs:
+                proc.terminate()
+                proc.wait()
+                worker_log.close()
+            await manager.stop_runtime()
+    result["worker_groups"] = split_groups(workers)
+    return result
+
+
+async def serve_worker(args):
+    session_store = args.session_store
+    manager = RuntimeManager(agent_host_address=args.host, **manager_options(args, session_store))
+    await manager.run_agent_worker(args.serve_worker.split(","))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark turn throughput against the number of agent worker processes.")
+    parser.add_argument("--workers", default="0,1,2,3", help="worker counts to compare; 0 runs everything in one process")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--turns", type=int, default=600, help="turns per run, each in a fresh session")
+    parser.add_argument("--concurrency", type=int, default=32, help="turns in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean latency of the stub model")
+    parser.add_argument("--cpu-ms", type=float, default=5.0, help="CPU time the stub model burns per call")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write JSON results here")
+    parser.add_argument("--serve-worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--host", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--session-store", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_worker:
+        await serve_worker(args)
+        return
+
+    corpus = load_corpus(args.corpus)
+    queries = [corpus[i % len(corpus)]["query"] for i in range(args.turns)]
+    work_dir = tempfile.mkdtemp(prefix="distributed_bench_")
+    counts = [int(n) for n in args.workers.split(",")]
+    if any(n > len(GROUPS) for n in counts):
+        # Each agent type is registered by exactly one process, so there is
+        # nothing for a fourth worker to serve.
+        parser.error(f"at most {len(GROUPS)} workers (one per agent group)")
+
+    results = {}
+    for workers in counts:
+        results[workers] = await run_workers(workers, queries, args, work_dir)
+        r = results[workers]
+        print(
+            f"workers={workers} turns/s={r['turns_per_s']:.1f} p50={r['latency_ms']['p50']:.0f}ms "
+            f"p95={r['latency_ms']['p95']:.0f}ms timeouts={r['timeouts']}",
+            flush=True,
+        )
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "serve_worker", "host", "session_store")},
+        "logs": work_dir,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,248 @@
+
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+from autogen_core import (
+    MessageContext,
+    RoutedAgent,
+    SingleThreadedAgentRuntime,
+    TopicId,
+    TypeSubscription,
+    message_handler,
+)
+from autogen_core.models import AssistantMessage, SystemMessage, UserMessage
+
+from app.agents.domain_classifier_agent import DomainClassifierAgent
+from app.benchmarks.stub_model_client import StubChatCompletionClient
+from app.messages.message_types import ALLOWED_AGENTS, UserTask
+from app.routing.classification_batcher import ClassificationBatcher
+from app.routing.classification_cache import ClassificationCache
+from app.routing.local_classifier import LocalDomainClassifier
+from app.tools.delegate_tools import (
+    transfer_to_retail_banking_tool,
+    transfer_to_corporate_banking_tool,
+    transfer_to_investment_banking_tool,
+    transfer_to_wealth_management_tool,
+    transfer_to_risk_management_tool,
+    transfer_to_insurance_tool,
+    transfer_to_it_ops_tool,
+    transfer_to_payments_tool,
+    transfer_to_capital_treasury_tool,
+    transfer_to_analytics_tool,
+)
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "routing_corpus.jsonl")
+
+DELEGATE_TOOLS = [
+    transfer_to_retail_banking_tool,
+    transfer_to_corporate_banking_tool,
+    transfer_to_investment_banking_tool,
+    transfer_to_wealth_management_tool,
+    transfer_to_risk_management_tool,
+    transfer_to_insurance_tool,
+    transfer_to_it_ops_tool,
+    transfer_to_payments_tool,
+    transfer_to_capital_treasury_tool,
+    transfer_to_analytics_tool,
+]
+
+TOPIC_TO_AGENT = {
+    "RetailBanking": "RetailBankingAgent",
+    "CorporateBanking": "CorporateBusinessBankingAgent",
+    "InvestmentBanking": "InvestmentBankingAgent",
+    "WealthManagement": "WealthManagementAgent",
+    "RiskManagement": "RiskManagementAgent",
+    "Insurance": "InsuranceAgent",
+    "ITOps": "ITOpsAgent",
+    "Payments": "PaymentsAgent",
+    "CapitalTreasury": "CapitalTreasuryAgent",
+    "Analytics": "AnalyticsAgent",
+}
+
+STRATEGIES = ["llm", "local", "hybrid", "cached", "batched"]
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class RouteCollector(RoutedAgent):
+    """Stands in for every domain agent and records when each handoff arrives."""
+
+    def __init__(self, arrivals: Dict[str, list]):
+        super().__init__("RouteCollector")
+        self._arrivals = arrivals
+
+    @message_handler
+    async def handle_task(self, message: UserTask, ctx: MessageContext) -> None:
+        # One entry per turn of the session, in turn order.
+        self._arrivals.setdefault(ctx.topic_id.source, []).append(
+            (TOPIC_TO_AGENT[ctx.topic_id.type], time.perf_counter())
+        )
+
+
+def classifier_options(strategy: str, model_client, system_message: SystemMessage, args) -> dict:
+    if strategy == "llm":
+        return {}
+    if strategy == "local":
+        return {"local_classifier": LocalDomainClassifier(), "local_confidence_threshold": 0.0}
+    if strategy == "hybrid":
+        return {"local_classifier": LocalDomainClassifier(), "local_confidence_threshold": args.threshold}
+    if strategy == "cached":
+        return {"classification_cache": ClassificationCache()}
+    if strategy == "batched":
+        return {
+            "classification_batcher": ClassificationBatcher(
+                model_client,
+                system_message,
+                max_batch_size=args.batch_size,
+                max_wait_ms=args.batch_wait_ms,
+            )
+        }
+    raise ValueError(f"Unknown strategy: {strategy}")
+
+
+async def run_strategy(strategy: str, corpus: List[dict], args) -> dict:
+    model_client = StubChatCompletionClient(
+        {row["query"]: row["agent_name"] for row in corpus},
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    system_message = SystemMessage(content="You are the triage agent for banking queries.")
+    options = classifier_options(strategy, model_client, system_message, args)
+
+    runtime = SingleThreadedAgentRuntime()
+    classifier_type = await DomainClassifierAgent.register(
+        runtime,
+        type="DomainClassifier",
+        factory=lambda: DomainClassifierAgent(
+            description="DomainClassifierAgent",
+            system_message=system_message,
+            model_client=model_client,
+            delegate_tools=DELEGATE_TOOLS,
+            my_topic_type="DomainClassifier",
+            user_topic_type="User",
+            **options,
+        ),
+    )
+    await runtime.add_subscription(TypeSubscription(topic_type="DomainClassifier", agent_type=classifier_type.type))
+
+    arrivals: Dict[str, list] = {}
+    collector_type = await RouteCollector.register(runtime, type="RouteCollector", factory=lambda: RouteCollector(arrivals))
+    for topic in TOPIC_TO_AGENT:
+        await runtime.add_subscription(TypeSubscription(topic_type=topic, agent_type=collector_type.type))
+
+    runtime.start()
+    # Consecutive corpus rows become the turns of one session, so with
+    # --session-turns > 1 every turn after the first carries rolling history.
+    # Each pass is shuffled then, so a repeated query follows a different one.
+    rng = random.Random(args.seed)
+    rows = []
+    for _ in range(args.repeat):
+        passed = list(corpus)
+        if args.session_turns > 1:
+            rng.shuffle(passed)
+        rows += passed
+    sessions = [
+        (f"{strategy}-{s}", rows[offset:offset + args.session_turns])
+        for s, offset in enumerate(range(0, len(rows), args.session_turns))
+    ]
+    items = [((session_id, turn), row) for session_id, turns in sessions for turn, row in enumerate(turns)]
+    started: Dict[tuple, float] = {}
+    for offset in range(0, len(sessions), args.concurrency):
+        wave = sessions[offset:offset + args.concurrency]
+        contexts = {session_id: [] for session_id, _ in wave}
+        for turn in range(args.session_turns):
+            for session_id, turns in wave:
+                if turn >= len(turns):
+                    continue
+                context = contexts[session_id]
+                if turn:
+                    context.append(AssistantMessage(content="Done. Anything else?", source="DomainAgent"))
+                context.append(UserMessage(content=turns[turn]["query"], source="User"))
+                started[(session_id, turn)] = time.perf_counter()
+                await runtime.publish_message(
+                    UserTask(context=list(context)),
+                    topic_id=TopicId("DomainClassifier", source=session_id),
+                )
+            await runtime.stop_when_idle()
+            runtime.start()
+    await runtime.stop_when_idle()
+
+    labels = list(ALLOWED_AGENTS)
+    index = {label: i for i, label in enumerate(labels)}
+    confusion = np.zeros((len(labels), len(labels)), dtype=int)
+    latencies = []
+    for (session_id, turn), row in items:
+        predicted, arrived = arrivals[session_id][turn]
+        confusion[index[row["agent_name"]], index[predicted]] += 1
+        latencies.append((arrived - started[(session_id, turn)]) * 1000)
+
+    usage = model_client.total_usage()
+    decisions = len(items)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "decisions": decisions,
+        "accuracy": round(float(np.trace(confusion)) / decisions, 4),
+        "latency_ms": {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2)},
+        "tokens_per_decision": round((usage.prompt_tokens + usage.completion_tokens) / decisions, 2),
+        "llm_requests": model_client.requests,
+        "confusion_matrix": {
+            "labels": labels,
+            "rows_are_expected": confusion.tolist(),
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark DomainClassifierAgent routing strategies.")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus (repeats give the cache something to hit)")
+    parser.add_argument("--concurrency", type=int, default=16, help="sessions published at once")
+    parser.add_argument("--session-turns", type=int, default=1, help="turns per session; above 1 exercises rolling context")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mean latency of the stub model")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="probability the stub model misroutes")
+    parser.add_argument("--threshold", type=float, default=0.8, help="local confidence threshold for hybrid")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--batch-wait-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write JSON results here")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    results = {}
+    for strategy in args.strategies.split(","):
+        results[strategy] = await run_strategy(strategy, corpus, args)
+        r = results[strategy]
+        print(
+            f"{strategy:8s} acc={r['accuracy']:.3f} p50={r['latency_ms']['p50']:.1f}ms "
+            f"p95={r['latency_ms']['p95']:.1f}ms p99={r['latency_ms']['p99']:.1f}ms "
+            f"tokens/decision={r['tokens_per_decision']:.1f} llm_requests={r['llm_requests']}",
+            flush=True,
+        )
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "corpus_size": len(corpus),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from autogen_core.models import AssistantMessage, UserMessage
+
+from app.messages.message_types import AgentResponse
+from app.sessions.session_store import create_session_store
+
+BACKENDS = ["memory", "sqlite", "redis"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_resp_server() -> tuple:
+    # Runs the RESP stand-in in a subprocess, so round trips cross a real socket.
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "app.sessions.resp_server", "--port", str(port)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    proc.stdout.readline()
+    return proc, f"redis://127.0.0.1:{port}/0"
+
+
+async def run_turn(store, session_id: str, turn: int, text: str):
+    # The store calls RuntimeManager makes for one routed turn with one reply.
+    await store.append_message(session_id, UserMessage(content=f"{text} ({turn})", source="User"))
+    await store.get_state(session_id, "status", "fresh")
+    await store.get_state(session_id, "last_agent")
+    await store.get_state(session_id, "route")
+    await store.update_state(session_id, route=("RetailBankingAgent", "transfer_to_retail_banking", "RetailBanking"))
+    reply = AssistantMessage(content=f"Reply {turn}", source="RetailBankingAgent")
+    await store.queue_response(session_id, AgentResponse(reply_to_topic_type="User", context=[reply]))
+    await store.drain_responses(session_id)
+    await store.update_state(session_id, status="post_action", last_agent="RetailBankingAgent")
+    if turn % 10 == 9:
+        # Every tenth turn stands in for a compaction rewriting the history.
+        await store.replace_messages(session_id, await store.messages(session_id) + [reply])
+    else:
+        await store.touch(session_id)
+
+
+async def run_backend(backend: str, args) -> dict:
+    proc = None
+    url = None
+    workdir = tempfile.mkdtemp(prefix="session_bench_")
+    if backend == "sqlite":
+        url = os.path.join(workdir, "sessions.db")
+    elif backend == "redis":
+        url = args.redis_url
+        if url is None:
+            proc, url = start_resp_server()
+    store = create_session_store(backend, url, max_messages=args.max_messages)
+    text = "Please check my savings balance and the last transfer to my landlord " * args.message_repeat
+    try:
+        for w in range(args.warmup):
+            await run_turn(store, f"warmup-{w % args.sessions}", w, text)
+        timings = []
+        for turn in range(args.turns):
+            started = time.perf_counter()
+            await run_turn(store, f"session-{turn % args.sessions}", turn, text)
+            timings.append((time.perf_counter() - started) * 1e6)
+        stats = await store.stats()
+    finally:
+        await store.close()
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        "turns": args.turns,
+        "us_per_turn": {
+            "mean": round(float(np.mean(timings)), 1),
+            "p50": round(float(p50), 1),
+            "p95": round(float(p95), 1),
+            "p99": round(float(p99), 1),
+        },
+        "sessions": stats["sessions"],
+        "bytes": stats["bytes"],
+        "messages_trimmed": stats["messages_trimmed"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-turn overhead of the session store backends.")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=50, help="turns are spread round-robin over this many sessions")
+    parser.add_argument("--max-messages", type=int, default=40, help="per-session cap, so long runs exercise trimming")
+    parser.add_argument("--message-repeat", type=int, default=1, help="repeats of the sample sentence per user message")
+    parser.add_argument("--redis-url", default=None, help="use this server instead of a local resp_server")
+    parser.add_argument("--out", default=None, help="write JSON results here")
+    args = parser.parse_args()
+
+    results = {}
+    for backend in args.backends.split(","):
+        results[backend] = asyncio.run(run_backend(backend, args))
+        t = results[backend]["us_per_turn"]
+        print(
+            f"{backend:8s} mean={t['mean']:.0f}us p50={t['p50']:.0f}us p95={t['p95']:.0f}us p99={t['p99']:.0f}us",
+            flush=True,
+        )
+
+    report = {"config": {k: v for k, v in vars(args).items() if k != "out"}, "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Dict, Mapping, Optional, Sequence
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelInfo,
+    RequestUsage,
+)
+
+
+_QUERY_RE = re.compile(r"User query: (.*?)\n\n", re.S)
+_BATCH_RE = re.compile(r"User queries:\n(.*?)\n\n", re.S)
+_NUMBERED_RE = re.compile(r"^\d+\. (.*)$", re.M)
+
+
+class StubChatCompletionClient(ChatCompletionClient):
+    """
+    Offline stand-in for OpenAIChatCompletionClient used by the benchmarks.
+    Classification prompts are answered from a labeled corpus (with an optional
+    error rate), everything else gets a short canned reply. Latency is drawn
+    from a log-normal distribution around latency_ms and tokens are estimated
+    at four characters per token. cpu_ms of busy work per call stands in for
+    the parsing and validation that holds the event loop.
+    """
+
+    def __init__(
+        self,
+        labels: Dict[str, str],
+        latency_ms: float = 300.0,
+        latency_sigma: float = 0.35,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        cpu_ms: float = 0.0,
+    ):
+        self._labels = {q.strip().lower(): a for q, a in labels.items()}
+        self._latency = latency_ms / 1000.0
+        self._latency_sigma = latency_sigma
+        self._error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._cpu = cpu_ms / 1000.0
+        self._agents = sorted(set(labels.values()))
+
+        self.requests = 0
+        self._usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def _label_for(self, query: str) -> str:
+        query = query.strip().splitlines()[0].strip().lower() if query.strip() else ""
+        agent = self._labels.get(query, "RetailBankingAgent")
+        if self._rng.random() < self._error_rate:
+            agent = self._rng.choice(self._agents)
+        return agent
+
+    def _answer(self, prompt: str) -> str:
+        batch = _BATCH_RE.search(prompt)
+        if batch:
+            queries = _NUMBERED_RE.findall(batch.group(1))
+            return json.dumps([self._label_for(q) for q in queries])
+        single = _QUERY_RE.search(prompt)
+        if single:
+            return json.dumps({"agent_name": self._label_for(single.group(1))})
+        return "This is a stubbed reply from the domain agent."
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        self.requests += 1
+        delay = self._latency * self._rng.lognormvariate(0.0, self._latency_sigma)
+        sleep = asyncio.ensure_future(asyncio.sleep(delay))
+        if cancellation_token is not None:
+            cancellation_token.link_future(sleep)
+        await sleep
+
+        if self._cpu:
+            busy_until = time.perf_counter() + self._cpu
+            while time.perf_counter() < busy_until:
+                pass
+
+        prompt = str(messages[-1].content) if messages else ""
+        content = self._answer(prompt)
+        usage = RequestUsage(
+            prompt_tokens=self.count_tokens(messages),
+            completion_tokens=max(len(content) // 4, 1),
+        )
+        self._usage = RequestUsage(
+            prompt_tokens=self._usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._usage.completion_tokens + usage.completion_tokens,
+        )
+        return CreateResult(finish_reason="stop", content=content, usage=usage, cached=False)
+
+    async def create_stream(self, messages: Sequence[LLMMessage], **kwargs):
+        result = await self.create(messages, **kwargs)
+        if isinstance(result.content, str):
+            for word in result.content.split(" "):
+                yield word + " "
+        yield result
+
+    def actual_usage(self) -> RequestUsage:
+        return self._usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools=[]) -> int:
+        return sum(len(str(m.content)) for m in messages) // 4
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools=[]) -> int:
+        return 128000 - self.count_tokens(messages)
+
+    @property
+    def capabilities(self):
+        return {"vision": False, "function_calling": True, "json_output": True}
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return {"vision": False, "function_calling": True, "json_output": True, "family": "unknown"}
@@ -0,0 +1,128 @@
+import re
+from typing import List
+
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    SystemMessage,
+    UserMessage,
+)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+# Words MakePaymentAgent.parse_payment_details looks for in user messages.
+_PAYMENT_FIELDS = {"receiver", "ifsc", "amount", "pay"}
+
+
+def is_summary_message(message: LLMMessage) -> bool:
+    return isinstance(message, SystemMessage) and message.content.startswith(SUMMARY_PREFIX)
+
+
+def is_pinned_message(message: LLMMessage) -> bool:
+    # User messages the agents read back verbatim: PaymentsAgent's "TX..." ID
+    # and the payment details MakePaymentAgent parses.
+    if not isinstance(message, UserMessage) or not isinstance(message.content, str):
+        return False
+    text = message.content.strip()
+    return text.startswith("TX") or bool(_PAYMENT_FIELDS & set(text.lower().replace("=", " ").split()))
+
+
+class ConversationSummarizer:
+    """
+    Folds the older part of a conversation into one summary message. With a
+    model_client the summary is written by that (cheap) model; without one, or
+    if the call fails, it is extractive: the first sentence of each older
+    message, newest lines kept when the summary gets too long. An existing
+    summary at the start of the context is carried into the new one. The
+    newest user message and pinned messages (see is_pinned_message) are
+    kept as they are after the summary.
+    """
+
+    def __init__(
+        self,
+        model_client=None,
+        keep_recent_messages: int = 6,
+        min_messages: int = 12,
+        max_summary_chars: int = 1200,
+        line_chars: int = 160,
+    ):
+        self._model_client = model_client
+        self.keep_recent_messages = keep_recent_messages
+        self._min_messages = min_messages
+        self._max_summary_chars = max_summary_chars
+        self._line_chars = line_chars
+
+    def should_compact(self, context: List[LLMMessage]) -> bool:
+        return len(context) >= self._min_messages
+
+    async def compact(self, context: List[LLMMessage]) -> List[LLMMessage]:
+        """Returns the replacement for context[:len(context) - keep_recent_messages]."""
+        older = context[: len(context) - self.keep_recent_messages]
+        previous = ""
+        if older and is_summary_message(older[0]):
+            previous = older[0].content[len(SUMMARY_PREFIX):].strip()
+            older = older[1:]
+        newest_user = next((m for m in reversed(context) if isinstance(m, UserMessage)), None)
+        kept = [m for m in older if m is newest_user or is_pinned_message(m)]
+        older = [m for m in older if not any(m is k for k in kept)]
+        if not older:
+            return ([context[0]] if previous else []) + kept
+        summary = None
+        if self._model_client is not None:
+            try:
+                summary = await self._summarize_with_model(previous, older)
+            except Exception as e:
+                print(f"Summary model failed ({e}); using extractive summary")
+        if not summary:
+            summary = self._extractive_summary(previous, older)
+        return [SystemMessage(content=f"{SUMMARY_PREFIX}\n{summary}")] + kept
+
+    async def _summarize_with_model(self, previous: str, older: List[LLMMessage]) -> str:
+        transcript = "\n".join(f"{self._speaker(m)}: {self._text(m)}" for m in older)
+        prompt = (
+            "Summarize this banking support conversation for the agent that will continue it. "
+            "Keep account details, transaction IDs, amounts and open requests. "
+            f"Use at most {self._max_summary_chars} characters.\n\n"
+        )
+        if previous:
+            prompt += f"Summary so far:\n{previous}\n\n"
+        prompt += f"Conversation:\n{transcript}"
+        result = await self._model_client.create(messages=[UserMessage(content=prompt, source="System")])
+        if not isinstance(result.content, str):
+            return ""
+        return result.content.strip()[: self._max_summary_chars]
+
+    def _extractive_summary(self, previous: str, older: List[LLMMessage]) -> str:
+        lines = previous.splitlines() if previous else []
+        for m in older:
+            text = " ".join(self._text(m).split())
+            if not text:
+                continue
+            text = _SENTENCE_END.split(text, maxsplit=1)[0]
+            if len(text) > self._line_chars:
+                text = text[: self._line_chars - 3] + "..."
+            lines.append(f"- {self._speaker(m)}: {text}")
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > self._max_summary_chars:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _speaker(message: LLMMessage) -> str:
+        if isinstance(message, UserMessage):
+            return "User"
+        if isinstance(message, AssistantMessage):
+            return "Assistant"
+        if isinstance(message, FunctionExecutionResultMessage):
+            return "Tool"
+        return "System"
+
+    @staticmethod
+    def _text(message: LLMMessage) -> str:
+        if isinstance(message, FunctionExecutionResultMessage):
+            return " ".join(r.content for r in message.content)
+        if isinstance(message, AssistantMessage) and isinstance(message.content, list):
+            return " ".join(f"called {c.name}" for c in message.content)
+        return message.content if isinstance(message.content, str) else ""
@@ -0,0 +1,206 @@
+from collections import defaultdict
+from typing import Dict, List
+
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    SystemMessage,
+    UserMessage,
+)
+
+# Per-message framing overhead used by the OpenAI chat format.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens with tiktoken. If the encoding cannot be loaded
+    (tiktoken downloads it on first use) it falls back to four characters
+    per token so trimming still works, just less precisely.
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self._encoding = None
+        try:
+            import tiktoken
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"tiktoken encoding unavailable ({type(e).__name__}); estimating tokens from characters")
+
+    def count_text(self, text: str) -> int:
+        if self._encoding is None:
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: LLMMessage) -> int:
+        if isinstance(message, FunctionExecutionResultMessage):
+            text = "".join(result.content for result in message.content)
+        elif isinstance(message.content, list):
+            text = "".join(
+                getattr(part, "name", "") + getattr(part, "arguments", "")
+                if not isinstance(part, str) else part
+                for part in message.content
+            )
+        else:
+            text = str(message.content)
+        return self.count_text(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def count(self, messages: List[LLMMessage]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+
+class ContextBudgetManager:
+    """
+    Keeps the prompt of each agent under an input token budget. The system
+    message and everything from the newest user message on (the current
+    turn, including its tool results) are always sent, as are the last
+    keep_recent_messages messages. Older tool call / result pairs are folded
+    into one-line notes first; if that is not enough, the oldest messages are
+    dropped. Tool calls are never separated from their results.
+    """
+
+    def __init__(
+        self,
+        default_budget: int = 8000,
+        budgets: Dict[str, int] = None,
+        keep_recent_messages: int = 6,
+        fold_chars: int = 200,
+        counter: TokenCounter = None,
+    ):
+        self._default_budget = default_budget
+        self._budgets = dict(budgets or {})
+        self._keep_recent_messages = keep_recent_messages
+        self._fold_chars = fold_chars
+        self._counter = counter or TokenCounter()
+
+        self._calls = defaultdict(int)
+        self._trimmed = defaultdict(int)
+        self._over_budget = defaultdict(int)
+        self._tokens_before = defaultdict(int)
+        self._tokens_after = defaultdict(int)
+        self._folded = defaultdict(int)
+        self._dropped = defaultdict(int)
+
+    def budget_for(self, agent_type: str) -> int:
+        return self._budgets.get(agent_type, self._default_budget)
+
+    def fit(self, agent_type: str, system_message: SystemMessage, context: List[LLMMessage]) -> List[LLMMessage]:
+        """Returns the messages to send to the model: the system message plus the (possibly trimmed) context."""
+        budget = self.budget_for(agent_type)
+        system_tokens = self._counter.count_message(system_message)
+        units = self._group(context)
+        unit_tokens = [self._counter.count(u) for u in units]
+        before = system_tokens + sum(unit_tokens)
+
+        folded = dropped = 0
+        if before > budget:
+            protected = self._protected_units(units)
+            for i, unit in enumerate(units):
+                if i not in protected and self._is_tool_unit(unit):
+                    units[i] = [self._fold(unit)]
+                    unit_tokens[i] = self._counter.count(units[i])
+                    folded += 1
+            total = system_tokens + sum(unit_tokens)
+            for i in range(len(units)):
+                if total <= budget:
+                    break
+                if i in protected:
+                    continue
+                total -= unit_tokens[i]
+                dropped += len(units[i])
+                units[i] = None
+            if total > budget:
+                self._over_budget[agent_type] += 1
+                print(f"[{agent_type}] Context is {total} tokens after trimming, over the {budget} token budget")
+
+        messages = [system_message] + [m for unit in units if unit is not None for m in unit]
+        after = self._counter.count(messages) if before > budget else before
+
+        self._calls[agent_type] += 1
+        self._tokens_before[agent_type] += before
+        self._tokens_after[agent_type] += after
+        if before > budget:
+            self._trimmed[agent_type] += 1
+            self._folded[agent_type] += folded
+            self._dropped[agent_type] += dropped
+            print(f"[{agent_type}] Trimmed context {before} -> {after} tokens "
+                  f"(folded {folded} tool calls, dropped {dropped} messages)")
+        return messages
+
+    def _protected_units(self, units: List[List[LLMMessage]]) -> set:
+        protected = set()
+        for i in range(len(units) - 1, -1, -1):
+            protected.add(i)
+            if isinstance(units[i][0], UserMessage):
+                break
+        kept = 0
+        for i in range(len(units) - 1, -1, -1):
+            if kept >= self._keep_recent_messages:
+                break
+            protected.add(i)
+            kept += len(units[i])
+        return protected
+
+    @staticmethod
+    def _group(context: List[LLMMessage]) -> List[List[LLMMessage]]:
+        # An assistant message carrying function calls and the result message
+        # that answers it must be kept or dropped together.
+        units = []
+        for message in context:
+            if isinstance(message, FunctionExecutionResultMessage) and units and ContextBudgetManager._is_call(units[-1][-1]):
+                units[-1].append(message)
+            else:
+                units.append([message])
+        return units
+
+    @staticmethod
+    def _is_call(message: LLMMessage) -> bool:
+        return isinstance(message, AssistantMessage) and isinstance(message.content, list)
+
+    @staticmethod
+    def _is_tool_unit(unit: List[LLMMessage]) -> bool:
+        return ContextBudgetManager._is_call(unit[0])
+
+    def _fold(self, unit: List[LLMMessage]) -> AssistantMessage:
+        calls = unit[0].content
+        results = {}
+        if len(unit) > 1:
+            results = {r.call_id: r.content for r in unit[1].content}
+        notes = []
+        for call in calls:
+            result = results.get(call.id, "")
+            if len(result) > self._fold_chars:
+                result = result[:self._fold_chars] + "..."
+            notes.append(f"[earlier tool call] {call.name}({call.arguments}) -> {result}")
+        return AssistantMessage(content="\n".join(notes), source=unit[0].source)
+
+    def stats(self) -> dict:
+        agents = {}
+        for agent_type in sorted(self._calls):
+            calls = self._calls[agent_type]
+            before = self._tokens_before[agent_type]
+            after = self._tokens_after[agent_type]
+            agents[agent_type] = {
+                "budget": self.budget_for(agent_type),
+                "calls": calls,
+                "trimmed_calls": self._trimmed[agent_type],
+                "over_budget_calls": self._over_budget[agent_type],
+                "avg_tokens_before": round(before / calls, 1),
+                "avg_tokens_after": round(after / calls, 1),
+                "tokens_saved": before - after,
+                "folded_tool_calls": self._folded[agent_type],
+                "dropped_messages": self._dropped[agent_type],
+            }
+        before = sum(self._tokens_before.values())
+        after = sum(self._tokens_after.values())
+        return {
+            "calls": sum(self._calls.values()),
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": before - after,
+            "agents": agents,
+        }
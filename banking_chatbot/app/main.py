@@ -1,10 +1,20 @@
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 import uvicorn
 from app.runtime.runtime_manager import RuntimeManager
 from app.messages.message_types import UserCredentials
 
-runtime_manager = RuntimeManager()
+# Run several uvicorn workers against one deployment with e.g.
+# SESSION_BACKEND=redis SESSION_STORE_URL=redis://cache:6379/0
+# AGENT_HOST_ADDRESS=localhost:50051 REMOTE_AGENT_GROUPS=classifier,retail,payments
+# instead hosts a gRPC runtime whose heavy agents run in app.runner.agent_worker.
+runtime_manager = RuntimeManager(
+    session_backend=os.getenv("SESSION_BACKEND", "memory"),
+    session_store_url=os.getenv("SESSION_STORE_URL"),
+    agent_host_address=os.getenv("AGENT_HOST_ADDRESS"),
+    remote_agent_groups=[g for g in os.getenv("REMOTE_AGENT_GROUPS", "").split(",") if g],
+)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -25,7 +35,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 await websocket.send_text("Enter your username:")
                 username = await websocket.receive_text()
                 session_id = username.strip()
-                runtime_manager.register_websocket(session_id, websocket)
+                await runtime_manager.register_websocket(session_id, websocket)
                 conversation_state = "await_password"
 
             elif conversation_state == "await_password":
@@ -61,5 +71,36 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         runtime_manager.unregister_websocket(session_id)
 
+@app.get("/metrics/routing")
+async def routing_metrics():
+    return runtime_manager.get_routing_metrics()
+
+@app.get("/metrics/context")
+async def context_metrics():
+    return runtime_manager.get_context_metrics()
+
+@app.get("/metrics/model_clients")
+async def model_client_metrics():
+    return runtime_manager.get_model_client_metrics()
+
+@app.get("/metrics/circuit_breakers")
+async def circuit_breaker_metrics():
+    return runtime_manager.get_circuit_breaker_metrics()
+
+@app.get("/metrics/sessions")
+async def session_metrics():
+    return await runtime_manager.get_session_metrics()
+
+@app.get("/metrics/usage")
+async def usage_metrics(recent: int = 20):
+    return runtime_manager.get_usage_metrics(recent)
+
+@app.get("/metrics/usage/{session_id}")
+async def session_usage_metrics(session_id: str):
+    usage = runtime_manager.get_session_usage(session_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail=f"No usage recorded for session {session_id}")
+    return usage
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
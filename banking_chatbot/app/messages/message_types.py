@@ -1,6 +1,6 @@
 
 
-from typing import List
+from typing import List, Optional
 from dataclasses import dataclass
 from pydantic import BaseModel, field_validator
 from autogen_core.models import LLMMessage
@@ -13,12 +13,35 @@ class UserLogin(BaseModel):
 class UserTask(BaseModel):
     
     context: List[LLMMessage]
+    # Epoch seconds by which the turn must be answered; None means no limit.
+    deadline: Optional[float] = None
+    # Handoffs so far in this turn: 0 for whichever agent receives the user's message.
+    hop: int = 0
+
+class SpeculativeTask(BaseModel):
+
+    context: List[LLMMessage]
+    hop: int = 0
+
+class SpeculativeResult(BaseModel):
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
 
 class AgentResponse(BaseModel):
    
     reply_to_topic_type: str
     context: List[LLMMessage]
 
+class AgentResponseDelta(BaseModel):
+
+    reply_to_topic_type: str
+    delta: str
+
+class ProgressEvent(BaseModel):
+
+    stage: str
+
 
 class UserCredentials(BaseModel):
     username: str
@@ -28,24 +51,25 @@ class UserCredentials(BaseModel):
 class MyMessageType:
     content: str
 
+ALLOWED_AGENTS = (
+    "RetailBankingAgent",
+    "CorporateBusinessBankingAgent",
+    "InvestmentBankingAgent",
+    "WealthManagementAgent",
+    "RiskManagementAgent",
+    "InsuranceAgent",
+    "ITOpsAgent",
+    "PaymentsAgent",
+    "CapitalTreasuryAgent",
+    "AnalyticsAgent",
+)
+
 class DomainClassifierOutput(BaseModel):
     agent_name: str
 
     @field_validator("agent_name")
     @classmethod
     def validate_agent_name(cls, value):
-        allowed_agents = {
-            "RetailBankingAgent",
-            "CorporateBusinessBankingAgent",
-            "InvestmentBankingAgent",
-            "WealthManagementAgent",
-            "RiskManagementAgent",
-            "InsuranceAgent",
-            "ITOpsAgent",
-            "PaymentsAgent",
-            "CapitalTreasuryAgent",
-            "AnalyticsAgent",
-        }
-        if value not in allowed_agents:
+        if value not in ALLOWED_AGENTS:
             raise ValueError(f"Invalid agent name: {value}")
         return value
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from typing import Any, Mapping, Optional, Sequence
+
+import openai
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage
+
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+from app.model_clients.rate_limiter import is_timeout_error
+from app.runtime.deadline import TurnDeadline
+
+UNAVAILABLE_REPLY = (
+    "I'm having trouble reaching our assistant service right now. Balance checks, payments "
+    "and transaction ID lookups still work; for anything else please try again in a few minutes."
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the breaker is open."""
+
+
+def is_provider_failure(e: BaseException) -> bool:
+    # Timeouts, connection errors, 429s and 5xx count against the provider.
+    # Other 4xx are problems with our request, and anything else (KeyError,
+    # validation errors, ...) is a bug on our side.
+    if is_timeout_error(e) or isinstance(e, openai.APIConnectionError):
+        return True
+    return isinstance(e, openai.APIStatusError) and (e.status_code == 429 or e.status_code >= 500)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open, calls are
+    refused; after reset_timeout seconds up to half_open_probes calls are let
+    through as probes. A successful probe closes the breaker, a failed one
+    opens it again for another reset_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_probes: int = 1,
+        name: str = "",
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._half_open_probes = half_open_probes
+        self._clock = clock
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.opened = 0
+        self.rejected = 0
+        self.total_failures = 0
+        self.successes = 0
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self._reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self._half_open_probes:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.successes += 1
+        self._failures = 0
+        if self._state == HALF_OPEN:
+            print(f"Circuit breaker {self.name} probe succeeded => closing", flush=True)
+            self._state = CLOSED
+
+    def record_failure(self, error: BaseException):
+        self.total_failures += 1
+        self._failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self._failure_threshold):
+            self._open()
+
+    def release_probe(self):
+        # A probe that ended without a verdict (e.g. the caller cancelled).
+        if self._state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def _open(self):
+        print(f"Circuit breaker {self.name} opening after {self._failures} failures ({self.last_error})", flush=True)
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self.opened += 1
+
+    def stats(self) -> dict:
+        state = self.state
+        stats = {
+            "state": state,
+            "consecutive_failures": self._failures,
+            "failures": self.total_failures,
+            "successes": self.successes,
+            "rejected": self.rejected,
+            "opened": self.opened,
+            "last_error": self.last_error,
+        }
+        if state == OPEN:
+            stats["retry_in_s"] = round(max(self._reset_timeout - (self._clock() - self._opened_at), 0.0), 1)
+        return stats
+
+
+class CircuitBreakerChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Guards one agent type's model calls with a CircuitBreaker. Calls taking
+    longer than call_timeout are cancelled and count as failures, so a slow
+    provider trips the breaker the same way an erroring one does. Below a
+    rate limiter, leave call_timeout unset and give it to the
+    RateLimitedChatCompletionClient instead, so queueing for a slot is not
+    mistaken for a slow provider. While the breaker is open every call raises
+    CircuitOpenError without waiting.
+    """
+
+    def __init__(self, inner, breaker: CircuitBreaker, call_timeout: float = None):
+        super().__init__(inner)
+        self.breaker = breaker
+        self._call_timeout = call_timeout
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"model circuit is {self.breaker.state}")
+
+    def _timeout(self, cancellation_token: Optional[CancellationToken]):
+        deadline = TurnDeadline(time.time() + self._call_timeout if self._call_timeout else None)
+        return deadline, deadline.link(cancellation_token)
+
+    def _failed(self, e: BaseException, deadline: TurnDeadline) -> BaseException:
+        # Returns the exception to raise; a cancellation caused by our own timer
+        # becomes a TimeoutError.
+        if isinstance(e, asyncio.CancelledError):
+            if not deadline.expired():
+                self.breaker.release_probe()
+                return e
+            e = asyncio.TimeoutError(f"model call exceeded {self._call_timeout}s")
+        if is_provider_failure(e):
+            self.breaker.record_failure(e)
+        else:
+            self.breaker.release_probe()
+        return e
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        self._admit()
+        deadline, token = self._timeout(cancellation_token)
+        try:
+            result = await self._inner.create(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=token,
+            )
+        except BaseException as e:
+            error = self._failed(e, deadline)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            deadline.close()
+        self.breaker.record_success()
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        self._admit()
+        deadline, token = self._timeout(cancellation_token)
+        try:
+            async for chunk in self._inner.create_stream(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=token,
+            ):
+                yield chunk
+        except GeneratorExit:
+            # The consumer stopped reading; that says nothing about the provider.
+            self.breaker.release_probe()
+            raise
+        except BaseException as e:
+            error = self._failed(e, deadline)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            deadline.close()
+        self.breaker.record_success()
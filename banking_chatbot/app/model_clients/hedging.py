@@ -0,0 +1,296 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+import numpy as np
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage
+
+from app.context.token_budget import TokenCounter
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+from app.model_clients.rate_limiter import AdaptiveRateLimiter, estimate_call_tokens
+from app.model_clients.request_context import request_agent_type
+
+
+def _linked_token(parent: Optional[CancellationToken]) -> CancellationToken:
+    token = CancellationToken()
+    if parent is not None:
+        parent.add_callback(token.cancel)
+    return token
+
+
+def _no_permit(error: BaseException = None, used_tokens: int = None):
+    pass
+
+
+def _outcome(task: asyncio.Future):
+    # (error, used_tokens) of a finished create() attempt, for AdaptiveRateLimiter.release.
+    if task.cancelled():
+        return asyncio.CancelledError(), None
+    if task.exception() is not None:
+        return task.exception(), None
+    usage = task.result().usage
+    return None, usage.prompt_tokens + usage.completion_tokens
+
+
+class HedgingChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Sends a second, identical request when the first has not answered within
+    the observed p95 latency of the calling agent type (request_agent_type).
+    Whichever finishes first wins and the other is cancelled. For streams the
+    race is on the first chunk. Hedges are capped at budget times the number
+    of requests, and nothing is hedged until min_samples latencies have been
+    seen for that agent type.
+
+    Sits below the rate limiter, so latencies are provider time only. With a
+    limiter, each hedge needs a slot it can take right away (try_acquire) and
+    holds it until it finishes; when callers are already queueing there is
+    no hedge.
+    """
+
+    def __init__(
+        self,
+        inner,
+        budget: float = 0.05,
+        percentile: float = 95,
+        min_samples: int = 20,
+        window: int = 500,
+        limiter: AdaptiveRateLimiter = None,
+        counter: TokenCounter = None,
+    ):
+        super().__init__(inner)
+        self._limiter = limiter
+        self._counter = counter or TokenCounter()
+        self._budget = budget
+        self._percentile = percentile
+        self._min_samples = min_samples
+        self._latencies: Dict[tuple, deque] = defaultdict(lambda: deque(maxlen=window))
+
+        self._requests: Dict[str, int] = defaultdict(int)
+        self._hedges: Dict[str, int] = defaultdict(int)
+        self._hedge_wins: Dict[str, int] = defaultdict(int)
+        self.budget_denied = 0
+        self.limiter_denied = 0
+
+    def _hedge_delay(self, agent_type: str, kind: str) -> Optional[float]:
+        samples = self._latencies[(agent_type, kind)]
+        if len(samples) < self._min_samples:
+            return None
+        return float(np.percentile(samples, self._percentile))
+
+    def _take_hedge(self, agent_type: str, messages, extra_create_args):
+        # Returns release(error, used_tokens) for the hedge's limiter slot, or
+        # None if there is no budget or no slot to spare.
+        total_requests = sum(self._requests.values())
+        total_hedges = sum(self._hedges.values())
+        if total_hedges + 1 > self._budget * total_requests:
+            self.budget_denied += 1
+            return None
+        if self._limiter is None:
+            self._hedges[agent_type] += 1
+            return _no_permit
+        estimate = estimate_call_tokens(self._counter, messages, extra_create_args)
+        if not self._limiter.try_acquire(estimate):
+            self.limiter_denied += 1
+            return None
+        self._hedges[agent_type] += 1
+        released = []
+
+        def release(error: BaseException = None, used_tokens: int = None):
+            if not released:
+                released.append(True)
+                self._limiter.release(estimate, error, used_tokens)
+
+        return release
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        agent_type = request_agent_type.get()
+        self._requests[agent_type] += 1
+        delay = self._hedge_delay(agent_type, "create")
+
+        def attempt(release=None):
+            token = _linked_token(cancellation_token)
+            task = asyncio.ensure_future(self._timed_create(
+                agent_type,
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=token,
+            ))
+            if release is not None:
+                task.add_done_callback(lambda t: release(*_outcome(t)))
+            return task, token
+
+        primary = attempt()
+        try:
+            done, _ = await asyncio.wait([primary[0]], timeout=delay)
+            if done:
+                return await primary[0]
+            release = self._take_hedge(agent_type, messages, extra_create_args)
+            if release is None:
+                return await primary[0]
+            winner = await self._race(agent_type, primary, attempt(release))
+            return winner.result()
+        finally:
+            # Only reached with work still pending if the caller itself was cancelled.
+            if not primary[0].done():
+                primary[1].cancel()
+                primary[0].cancel()
+
+    async def _timed_create(self, agent_type: str, messages, **kwargs) -> CreateResult:
+        start = time.perf_counter()
+        result = await self._inner.create(messages, **kwargs)
+        self._latencies[(agent_type, "create")].append(time.perf_counter() - start)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        agent_type = request_agent_type.get()
+        self._requests[agent_type] += 1
+        delay = self._hedge_delay(agent_type, "stream")
+
+        def attempt(release=_no_permit):
+            token = _linked_token(cancellation_token)
+            stream = self._inner.create_stream(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=token,
+            )
+            if release is not _no_permit:
+                stream = self._permitted_stream(stream, release)
+            return asyncio.ensure_future(self._first_chunk(agent_type, stream)), token, stream, release
+
+        primary = attempt()
+        winner = primary
+        try:
+            done, _ = await asyncio.wait([primary[0]], timeout=delay)
+            release = None if done else self._take_hedge(agent_type, messages, extra_create_args)
+            if release is not None:
+                secondary = attempt(release)
+                first = await self._race(agent_type, primary[:2], secondary[:2])
+                winner = primary if first is primary[0] else secondary
+                loser = secondary if winner is primary else primary
+                asyncio.ensure_future(self._discard_stream(loser))
+            try:
+                chunk = await winner[0]
+            except StopAsyncIteration:
+                return
+            yield chunk
+            async for chunk in winner[2]:
+                yield chunk
+        finally:
+            if not winner[0].done():
+                winner[1].cancel()
+                winner[0].cancel()
+                winner[3](asyncio.CancelledError())
+            else:
+                await winner[2].aclose()
+                winner[3](asyncio.CancelledError())
+
+    @staticmethod
+    async def _permitted_stream(stream, release):
+        # Holds the hedge's limiter slot until the stream ends or is closed.
+        used = error = None
+        try:
+            async for chunk in stream:
+                if isinstance(chunk, CreateResult):
+                    used = chunk.usage.prompt_tokens + chunk.usage.completion_tokens
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            await stream.aclose()
+            release(error, used)
+
+    async def _first_chunk(self, agent_type: str, stream):
+        start = time.perf_counter()
+        chunk = await stream.__anext__()
+        self._latencies[(agent_type, "stream")].append(time.perf_counter() - start)
+        return chunk
+
+    @staticmethod
+    async def _discard_stream(attempt):
+        task, token, stream, release = attempt
+        token.cancel()
+        task.cancel()
+        await asyncio.wait([task])
+        if not task.cancelled():
+            task.exception()
+        await stream.aclose()
+        # In case the stream was closed before it ever started.
+        release(asyncio.CancelledError())
+
+    async def _race(self, agent_type: str, primary, secondary) -> asyncio.Future:
+        # Returns the first attempt to finish successfully and cancels the other.
+        attempts = {primary[0]: primary[1], secondary[0]: secondary[1]}
+        pending = set(attempts)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None or isinstance(task.exception(), StopAsyncIteration):
+                        if task is secondary[0]:
+                            self._hedge_wins[agent_type] += 1
+                        return task
+                    error = task.exception()
+            if error is not None:
+                raise error
+            raise asyncio.CancelledError()
+        finally:
+            for task in pending:
+                attempts[task].cancel()
+                task.cancel()
+
+    def stats(self) -> dict:
+        agents = {}
+        for agent_type in sorted(self._requests):
+            requests = self._requests[agent_type]
+            hedges = self._hedges[agent_type]
+            create_p95 = self._hedge_delay(agent_type, "create")
+            stream_p95 = self._hedge_delay(agent_type, "stream")
+            agents[agent_type] = {
+                "requests": requests,
+                "hedges": hedges,
+                "hedge_rate": hedges / requests if requests else 0.0,
+                "hedge_wins": self._hedge_wins[agent_type],
+                "win_rate": self._hedge_wins[agent_type] / hedges if hedges else 0.0,
+                "create_p95_ms": round(create_p95 * 1000, 2) if create_p95 is not None else None,
+                "first_chunk_p95_ms": round(stream_p95 * 1000, 2) if stream_p95 is not None else None,
+            }
+        requests = sum(self._requests.values())
+        hedges = sum(self._hedges.values())
+        wins = sum(self._hedge_wins.values())
+        return {
+            "budget": self._budget,
+            "requests": requests,
+            "hedges": hedges,
+            "hedge_rate": hedges / requests if requests else 0.0,
+            "hedge_wins": wins,
+            "win_rate": wins / hedges if hedges else 0.0,
+            "budget_denied": self.budget_denied,
+            "limiter_denied": self.limiter_denied,
+            "agents": agents,
+        }
@@ -0,0 +1,95 @@
+from typing import Any, Callable, Mapping, Optional, Sequence
+
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage
+
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+
+
+class LoadAwareChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Sends calls to the primary client normally and to a cheaper/faster
+    fallback client while the system is under load. load() returns the
+    current load signal (the primary model's limiter queue depth); the client
+    switches to the fallback once it reaches high_watermark and back once it
+    drops to low_watermark, so it doesn't flap around a single threshold.
+    Token counting and model info always come from the primary.
+    """
+
+    def __init__(
+        self,
+        primary,
+        fallback,
+        load: Callable[[], float],
+        high_watermark: float = 8,
+        low_watermark: float = None,
+    ):
+        super().__init__(primary)
+        self._fallback = fallback
+        self._load = load
+        self._high = high_watermark
+        self._low = high_watermark / 2 if low_watermark is None else low_watermark
+        self.downgraded = False
+        self.calls = 0
+        self.downgraded_calls = 0
+        self.switches = 0
+
+    def _pick(self):
+        load = self._load()
+        if not self.downgraded and load >= self._high:
+            self.downgraded = True
+            self.switches += 1
+        elif self.downgraded and load <= self._low:
+            self.downgraded = False
+            self.switches += 1
+        self.calls += 1
+        if self.downgraded:
+            self.downgraded_calls += 1
+            return self._fallback
+        return self._inner
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self._pick().create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        async for chunk in self._pick().create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            yield chunk
+
+    def stats(self) -> dict:
+        return {
+            "downgraded": self.downgraded,
+            "calls": self.calls,
+            "downgraded_calls": self.downgraded_calls,
+            "downgrade_rate": self.downgraded_calls / self.calls if self.calls else 0.0,
+            "switches": self.switches,
+            "high_watermark": self._high,
+            "low_watermark": self._low,
+        }
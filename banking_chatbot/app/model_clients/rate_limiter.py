@@ -0,0 +1,337 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Mapping, Optional, Sequence
+
+import numpy as np
+import openai
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage
+
+from app.context.token_budget import TokenCounter
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+from app.runtime.deadline import TurnDeadline
+
+PRIORITY_TRIAGE = 0
+PRIORITY_DOMAIN = 1
+
+# Lower is admitted first. Set by PrioritizedChatCompletionClient; it survives
+# single-flight because asyncio tasks copy the context they are created in.
+request_priority: ContextVar[int] = ContextVar("request_priority", default=PRIORITY_DOMAIN)
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    return getattr(e, "status_code", None) == 429
+
+
+def is_timeout_error(e: BaseException) -> bool:
+    return isinstance(e, (asyncio.TimeoutError, TimeoutError, openai.APITimeoutError))
+
+
+def estimate_call_tokens(
+    counter: TokenCounter, messages: Sequence[LLMMessage], extra_create_args: Mapping[str, Any], expected_completion_tokens: int = 256
+) -> int:
+    # Prompt plus expected completion, charged up front and corrected afterwards.
+    completion = extra_create_args.get("max_tokens", expected_completion_tokens)
+    return counter.count(list(messages)) + completion
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float = None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._clock = clock
+        self._level = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self._level -= amount
+
+    def adjust(self, amount: float):
+        # Refund an overestimate (positive) or charge an underestimate (negative).
+        self._refill()
+        self._level = min(self.capacity, self._level + amount)
+
+
+class AdaptiveRateLimiter:
+    """
+    Admits model calls through a priority queue, subject to a requests/minute
+    and a tokens/minute bucket and an AIMD concurrency limit. The limit starts
+    at max_concurrency, halves on a 429, shrinks by a quarter on a timeout and
+    grows back by 1/limit after each successful call. Latency alone is not a
+    congestion signal: it mostly tracks how long the answer is.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+        initial_concurrency: int = None,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        clock=time.monotonic,
+    ):
+        self._requests = TokenBucket(requests_per_minute, clock=clock)
+        self._tokens = TokenBucket(tokens_per_minute, clock=clock)
+        self._limit = float(initial_concurrency or max_concurrency)
+        self._min = min_concurrency
+        self._max = max_concurrency
+        self._clock = clock
+
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._timer = None
+
+        self.admitted = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self._waits = deque(maxlen=1000)
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self._limit)
+
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._queue if not entry[2].done())
+
+    async def acquire(self, priority: int, tokens: int, cancellation_token: Optional[CancellationToken] = None):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future, tokens, self._clock()))
+        if cancellation_token is not None:
+            cancellation_token.link_future(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller went away: give the slot back.
+                self._in_flight -= 1
+                self._dispatch()
+            raise
+
+    def try_acquire(self, tokens: int) -> bool:
+        # Admits extra work (e.g. a hedge) only if nothing is queued and a slot
+        # and the budget are free right now; never waits or jumps the queue.
+        if self.queue_depth() or self._in_flight >= int(self._limit):
+            return False
+        if self._requests.wait_time(1) > 0 or self._tokens.wait_time(tokens) > 0:
+            return False
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        self._in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self, estimated_tokens: int, error: BaseException = None, used_tokens: int = None):
+        # error is what the call raised, if anything; other failures leave the limit alone.
+        self._in_flight -= 1
+        if used_tokens is not None:
+            self._tokens.adjust(estimated_tokens - used_tokens)
+        if error is None:
+            self._limit = min(self._max, self._limit + 1.0 / self._limit)
+        elif is_rate_limit_error(error):
+            self.rate_limited += 1
+            self._limit = max(self._min, self._limit / 2)
+        elif is_timeout_error(error):
+            self.timeouts += 1
+            self._limit = max(self._min, self._limit * 0.75)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._queue and self._in_flight < int(self._limit):
+            priority, _, future, tokens, enqueued = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+            if wait > 0:
+                self._schedule(wait)
+                return
+            heapq.heappop(self._queue)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+            self.admitted += 1
+            self._waits.append(self._clock() - enqueued)
+            future.set_result(None)
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            return
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self) -> dict:
+        waiting = [entry for entry in self._queue if not entry[2].done()]
+        by_priority = {}
+        for priority, *_ in waiting:
+            by_priority[priority] = by_priority.get(priority, 0) + 1
+        waits_ms = np.array(self._waits) * 1000 if self._waits else np.zeros(1)
+        return {
+            "queue_depth": len(waiting),
+            "queue_depth_by_priority": by_priority,
+            "in_flight": self._in_flight,
+            "concurrency_limit": self.concurrency_limit,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(float(waits_ms.mean()), 2),
+            "p95_wait_ms": round(float(np.percentile(waits_ms, 95)), 2),
+            "requests_available": round(self._requests.level(), 1),
+            "tokens_available": round(self._tokens.level(), 1),
+        }
+
+
+class RateLimitedChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Waits for an AdaptiveRateLimiter slot before every call. The token cost is
+    estimated up front (prompt plus expected completion) and corrected with
+    the real usage afterwards. The priority comes from request_priority.
+    call_timeout starts once the call is admitted, so time spent queueing for
+    a slot never turns into a TimeoutError.
+    """
+
+    def __init__(
+        self,
+        inner,
+        limiter: AdaptiveRateLimiter,
+        counter: TokenCounter = None,
+        expected_completion_tokens: int = 256,
+        call_timeout: float = None,
+    ):
+        super().__init__(inner)
+        self._limiter = limiter
+        self._counter = counter or TokenCounter()
+        self._expected_completion_tokens = expected_completion_tokens
+        self._call_timeout = call_timeout
+
+    def _timeout(self, cancellation_token: Optional[CancellationToken]):
+        deadline = TurnDeadline(time.time() + self._call_timeout if self._call_timeout else None)
+        return deadline, deadline.link(cancellation_token)
+
+    def _failed(self, e: BaseException, deadline: TurnDeadline) -> BaseException:
+        # A cancellation caused by our own timer becomes a TimeoutError.
+        if isinstance(e, asyncio.CancelledError) and deadline.expired():
+            return asyncio.TimeoutError(f"model call exceeded {self._call_timeout}s")
+        return e
+
+    def _estimate(self, messages: Sequence[LLMMessage], extra_create_args: Mapping[str, Any]) -> int:
+        return estimate_call_tokens(self._counter, messages, extra_create_args, self._expected_completion_tokens)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        priority = request_priority.get()
+        estimate = self._estimate(messages, extra_create_args)
+        await self._limiter.acquire(priority, estimate, cancellation_token)
+        deadline, token = self._timeout(cancellation_token)
+        used = error = None
+        try:
+            result = await self._inner.create(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=token,
+            )
+            used = result.usage.prompt_tokens + result.usage.completion_tokens
+            return result
+        except BaseException as e:
+            error = self._failed(e, deadline)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            deadline.close()
+            self._limiter.release(estimate, error, used)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        priority = request_priority.get()
+        estimate = self._estimate(messages, extra_create_args)
+        await self._limiter.acquire(priority, estimate, cancellation_token)
+        deadline, token = self._timeout(cancellation_token)
+        used = error = None
+        try:
+            async for chunk in self._inner.create_stream(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=token,
+            ):
+                if isinstance(chunk, CreateResult):
+                    used = chunk.usage.prompt_tokens + chunk.usage.completion_tokens
+                yield chunk
+        except BaseException as e:
+            error = self._failed(e, deadline)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            deadline.close()
+            self._limiter.release(estimate, error, used)
+
+
+class PrioritizedChatCompletionClient(DelegatingChatCompletionClient):
+    """Runs every call with request_priority set, e.g. PRIORITY_TRIAGE for the classifier."""
+
+    def __init__(self, inner, priority: int):
+        super().__init__(inner)
+        self._priority = priority
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs) -> CreateResult:
+        reset = request_priority.set(self._priority)
+        try:
+            return await self._inner.create(messages, **kwargs)
+        finally:
+            request_priority.reset(reset)
+
+    async def create_stream(self, messages: Sequence[LLMMessage], **kwargs):
+        reset = request_priority.set(self._priority)
+        try:
+            async for chunk in self._inner.create_stream(messages, **kwargs):
+                yield chunk
+        finally:
+            try:
+                request_priority.reset(reset)
+            except ValueError:
+                # Closed from another context, e.g. finalized after being abandoned.
+                pass
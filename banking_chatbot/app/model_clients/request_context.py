@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Sequence
+
+from autogen_core.models import CreateResult, LLMMessage
+
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+
+# Agent type of the caller (e.g. "Insurance", "DomainClassifier"). Wrappers
+# further down the stack read it to keep per-agent statistics; like any
+# ContextVar it is copied into tasks started during the call.
+request_agent_type: ContextVar[str] = ContextVar("request_agent_type", default="unknown")
+
+# Session and hop of the message being handled; set by agents for the duration
+# of a handler with request_scope.
+request_session_id: ContextVar[Optional[str]] = ContextVar("request_session_id", default=None)
+request_hop: ContextVar[int] = ContextVar("request_hop", default=0)
+
+
+@contextmanager
+def request_scope(session_id: str, hop: int = 0):
+    session_reset = request_session_id.set(session_id)
+    hop_reset = request_hop.set(hop)
+    try:
+        yield
+    finally:
+        request_hop.reset(hop_reset)
+        request_session_id.reset(session_reset)
+
+
+class AgentTaggedChatCompletionClient(DelegatingChatCompletionClient):
+    """Runs every call with request_agent_type set to the agent type it was built for."""
+
+    def __init__(self, inner, agent_type: str):
+        super().__init__(inner)
+        self.agent_type = agent_type
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs) -> CreateResult:
+        reset = request_agent_type.set(self.agent_type)
+        try:
+            return await self._inner.create(messages, **kwargs)
+        finally:
+            request_agent_type.reset(reset)
+
+    async def create_stream(self, messages: Sequence[LLMMessage], **kwargs):
+        reset = request_agent_type.set(self.agent_type)
+        try:
+            async for chunk in self._inner.create_stream(messages, **kwargs):
+                yield chunk
+        finally:
+            try:
+                request_agent_type.reset(reset)
+            except ValueError:
+                # Closed from another context, e.g. finalized after being abandoned.
+                pass
@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Mapping, Optional, Sequence
+
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage, RequestUsage
+
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+
+
+def request_key(
+    namespace: str,
+    messages: Sequence[LLMMessage],
+    tools=(),
+    json_output: Optional[bool] = None,
+    extra_create_args: Mapping[str, Any] = {},
+) -> str:
+    payload = {
+        "namespace": namespace,
+        "messages": [m.model_dump(mode="json") for m in messages],
+        "tools": [t.schema if hasattr(t, "schema") else t for t in tools],
+        "json_output": json_output,
+        "extra_create_args": dict(extra_create_args),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseStore:
+    """
+    Key/value store for serialized CreateResults in one SQLite file. WAL mode
+    and a busy timeout let several uvicorn workers on the same machine read
+    and write it concurrently. Entries expire after ttl_seconds; once the
+    stored values exceed max_bytes the least recently read ones are evicted
+    down to 90% of the limit.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 24 * 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+        evict_every: int = 16,
+        clock=time.time,
+    ):
+        self._ttl = ttl_seconds
+        self._max_bytes = max_bytes
+        self._evict_every = evict_every
+        self._clock = clock
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created, accessed FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created, accessed = row
+            if now - created > self._ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.expired += 1
+                return None
+            # Refreshing the LRU timestamp is a write; skip it for recently read entries.
+            if now - accessed > 60:
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return value
+
+    def put(self, key: str, value: str):
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self._puts += 1
+            if self._puts % self._evict_every == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self.expired += self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self._ttl,)).rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        to_free = total - int(self._max_bytes * 0.9)
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            keys.append((key,))
+            to_free -= size
+            if to_free <= 0:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.evicted += len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self._max_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+class CachingChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Serves repeated requests from a SQLiteResponseStore. The key is a hash of
+    the messages, tool schemas, json_output, extra create args and namespace
+    (the model name), so a different prompt or model never shares an entry.
+    Only plain text answers are stored. Hits come back with cached=True and
+    zero usage because no tokens were spent.
+    """
+
+    def __init__(self, inner, store: SQLiteResponseStore, namespace: str = ""):
+        super().__init__(inner)
+        self._store = store
+        self._namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        key = request_key(self._namespace, messages, tools, json_output, extra_create_args)
+        cached = await self._lookup(key)
+        if cached is not None:
+            return cached
+        result = await self._inner.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        await self._save(key, result)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        key = request_key(self._namespace, messages, tools, json_output, extra_create_args)
+        cached = await self._lookup(key)
+        if cached is not None:
+            yield cached.content
+            yield cached
+            return
+        result = None
+        async for chunk in self._inner.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                result = chunk
+            yield chunk
+        if result is not None:
+            await self._save(key, result)
+
+    async def _lookup(self, key: str) -> Optional[CreateResult]:
+        try:
+            raw = await asyncio.to_thread(self._store.get, key)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Response cache read failed: {e}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        result = CreateResult.model_validate_json(raw)
+        return result.model_copy(update={"cached": True, "usage": RequestUsage(prompt_tokens=0, completion_tokens=0)})
+
+    async def _save(self, key: str, result: CreateResult):
+        if not isinstance(result.content, str) or result.finish_reason != "stop":
+            return
+        try:
+            await asyncio.to_thread(self._store.put, key, result.model_dump_json())
+            self.stores += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Response cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "errors": self.errors,
+        }
+        stats.update(self._store.stats())
+        return stats
@@ -0,0 +1,175 @@
+import asyncio
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage, RequestUsage
+
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+from app.model_clients.response_cache import request_key
+
+
+class _Flight:
+    def __init__(self, token: CancellationToken):
+        self.token = token
+        self.task: Optional[asyncio.Task] = None
+        self.callers = 0
+        # Streaming flights buffer chunks so late joiners can replay them.
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+
+class SingleFlightChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Coalesces identical requests that are in flight at the same time: the
+    first caller starts the model call, later callers with the same request
+    key await the same result (for streams, replay the same chunks). The call
+    runs under its own CancellationToken; a caller cancelling only stops its
+    own wait, and the call is cancelled once every caller has gone.
+    Callers that joined an existing flight get zero usage, since they spent
+    no tokens.
+    """
+
+    def __init__(self, inner, namespace: str = ""):
+        super().__init__(inner)
+        self._namespace = namespace
+        self._calls: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _Flight] = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        key = request_key(self._namespace, messages, tools, json_output, extra_create_args)
+        flight, joined = self._join(self._calls, key)
+        if not joined:
+            flight.task = asyncio.ensure_future(
+                self._inner.create(
+                    messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=flight.token,
+                )
+            )
+            flight.task.add_done_callback(lambda t, k=key, f=flight: self._finish(self._calls, k, f, t))
+
+        waiter = asyncio.ensure_future(asyncio.shield(flight.task))
+        if cancellation_token is not None:
+            cancellation_token.link_future(waiter)
+        try:
+            result = await waiter
+        finally:
+            self._leave(self._calls, key, flight)
+        if joined:
+            return result.model_copy(update={"usage": RequestUsage(prompt_tokens=0, completion_tokens=0)})
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        key = request_key(self._namespace, messages, tools, json_output, extra_create_args)
+        flight, joined = self._join(self._streams, key)
+        if not joined:
+            stream = self._inner.create_stream(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=flight.token,
+            )
+            flight.task = asyncio.ensure_future(self._pump(flight, stream))
+            flight.task.add_done_callback(lambda t, k=key, f=flight: self._finish(self._streams, k, f, t))
+
+        try:
+            i = 0
+            while True:
+                if i < len(flight.chunks):
+                    chunk = flight.chunks[i]
+                    i += 1
+                    if joined and isinstance(chunk, CreateResult):
+                        chunk = chunk.model_copy(update={"usage": RequestUsage(prompt_tokens=0, completion_tokens=0)})
+                    yield chunk
+                    continue
+                if flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                waiter = asyncio.ensure_future(flight.changed.wait())
+                if cancellation_token is not None:
+                    cancellation_token.link_future(waiter)
+                await waiter
+        finally:
+            self._leave(self._streams, key, flight)
+
+    async def _pump(self, flight: _Flight, stream):
+        try:
+            async for chunk in stream:
+                flight.chunks.append(chunk)
+                self._notify(flight)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            flight.finished = True
+            self._notify(flight)
+
+    @staticmethod
+    def _notify(flight: _Flight):
+        # Wake everyone waiting on the current event and start a fresh one.
+        flight.changed.set()
+        flight.changed = asyncio.Event()
+
+    def _join(self, flights: Dict[str, _Flight], key: str):
+        flight = flights.get(key)
+        joined = flight is not None
+        if joined:
+            self.coalesced += 1
+        else:
+            self.requests += 1
+            flight = _Flight(CancellationToken())
+            flights[key] = flight
+        flight.callers += 1
+        return flight, joined
+
+    def _leave(self, flights: Dict[str, _Flight], key: str, flight: _Flight):
+        flight.callers -= 1
+        if flight.callers == 0 and not flight.task.done():
+            # Nobody is waiting for this call any more.
+            self.abandoned += 1
+            flight.token.cancel()
+            flight.task.cancel()
+            if flights.get(key) is flight:
+                del flights[key]
+
+    @staticmethod
+    def _finish(flights: Dict[str, _Flight], key: str, flight: _Flight, task: asyncio.Task):
+        if flights.get(key) is flight:
+            del flights[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.requests + self.coalesced
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
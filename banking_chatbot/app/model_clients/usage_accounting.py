@@ -0,0 +1,236 @@
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage
+
+from app.model_clients.delegating_client import DelegatingChatCompletionClient
+from app.model_clients.request_context import request_agent_type, request_hop, request_session_id
+
+# USD per million (prompt, completion) tokens; models not listed get no cost.
+DEFAULT_MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+
+class _UsageTotals:
+    def __init__(self, latency_window: int):
+        self.calls = 0
+        self.errors = 0
+        self.cached = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+        self.cost_usd = 0.0
+        self._latencies = deque(maxlen=latency_window)
+
+    def add(self, record: dict):
+        self.calls += 1
+        self.errors += record["error"] is not None
+        self.cached += record["cached"]
+        self.prompt_tokens += record["prompt_tokens"]
+        self.completion_tokens += record["completion_tokens"]
+        self.seconds += record["seconds"]
+        self.cost_usd += record["cost_usd"] or 0.0
+        self._latencies.append(record["seconds"])
+
+    def snapshot(self) -> dict:
+        latencies_ms = np.array(self._latencies) * 1000 if self._latencies else np.zeros(1)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cached": self.cached,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "wall_seconds": round(self.seconds, 3),
+            "avg_latency_ms": round(self.seconds / self.calls * 1000, 2) if self.calls else 0.0,
+            "p95_latency_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+class _SessionUsage:
+    def __init__(self, latency_window: int, max_records: int):
+        self.totals = _UsageTotals(latency_window)
+        self.by_agent: Dict[str, _UsageTotals] = defaultdict(lambda: _UsageTotals(latency_window))
+        self.records = deque(maxlen=max_records)
+
+
+class UsageLedger:
+    """
+    In-memory accounting of model calls. Each record carries the session,
+    agent type, hop, model, tokens and wall time of one call. Totals are kept
+    overall and per agent type, hop and model; per-session totals and recent
+    records are kept for the max_sessions most recently active sessions.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        records_per_session: int = 200,
+        max_recent_records: int = 1000,
+        latency_window: int = 1000,
+        model_prices: Mapping[str, Tuple[float, float]] = None,
+        clock=time.time,
+    ):
+        self._max_sessions = max_sessions
+        self._records_per_session = records_per_session
+        self._latency_window = latency_window
+        self._prices = dict(DEFAULT_MODEL_PRICES if model_prices is None else model_prices)
+        self._clock = clock
+
+        self._totals = _UsageTotals(latency_window)
+        self._by_agent: Dict[str, _UsageTotals] = defaultdict(lambda: _UsageTotals(latency_window))
+        self._by_hop: Dict[int, _UsageTotals] = defaultdict(lambda: _UsageTotals(latency_window))
+        self._by_model: Dict[str, _UsageTotals] = defaultdict(lambda: _UsageTotals(latency_window))
+        self._sessions: "OrderedDict[str, _SessionUsage]" = OrderedDict()
+        self._recent = deque(maxlen=max_recent_records)
+        self.evicted_sessions = 0
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        if model not in self._prices:
+            return None
+        prompt_price, completion_price = self._prices[model]
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        seconds: float,
+        cached: bool = False,
+        error: str = None,
+    ):
+        record = {
+            "ts": self._clock(),
+            "session_id": request_session_id.get(),
+            "agent_type": request_agent_type.get(),
+            "hop": request_hop.get(),
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "seconds": seconds,
+            "cached": cached,
+            "error": error,
+            "cost_usd": self.cost(model, prompt_tokens, completion_tokens),
+        }
+        self._totals.add(record)
+        self._by_agent[record["agent_type"]].add(record)
+        self._by_hop[record["hop"]].add(record)
+        self._by_model[model].add(record)
+        self._recent.append(record)
+
+        session_id = record["session_id"]
+        if session_id is None:
+            return
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _SessionUsage(self._latency_window, self._records_per_session)
+            while len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted_sessions += 1
+        else:
+            self._sessions.move_to_end(session_id)
+        session.totals.add(record)
+        session.by_agent[record["agent_type"]].add(record)
+        session.records.append(record)
+
+    def summary(self, recent: int = 20) -> dict:
+        sessions = sorted(self._sessions.items(), key=lambda item: item[1].totals.cost_usd, reverse=True)
+        return {
+            "totals": self._totals.snapshot(),
+            "by_agent": {agent_type: totals.snapshot() for agent_type, totals in sorted(self._by_agent.items())},
+            "by_hop": {hop: totals.snapshot() for hop, totals in sorted(self._by_hop.items())},
+            "by_model": {model: totals.snapshot() for model, totals in sorted(self._by_model.items())},
+            "sessions_tracked": len(self._sessions),
+            "sessions_evicted": self.evicted_sessions,
+            "top_sessions": {session_id: usage.totals.snapshot() for session_id, usage in sessions[:10]},
+            "recent": list(self._recent)[-recent:] if recent > 0 else [],
+        }
+
+    def session(self, session_id: str) -> Optional[dict]:
+        usage = self._sessions.get(session_id)
+        if usage is None:
+            return None
+        return {
+            "totals": usage.totals.snapshot(),
+            "by_agent": {agent_type: totals.snapshot() for agent_type, totals in sorted(usage.by_agent.items())},
+            "records": list(usage.records),
+        }
+
+
+class UsageRecordingChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Records every call in a UsageLedger: tokens from the result's usage and
+    wall time including any queueing below. Session, agent type and hop come
+    from the request context. Cache hits and coalesced calls report zero
+    usage, so they show up as calls that cost nothing.
+    """
+
+    def __init__(self, inner, ledger: UsageLedger, model: str):
+        super().__init__(inner)
+        self._ledger = ledger
+        self._model = model
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        start = time.perf_counter()
+        try:
+            result = await self._inner.create(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+        except Exception as e:
+            self._ledger.record(self._model, 0, 0, time.perf_counter() - start, error=type(e).__name__)
+            raise
+        self._record(result, time.perf_counter() - start)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools=[],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        start = time.perf_counter()
+        try:
+            async for chunk in self._inner.create_stream(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            ):
+                if isinstance(chunk, CreateResult):
+                    self._record(chunk, time.perf_counter() - start)
+                yield chunk
+        except Exception as e:
+            self._ledger.record(self._model, 0, 0, time.perf_counter() - start, error=type(e).__name__)
+            raise
+
+    def _record(self, result: CreateResult, seconds: float):
+        self._ledger.record(
+            self._model,
+            result.usage.prompt_tokens,
+            result.usage.completion_tokens,
+            seconds,
+            cached=result.cached,
+        )
@@ -0,0 +1,156 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, SystemMessage, UserMessage
+
+from app.routing.classification_prompt import (
+    build_batch_classification_prompt,
+    build_classification_prompt,
+    parse_agent_name,
+    parse_agent_names,
+)
+
+
+class ClassificationBatcher:
+    """
+    Collects classification requests from all sessions for up to max_wait_ms
+    (or until max_batch_size are queued) and sends them to the model as a single
+    prompt. Items whose batch answer cannot be parsed, or that are missing from
+    it, are retried one by one. A failed model call (429, timeout, open
+    circuit) fails every item in the batch; retrying them singly would only
+    multiply the load on a provider that is already struggling.
+    """
+
+    def __init__(
+        self,
+        model_client: ChatCompletionClient,
+        system_message: SystemMessage,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+    ):
+        self._model_client = model_client
+        self._system_message = system_message
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.single_calls = 0
+        self.fallbacks = 0
+
+    async def classify(self, user_content: str, cancellation_token: CancellationToken = None) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_content, future))
+        self.requests += 1
+
+        if len(self._pending) >= self._max_batch_size:
+            self._flush_now()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._max_wait, self._flush_now)
+
+        if cancellation_token is not None:
+            cancellation_token.link_future(future)
+        return await future
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch = [(q, f) for q, f in self._pending if not f.done()]
+        self._pending = []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        if len(batch) == 1:
+            query, future = batch[0]
+            await self._run_single(query, future)
+            return
+
+        self.batches += 1
+        self.batched_items += len(batch)
+        token = CancellationToken()
+        for _, future in batch:
+            future.add_done_callback(lambda _, b=batch, t=token: self._cancel_if_abandoned(b, t))
+
+        try:
+            llm_result = await self._model_client.create(
+                messages=[
+                    self._system_message,
+                    UserMessage(
+                        content=build_batch_classification_prompt([q for q, _ in batch]),
+                        source="System",
+                    ),
+                ],
+                cancellation_token=token,
+            )
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            print(f"Batch classification failed: {e!r}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        print(f"\n*** ClassificationBatcher LLM response ({len(batch)} items) ***\n{llm_result.content}", flush=True)
+        names = parse_agent_names(llm_result.content, len(batch))
+
+        retries = []
+        for (query, future), name in zip(batch, names):
+            if future.done():
+                continue
+            if name is None:
+                retries.append(self._run_single(query, future))
+            else:
+                future.set_result(name)
+        if retries:
+            self.fallbacks += len(retries)
+            await asyncio.gather(*retries)
+
+    async def _run_single(self, query: str, future: asyncio.Future):
+        self.single_calls += 1
+        token = CancellationToken()
+        future.add_done_callback(lambda f: token.cancel() if f.cancelled() else None)
+        try:
+            llm_result = await self._model_client.create(
+                messages=[
+                    self._system_message,
+                    UserMessage(content=build_classification_prompt(query), source="System"),
+                ],
+                cancellation_token=token,
+            )
+            name = parse_agent_name(llm_result.content)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(name)
+
+    @staticmethod
+    def _cancel_if_abandoned(batch, token: CancellationToken):
+        if all(f.cancelled() for _, f in batch):
+            token.cancel()
+
+    def stats(self) -> dict:
+        llm_requests = self.batches + self.single_calls
+        return {
+            "requests": self.requests,
+            "llm_requests": llm_requests,
+            "batches": self.batches,
+            "avg_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+            "single_calls": self.single_calls,
+            "fallbacks": self.fallbacks,
+            "requests_saved": max(self.requests - llm_requests, 0),
+        }
@@ -0,0 +1,85 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+_TX_ID_RE = re.compile(r"\btx[\s_-]?\d+\b")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_PUNCT_RE = re.compile(r"[^\w<>]+")
+
+
+def normalize_query(text: str) -> str:
+    text = text.lower()
+    text = _TX_ID_RE.sub(" <txid> ", text)
+    text = _NUMBER_RE.sub(" <num> ", text)
+    text = _PUNCT_RE.sub(" ", text)
+    return " ".join(text.split())
+
+
+class ClassificationCache:
+    """
+    Bounded LRU + TTL cache from (normalised query text, last routed agent)
+    to agent_name.
+    Entries are tied to a prompt fingerprint; seeing a different fingerprint
+    drops every entry, so a changed prompt or agent set never serves stale routes.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0, clock=time.monotonic):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._fingerprint: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_fingerprint(self, fingerprint: str):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._fingerprint = fingerprint
+
+    def get(self, query: str, fingerprint: str, last_agent: Optional[str] = None) -> Optional[str]:
+        self._check_fingerprint(fingerprint)
+        key = (normalize_query(query), last_agent)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        agent_name, expires_at = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return agent_name
+
+    def put(self, query: str, fingerprint: str, agent_name: str, last_agent: Optional[str] = None):
+        self._check_fingerprint(fingerprint)
+        key = (normalize_query(query), last_agent)
+        self._entries[key] = (agent_name, self._clock() + self._ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self._max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,52 @@
+from collections import deque
+from typing import Optional
+
+
+class RollingClassificationContext:
+    """
+    Compact per-session state for the classifier: the last few user inputs
+    (truncated) and the last routed agent. The classifier sees the newest input
+    plus this state instead of the whole conversation, so its prompt size stays
+    constant however long the session gets.
+    """
+
+    def __init__(self, max_turns: int = 2, max_chars: int = 160):
+        self._recent = deque(maxlen=max_turns)
+        self._max_chars = max_chars
+        self._last_agent: Optional[str] = None
+        self._context_len = 0
+
+    @property
+    def last_agent(self) -> Optional[str]:
+        return self._last_agent
+
+    def observe_context_length(self, context_len: int, compacted: bool = False):
+        # The conversation context only ever grows within a session; if it got
+        # shorter the messages were reset and the old state no longer applies.
+        # A compacted context (older turns folded into a summary) is the same session.
+        if context_len < self._context_len and not compacted:
+            self.reset()
+        self._context_len = context_len
+
+    def build_input(self, newest: str) -> str:
+        newest = newest.strip()
+        if not self._recent and self._last_agent is None:
+            return newest
+        parts = [newest, ""]
+        if self._recent:
+            parts.append("Earlier in this conversation the user said: " + " | ".join(self._recent))
+        if self._last_agent is not None:
+            parts.append(f"Previously routed to: {self._last_agent}")
+        return "\n".join(parts)
+
+    def update(self, newest: str, agent_name: str):
+        newest = " ".join(newest.split())
+        if len(newest) > self._max_chars:
+            newest = newest[: self._max_chars - 3] + "..."
+        self._recent.append(newest)
+        self._last_agent = agent_name
+
+    def reset(self):
+        self._recent.clear()
+        self._last_agent = None
+        self._context_len = 0
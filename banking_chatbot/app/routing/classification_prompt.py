@@ -0,0 +1,96 @@
+import hashlib
+import json
+from typing import List, Optional
+
+from autogen_core.models import SystemMessage
+
+from app.messages.message_types import ALLOWED_AGENTS, DomainClassifierOutput
+
+
+def build_classification_prompt(user_content: str) -> str:
+    return (
+    "You are an expert banking domain classifier. Your task is to decide which domain is relevant.\n"
+    "Possible agent names: RetailBankingAgent, CorporateBusinessBankingAgent, InvestmentBankingAgent,\n"
+    "WealthManagementAgent, RiskManagementAgent, InsuranceAgent, ITOpsAgent, PaymentsAgent,\n"
+    "CapitalTreasuryAgent, AnalyticsAgent\n\n"
+    f"User query: {user_content}\n\n"
+    "Respond with JSON: {\"agent_name\": \"OneOfTheAbove\"}\n"
+    "If the user wants to do a normal payment or personal transaction, use RetailBankingAgent, "
+    "not PaymentsAgent. Only route to PaymentsAgent if the user specifically reports a mismatch "
+    "or discrepancy or some failure in the payment process.\n"
+    "Examples:\n"
+    "User: \"How do I pay John 100?\" => Agent: \"RetailBankingAgent\"\n"
+    "User: \"My payment success isn't reflecting in the system\" => Agent: \"PaymentsAgent\""
+)
+
+
+def parse_agent_name(content: str) -> Optional[str]:
+    """
+    Extracts and validates the agent_name from an LLM reply.
+    Returns None if the reply does not contain a valid DomainClassifierOutput.
+    """
+    try:
+        content = content.strip()
+        json_start = content.find("{")
+        json_end = content.rfind("}") + 1
+        json_str = content[json_start:json_end]
+        return DomainClassifierOutput.model_validate_json(json_str).agent_name
+    except Exception as e:
+        print(f"Classification parse error: {e}")
+        return None
+
+
+def classification_fingerprint(system_message: SystemMessage) -> str:
+    """
+    Hash of everything that decides a classification besides the query itself:
+    the system message, the prompt template and the allowed agent names.
+    """
+    h = hashlib.sha256()
+    h.update(system_message.content.encode("utf-8"))
+    h.update(build_classification_prompt("{user_content}").encode("utf-8"))
+    h.update("|".join(sorted(ALLOWED_AGENTS)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_batch_classification_prompt(queries: List[str]) -> str:
+    numbered = "\n".join(f"{i + 1}. {' '.join(q.split())}" for i, q in enumerate(queries))
+    return (
+    "You are an expert banking domain classifier. For each numbered user query below, decide which domain is relevant.\n"
+    "Possible agent names: RetailBankingAgent, CorporateBusinessBankingAgent, InvestmentBankingAgent,\n"
+    "WealthManagementAgent, RiskManagementAgent, InsuranceAgent, ITOpsAgent, PaymentsAgent,\n"
+    "CapitalTreasuryAgent, AnalyticsAgent\n\n"
+    f"User queries:\n{numbered}\n\n"
+    f"Respond with a JSON array of exactly {len(queries)} agent names, in the same order as the queries: "
+    "[\"OneOfTheAbove\", ...]\n"
+    "If the user wants to do a normal payment or personal transaction, use RetailBankingAgent, "
+    "not PaymentsAgent. Only route to PaymentsAgent if the user specifically reports a mismatch "
+    "or discrepancy or some failure in the payment process.\n"
+    "Examples:\n"
+    "User: \"How do I pay John 100?\" => Agent: \"RetailBankingAgent\"\n"
+    "User: \"My payment success isn't reflecting in the system\" => Agent: \"PaymentsAgent\""
+)
+
+
+def parse_agent_names(content: str, expected: int) -> List[Optional[str]]:
+    """
+    Parses the JSON array returned for a batch prompt. Items that are missing or
+    invalid come back as None; if the array cannot be read at all, every item is None.
+    """
+    names: List[Optional[str]] = [None] * expected
+    try:
+        content = content.strip()
+        items = json.loads(content[content.find("["):content.rfind("]") + 1])
+    except Exception as e:
+        print(f"Batch classification parse error: {e}")
+        return names
+    if not isinstance(items, list) or len(items) != expected:
+        print(f"Batch classification returned {len(items) if isinstance(items, list) else 'no'} items, expected {expected}")
+        return names
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            item = item.get("agent_name")
+        try:
+            names[i] = DomainClassifierOutput(agent_name=item).agent_name
+        except Exception:
+            pass
+    return names
@@ -0,0 +1,44 @@
+import json
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from app.routing.local_classifier import tokenize
+
+
+def hashed_features(text: str, n_features: int) -> List[int]:
+    # crc32 rather than hash() so feature ids are stable across processes.
+    return [zlib.crc32(tok.encode("utf-8")) % n_features for tok in tokenize(text)]
+
+
+class HashedNgramClassifier:
+    """
+    Logistic regression over hashed unigrams and bigrams, trained offline from
+    the routing dataset by app.runner.train_router. The weight matrix is
+    memory-mapped, so loading it at startup costs almost nothing and several
+    worker processes share the same pages.
+    """
+
+    def __init__(self, labels: List[str], weights: np.ndarray, n_features: int):
+        self.labels = labels
+        self._weights = weights
+        self._n_features = n_features
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramClassifier":
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        weights = np.load(path + ".npy", mmap_mode="r")
+        return cls(meta["labels"], weights, meta["n_features"])
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        idx = hashed_features(text, self._n_features)
+        if not idx:
+            return self.labels[0], 0.0
+        # The last row of the weight matrix holds the bias.
+        logits = np.asarray(self._weights[idx]).sum(axis=0) + self._weights[self._n_features]
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
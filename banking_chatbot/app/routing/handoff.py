@@ -0,0 +1,36 @@
+from typing import List
+
+from autogen_core import FunctionCall
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+)
+
+
+def build_handoff_context(context: List[LLMMessage], tool_name: str, target_topic: str, source: str) -> List[LLMMessage]:
+    """
+    Copies the conversation and appends the auto_handoff call/result pair the
+    domain agents expect to see before they adopt their persona.
+    """
+    new_context = list(context)
+    new_context.append(
+        AssistantMessage(
+            content=[FunctionCall(id="auto_handoff", name=tool_name, arguments="{}")],
+            source=source,
+        )
+    )
+    new_context.append(
+        FunctionExecutionResultMessage(
+            content=[
+                FunctionExecutionResult(
+                    call_id="auto_handoff",
+                    content=f"Transferred to {target_topic} agent. Please adopt persona immediately.",
+                    is_error=False,
+                    name=tool_name,
+                )
+            ]
+        )
+    )
+    return new_context
@@ -0,0 +1,191 @@
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.messages.message_types import ALLOWED_AGENTS
+
+
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "RetailBankingAgent": [
+        "check my balance",
+        "what is my account balance",
+        "how much money do i have",
+        "pay bob 100",
+        "make a payment to john",
+        "send money to my friend",
+        "transfer 500 to alice",
+        "pay receiver amount ifsc",
+        "open a savings account",
+        "personal loan emi",
+        "debit card blocked",
+        "credit card bill",
+        "change my address on my account",
+        "home loan interest rate",
+    ],
+    "CorporateBusinessBankingAgent": [
+        "business account for my company",
+        "corporate banking services",
+        "working capital loan for my business",
+        "trade finance letter of credit",
+        "payroll services for employees",
+        "commercial lending for a small business",
+        "cash management for corporates",
+    ],
+    "InvestmentBankingAgent": [
+        "merger and acquisition advisory",
+        "m&a deal",
+        "ipo underwriting",
+        "capital raising for a startup",
+        "equity issuance",
+        "debt underwriting bond issue",
+        "investment banking advisory",
+    ],
+    "WealthManagementAgent": [
+        "wealth management advice",
+        "private banking for high net worth",
+        "portfolio management",
+        "estate planning and trusts",
+        "retirement planning investments",
+        "mutual funds to invest my savings",
+        "financial advisor for my wealth",
+    ],
+    "RiskManagementAgent": [
+        "regulatory compliance requirements",
+        "credit risk assessment",
+        "operational risk",
+        "anti money laundering kyc",
+        "basel capital requirements",
+        "fraud risk controls",
+        "compliance audit",
+    ],
+    "InsuranceAgent": [
+        "insurance policy",
+        "life insurance plan",
+        "health insurance claim",
+        "file an insurance claim",
+        "bancassurance products",
+        "car insurance premium",
+        "policy renewal and coverage",
+    ],
+    "ITOpsAgent": [
+        "cannot login to net banking",
+        "mobile app not working",
+        "website is down",
+        "password reset for online banking",
+        "security breach in it systems",
+        "server outage",
+        "otp not received",
+    ],
+    "PaymentsAgent": [
+        "payment not reflecting",
+        "payment mismatch",
+        "payment discrepancy",
+        "gateway shows success but not in bank system",
+        "money debited but not credited",
+        "transaction failed but amount deducted",
+        "payment success isn't reflecting in core banking",
+        "settlement issue with my transaction",
+    ],
+    "CapitalTreasuryAgent": [
+        "treasury operations",
+        "liquidity management",
+        "capital markets desk",
+        "foreign exchange hedging",
+        "interest rate swaps",
+        "money market and bonds trading",
+        "asset liability management",
+    ],
+    "AnalyticsAgent": [
+        "analytics report",
+        "business intelligence dashboard",
+        "data analysis of transactions",
+        "spending insights report",
+        "customer analytics",
+        "generate a reporting dashboard",
+        "trend analysis of my spending",
+    ],
+}
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9&']+")
+
+
+def tokenize(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    words = ["<num>" if w.isdigit() else w for w in words]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class LocalDomainClassifier:
+    """
+    In-process TF-IDF classifier over the same labels as DomainClassifierOutput.
+    Each label is represented by the L2-normalised TF-IDF centroid of its seed
+    examples; a query is scored by cosine similarity and the scores are turned
+    into a confidence with a softmax.
+    """
+
+    def __init__(
+        self,
+        examples: Dict[str, List[str]] = None,
+        temperature: float = 0.05,
+        min_similarity: float = 0.1,
+    ):
+        examples = examples or SEED_EXAMPLES
+        self.labels = [label for label in ALLOWED_AGENTS if label in examples]
+        self._temperature = temperature
+        self._min_similarity = min_similarity
+
+        vocab: Dict[str, int] = {}
+        docs = []
+        for label in self.labels:
+            tokens = []
+            for example in examples[label]:
+                tokens.extend(tokenize(example))
+            docs.append(tokens)
+            for tok in tokens:
+                vocab.setdefault(tok, len(vocab))
+        self._vocab = vocab
+
+        counts = np.zeros((len(self.labels), len(vocab)), dtype=np.float32)
+        for row, tokens in enumerate(docs):
+            for tok in tokens:
+                counts[row, vocab[tok]] += 1.0
+
+        doc_freq = (counts > 0).sum(axis=0)
+        self._idf = np.log((1.0 + len(self.labels)) / (1.0 + doc_freq)) + 1.0
+        weights = counts * self._idf
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        self._weights = weights / np.maximum(norms, 1e-9)
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        vec = np.zeros(len(self._vocab), dtype=np.float32)
+        unknown = 0
+        for tok in tokenize(text):
+            idx = self._vocab.get(tok)
+            if idx is not None:
+                vec[idx] += 1.0
+            else:
+                unknown += 1
+        vec *= self._idf
+        # Out-of-vocabulary tokens still count towards the norm so that a query
+        # mostly made of words we have never seen cannot look confident.
+        norm = np.sqrt(np.dot(vec, vec) + unknown * self._idf.max() ** 2)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+    def scores(self, text: str) -> np.ndarray:
+        return self._weights @ self._vectorize(text)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Returns (agent_name, confidence). Confidence is 0.0 when the best
+        cosine similarity is below min_similarity.
+        """
+        sims = self.scores(text)
+        best = int(np.argmax(sims))
+        if sims[best] < self._min_similarity:
+            return self.labels[best], 0.0
+        exp = np.exp((sims - sims[best]) / self._temperature)
+        return self.labels[best], float(exp[best] / exp.sum())
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+import time
+from typing import List, Tuple
+
+
+class RoutingDatasetWriter:
+    """
+    Append-only JSONL log of classifier decisions made by the LLM. record()
+    only buffers the line; a background task appends the buffer with
+    asyncio.to_thread, one O_APPEND write per batch so several processes can
+    share a file. close() waits for the buffer to be written.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pending: List[str] = []
+        self._flusher = None
+        self.records = 0
+        self.failed = 0
+
+    def record(self, query: str, agent_name: str, classifier_input: str = None):
+        self._pending.append(json.dumps(
+            {
+                "ts": time.time(),
+                "query": query,
+                "agent_name": agent_name,
+                "classifier_input": classifier_input if classifier_input is not None else query,
+            },
+            ensure_ascii=False,
+        ) + "\n")
+        if self._flusher is None or self._flusher.done():
+            try:
+                self._flusher = asyncio.get_running_loop().create_task(self._flush())
+            except RuntimeError:
+                # No event loop (e.g. a script): write inline.
+                self._write_pending()
+
+    async def _flush(self):
+        while self._pending:
+            lines, self._pending = self._pending, []
+            await asyncio.to_thread(self._write, lines)
+
+    def _write_pending(self):
+        lines, self._pending = self._pending, []
+        self._write(lines)
+
+    def _write(self, lines: List[str]):
+        try:
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, "".join(lines).encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.failed += len(lines)
+            print(f"Routing dataset write to {self._path} failed: {e}")
+            return
+        self.records += len(lines)
+
+    async def close(self):
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+        if self._pending:
+            await asyncio.to_thread(self._write_pending)
+
+
+def load_routing_dataset(path: str) -> List[Tuple[str, str]]:
+    """
+    Reads (query, agent_name) pairs from a dataset written by RoutingDatasetWriter.
+    Malformed lines (e.g. a partially written last line) are skipped.
+    """
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                pairs.append((row["query"], row["agent_name"]))
+            except (ValueError, KeyError):
+                continue
+    return pairs
@@ -0,0 +1,85 @@
+from collections import defaultdict
+from typing import Dict
+
+
+class RoutingStats:
+    """
+    Counters for the classifier fast path. Latency saved for a route is the
+    number of local decisions times the average LLM classification latency,
+    minus the time spent in the local classifier itself.
+    """
+
+    def __init__(self):
+        self._local_hits: Dict[str, int] = defaultdict(int)
+        self._local_seconds: Dict[str, float] = defaultdict(float)
+        self._llm_calls: Dict[str, int] = defaultdict(int)
+        self._llm_seconds: Dict[str, float] = defaultdict(float)
+
+    def record_local(self, agent_name: str, seconds: float):
+        self._local_hits[agent_name] += 1
+        self._local_seconds[agent_name] += seconds
+
+    def record_llm(self, agent_name: str, seconds: float):
+        self._llm_calls[agent_name] += 1
+        self._llm_seconds[agent_name] += seconds
+
+    def avg_llm_latency(self, agent_name: str = None) -> float:
+        if agent_name is not None and self._llm_calls[agent_name]:
+            return self._llm_seconds[agent_name] / self._llm_calls[agent_name]
+        calls = sum(self._llm_calls.values())
+        return sum(self._llm_seconds.values()) / calls if calls else 0.0
+
+    def snapshot(self) -> dict:
+        routes = {}
+        for agent_name in sorted(set(self._local_hits) | set(self._llm_calls)):
+            local_hits = self._local_hits[agent_name]
+            llm_calls = self._llm_calls[agent_name]
+            saved = local_hits * self.avg_llm_latency(agent_name) - self._local_seconds[agent_name]
+            routes[agent_name] = {
+                "local_hits": local_hits,
+                "llm_calls": llm_calls,
+                "hit_rate": local_hits / (local_hits + llm_calls),
+                "latency_saved_ms": round(max(saved, 0.0) * 1000, 2),
+            }
+        total_local = sum(self._local_hits.values())
+        total = total_local + sum(self._llm_calls.values())
+        return {
+            "total": total,
+            "hit_rate": total_local / total if total else 0.0,
+            "avg_llm_latency_ms": round(self.avg_llm_latency() * 1000, 2),
+            "routes": routes,
+        }
+
+
+class SpeculationStats:
+    """
+    Counters for speculative routing. A hit is a speculation the classifier
+    later agreed with; wasted tokens are spent on speculations it rejected.
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+
+    def record_attempt(self):
+        self.attempts += 1
+
+    def record_hit(self):
+        self.hits += 1
+
+    def record_miss(self, wasted_tokens: int):
+        self.misses += 1
+        self.wasted_tokens += wasted_tokens
+
+    def snapshot(self) -> dict:
+        decided = self.hits + self.misses
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "misses": self.misses,
+            "accuracy": self.hits / decided if decided else 0.0,
+            "wasted_tokens": self.wasted_tokens,
+            "avg_wasted_tokens_per_miss": self.wasted_tokens / self.misses if self.misses else 0.0,
+        }
@@ -0,0 +1,30 @@
+class StickySessionRouter:
+    """
+    Decides whether a follow-up turn can go straight to the domain agent a
+    session was last routed to. The turn is sent back to the classifier only
+    when the local classifier confidently points at a different agent.
+    """
+
+    def __init__(self, local_classifier, drift_threshold: float = 0.6):
+        self._local_classifier = local_classifier
+        self._drift_threshold = drift_threshold
+
+        self.sticky_hits = 0
+        self.drift_reclassifications = 0
+
+    def has_drifted(self, user_text: str, routed_agent: str) -> bool:
+        agent_name, confidence = self._local_classifier.predict(user_text)
+        if agent_name != routed_agent and confidence >= self._drift_threshold:
+            print(f"Topic drift detected ({routed_agent} -> {agent_name}, confidence {confidence:.2f})")
+            self.drift_reclassifications += 1
+            return True
+        self.sticky_hits += 1
+        return False
+
+    def stats(self) -> dict:
+        total = self.sticky_hits + self.drift_reclassifications
+        return {
+            "sticky_hits": self.sticky_hits,
+            "drift_reclassifications": self.drift_reclassifications,
+            "sticky_rate": self.sticky_hits / total if total else 0.0,
+        }
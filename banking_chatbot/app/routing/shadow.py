@@ -0,0 +1,92 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+
+class ShadowEvaluator:
+    """
+    Runs a candidate router next to the live classifier without affecting it.
+    Each observed decision schedules the candidate on the default executor
+    after the live route has been chosen; only its answer and timing are
+    recorded. The candidate needs a predict(text) -> (agent_name, confidence)
+    method, like LocalDomainClassifier or HashedNgramClassifier.
+
+    Decisions are tallied by where the live route came from ("llm", "local",
+    "cache" or "fallback"). Only "llm" says how well the candidate could
+    replace the LLM; a tf-idf candidate always agrees with a tf-idf decision,
+    and a cache hit's latency is not an LLM call's.
+    """
+
+    def __init__(self, candidate, name: str, sample_rate: float = 1.0, max_pending: int = 100):
+        self._candidate = candidate
+        self.name = name
+        self._sample_rate = sample_rate
+        self._max_pending = max_pending
+        self._tasks = set()
+
+        self._observed = defaultdict(int)
+        self._agreements = defaultdict(int)
+        self._live_seconds = defaultdict(float)
+        self._candidate_seconds = defaultdict(float)
+        self.dropped = 0
+        self.errors = 0
+
+    def observe(self, query: str, live_agent: str, live_seconds: float, source: str = "llm"):
+        if self._sample_rate < 1.0 and random.random() >= self._sample_rate:
+            return
+        if len(self._tasks) >= self._max_pending:
+            self.dropped += 1
+            return
+        task = asyncio.create_task(self._evaluate(query, live_agent, live_seconds, source))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _evaluate(self, query: str, live_agent: str, live_seconds: float, source: str):
+        try:
+            loop = asyncio.get_running_loop()
+            candidate_agent, candidate_seconds = await loop.run_in_executor(None, self._timed_predict, query)
+        except Exception as e:
+            self.errors += 1
+            print(f"Shadow router {self.name} failed: {e}")
+            return
+        key = (source, live_agent)
+        self._observed[key] += 1
+        self._live_seconds[key] += live_seconds
+        self._candidate_seconds[key] += candidate_seconds
+        if candidate_agent == live_agent:
+            self._agreements[key] += 1
+
+    def _timed_predict(self, query: str):
+        start = time.perf_counter()
+        agent_name, _ = self._candidate.predict(query)
+        return agent_name, time.perf_counter() - start
+
+    def _summary(self, keys) -> dict:
+        n = sum(self._observed[key] for key in keys)
+        live_ms = sum(self._live_seconds[key] for key in keys) / n * 1000
+        candidate_ms = sum(self._candidate_seconds[key] for key in keys) / n * 1000
+        return {
+            "observed": n,
+            "agreement_rate": sum(self._agreements[key] for key in keys) / n,
+            "live_avg_ms": round(live_ms, 3),
+            "candidate_avg_ms": round(candidate_ms, 3),
+            "latency_gain_ms": round(live_ms - candidate_ms, 3),
+        }
+
+    def stats(self) -> dict:
+        sources = {}
+        for source in sorted({source for source, _ in self._observed}):
+            keys = [key for key in self._observed if key[0] == source]
+            sources[source] = self._summary(keys)
+            sources[source]["domains"] = {key[1]: self._summary([key]) for key in sorted(keys)}
+        llm = sources.get("llm")
+        return {
+            "candidate": self.name,
+            "observed": sum(self._observed.values()),
+            # Agreement with the LLM is the number that matters for a promotion.
+            "agreement_rate": llm["agreement_rate"] if llm else 0.0,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "sources": sources,
+        }
@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+import os
+
+from app.runtime.distributed import AGENT_GROUPS
+from app.runtime.runtime_manager import RuntimeManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve agent groups for a front end started with AGENT_HOST_ADDRESS.")
+    parser.add_argument("--host", default=os.getenv("AGENT_HOST_ADDRESS", "localhost:50051"))
+    parser.add_argument("--groups", required=True, help=f"comma-separated, from: {', '.join(AGENT_GROUPS)}")
+    args = parser.parse_args()
+
+    # Same session store as the front end (SESSION_BACKEND / SESSION_STORE_URL).
+    manager = RuntimeManager(
+        session_backend=os.getenv("SESSION_BACKEND", "sqlite"),
+        session_store_url=os.getenv("SESSION_STORE_URL"),
+        agent_host_address=args.host,
+    )
+    asyncio.run(manager.run_agent_worker(args.groups.split(",")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+
+
+import argparse
+import json
+from collections import Counter
+
+import numpy as np
+
+from app.messages.message_types import ALLOWED_AGENTS
+from app.routing.distilled_classifier import HashedNgramClassifier, hashed_features
+from app.routing.routing_dataset import load_routing_dataset
+
+
+def train(pairs, n_features: int = 2 ** 18, epochs: int = 200, lr: float = 0.5, l2: float = 1e-4):
+    labels = [label for label in ALLOWED_AGENTS if any(agent == label for _, agent in pairs)]
+    label_idx = {label: i for i, label in enumerate(labels)}
+    pairs = [(q, a) for q, a in pairs if a in label_idx]
+
+    features = [hashed_features(q, n_features) for q, _ in pairs]
+    rows = np.concatenate([np.asarray(f, dtype=np.int64) for f in features])
+    sample_of_row = np.repeat(np.arange(len(pairs)), [len(f) for f in features])
+    targets = np.zeros((len(pairs), len(labels)), dtype=np.float32)
+    targets[np.arange(len(pairs)), [label_idx[a] for _, a in pairs]] = 1.0
+
+    # Rows 0..n_features-1 are feature weights, row n_features is the bias.
+    weights = np.zeros((n_features + 1, len(labels)), dtype=np.float32)
+    touched = np.unique(rows)
+    n = float(len(pairs))
+
+    for _ in range(epochs):
+        logits = np.zeros((len(pairs), len(labels)), dtype=np.float32)
+        np.add.at(logits, sample_of_row, weights[rows])
+        logits += weights[n_features]
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        grad = (probs - targets) / n
+
+        weights[touched] *= 1.0 - lr * l2
+        np.add.at(weights, rows, -lr * grad[sample_of_row])
+        weights[n_features] -= lr * grad.sum(axis=0)
+
+    return labels, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distil logged LLM routing decisions into a local model.")
+    parser.add_argument("--dataset", required=True, help="JSONL file written by RoutingDatasetWriter")
+    parser.add_argument("--out", required=True, help="Output path prefix; writes <out>.npy and <out>.json")
+    parser.add_argument("--features", type=int, default=2 ** 18)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--lr", type=float, default=0.5)
+    args = parser.parse_args()
+
+    pairs = load_routing_dataset(args.dataset)
+    if not pairs:
+        raise SystemExit(f"No usable records in {args.dataset}")
+    print(f"Training on {len(pairs)} records: {dict(Counter(a for _, a in pairs))}")
+
+    labels, weights = train(pairs, n_features=args.features, epochs=args.epochs, lr=args.lr)
+    np.save(args.out + ".npy", weights)
+    with open(args.out + ".json", "w", encoding="utf-8") as f:
+        json.dump({"labels": labels, "n_features": args.features, "records": len(pairs)}, f, indent=2)
+
+    model = HashedNgramClassifier.load(args.out)
+    correct = sum(model.predict(q)[0] == a for q, a in pairs)
+    print(f"Saved {args.out}.npy / {args.out}.json, training accuracy {correct / len(pairs):.3f}")
+
+
+if __name__ == "__main__":
+    main()
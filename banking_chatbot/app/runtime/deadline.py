@@ -0,0 +1,50 @@
+import asyncio
+import time
+from typing import Optional
+
+from autogen_core import CancellationToken
+
+DEGRADED_REPLY = (
+    "I'm sorry, this is taking longer than expected and I couldn't finish your request. "
+    "Please try again in a moment."
+)
+
+
+def deadline_from_budget(budget_seconds: Optional[float]) -> Optional[float]:
+    if budget_seconds is None:
+        return None
+    return time.time() + budget_seconds
+
+
+class TurnDeadline:
+    """
+    Wall-clock deadline of one user turn. UserTask carries it as an epoch
+    timestamp (None means unbounded) so every hop sees the same budget.
+    link() returns a CancellationToken that is cancelled when the deadline
+    passes or when the parent token is cancelled; close() stops the timer.
+    """
+
+    def __init__(self, deadline: Optional[float]):
+        self.deadline = deadline
+        self._timer = None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0.0)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def link(self, parent: CancellationToken = None) -> CancellationToken:
+        token = CancellationToken()
+        if parent is not None:
+            parent.add_callback(token.cancel)
+        if self.deadline is not None:
+            self._timer = asyncio.get_running_loop().call_later(self.remaining(), token.cancel)
+        return token
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,125 @@
+"""
+Multi-process deployment on autogen's gRPC runtime. The FastAPI front end
+hosts GrpcWorkerAgentRuntimeHost and connects to it like any other worker;
+the agent groups below can instead be served by separate worker processes:
+
+    python -m app.runner.agent_worker --host localhost:50051 --groups classifier
+    python -m app.runner.agent_worker --host localhost:50051 --groups retail,payments
+
+The host routes each agent type to the one process that registered it.
+Session state must be in a shared store (SESSION_BACKEND=sqlite or redis),
+since agents in every process read and write it.
+"""
+
+import asyncio
+import time
+from typing import Callable, Iterable, Optional, Set
+
+from autogen_core import MessageContext, RoutedAgent, TopicId, TypeSubscription, message_handler
+from autogen_ext.runtimes.grpc import GrpcWorkerAgentRuntime, GrpcWorkerAgentRuntimeHost
+
+from app.messages.message_types import AgentResponse, AgentResponseDelta, ProgressEvent, UserTask
+from app.runtime.serialization import register_message_serializers
+
+# Agent types that can be moved out of the front end, by group name.
+AGENT_GROUPS = {
+    "classifier": ("DomainClassifier",),
+    "retail": ("RetailBanking", "CheckBalance", "MakePayment"),
+    "payments": ("Payments",),
+}
+
+
+def agent_types_for(groups: Iterable[str]) -> Set[str]:
+    agent_types = set()
+    for group in groups:
+        if group not in AGENT_GROUPS:
+            raise ValueError(f"Unknown agent group: {group} (expected one of {', '.join(AGENT_GROUPS)})")
+        agent_types.update(AGENT_GROUPS[group])
+    return agent_types
+
+
+def start_agent_host(address: str) -> GrpcWorkerAgentRuntimeHost:
+    host = GrpcWorkerAgentRuntimeHost(address=address)
+    host.start()
+    return host
+
+
+class AgentWorkerRuntime(GrpcWorkerAgentRuntime):
+    """
+    gRPC worker runtime for the front end and the agent workers. Like
+    HookedAgentRuntime it reports every UserTask handoff as progress, but as
+    a ProgressEvent on the user topic, since the websocket may live in
+    another process.
+    """
+
+    def __init__(self, host_address: str, user_topic_type: str = "User", progress_events: bool = True):
+        super().__init__(host_address=host_address)
+        register_message_serializers(self)
+        self._user_topic_type = user_topic_type
+        self._progress_events = progress_events
+
+    async def start_when_ready(self, timeout: float = 30.0):
+        # Workers may come up before the host; keep trying until it accepts us.
+        give_up = time.monotonic() + timeout
+        while True:
+            try:
+                await self.start()
+                return
+            except Exception as e:
+                if time.monotonic() >= give_up:
+                    raise
+                print(f"Agent host {self._host_address} not reachable yet ({type(e).__name__}), retrying", flush=True)
+                await asyncio.sleep(0.5)
+
+    def forget_session(self, session_id: str):
+        for agent_id in [agent_id for agent_id in self._instantiated_agents if agent_id.key == session_id]:
+            del self._instantiated_agents[agent_id]
+
+    async def publish_message(self, message, topic_id, **kwargs):
+        if self._progress_events and isinstance(message, UserTask):
+            stage = "classifying" if topic_id.type == "DomainClassifier" else f"routed_to:{topic_id.type}"
+            await super().publish_message(ProgressEvent(stage=stage), TopicId(self._user_topic_type, topic_id.source))
+        return await super().publish_message(message, topic_id, **kwargs)
+
+
+class UserTopicRelay(RoutedAgent):
+    """
+    Runs in the front end and receives what agents in any process publish on
+    the user topic, handing it to the RuntimeManager callbacks that the
+    single-process runtime calls directly.
+    """
+
+    def __init__(
+        self,
+        on_agent_response: Callable,
+        on_agent_delta: Callable,
+        on_progress: Optional[Callable] = None,
+    ):
+        super().__init__("UserTopicRelay")
+        self._on_agent_response = on_agent_response
+        self._on_agent_delta = on_agent_delta
+        self._on_progress = on_progress
+
+    @message_handler
+    async def relay_response(self, message: AgentResponse, ctx: MessageContext) -> None:
+        self._on_agent_response(message, ctx.topic_id)
+        if self._on_progress is not None:
+            self._on_progress("done", ctx.topic_id.source)
+
+    @message_handler
+    async def relay_delta(self, message: AgentResponseDelta, ctx: MessageContext) -> None:
+        self._on_agent_delta(message, ctx.topic_id)
+
+    @message_handler
+    async def relay_progress(self, message: ProgressEvent, ctx: MessageContext) -> None:
+        if self._on_progress is not None:
+            self._on_progress(message.stage, ctx.topic_id.source)
+
+
+async def register_user_topic_relay(runtime, on_agent_response, on_agent_delta, on_progress=None, user_topic_type="User"):
+    agent_type = await UserTopicRelay.register(
+        runtime,
+        type="UserTopicRelay",
+        factory=lambda: UserTopicRelay(on_agent_response, on_agent_delta, on_progress),
+    )
+    await runtime.add_subscription(TypeSubscription(topic_type=user_topic_type, agent_type=agent_type.type))
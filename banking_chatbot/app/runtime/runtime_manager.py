@@ -1,17 +1,21 @@
 import asyncio
-from typing import Dict, List, Any
+import os
+import time
+from typing import Any, Callable, Dict, List, Sequence, Set
 from collections import defaultdict
 from fastapi import WebSocket
 
 from autogen_core import SingleThreadedAgentRuntime, TopicId, TypeSubscription
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_core.models import SystemMessage
+from autogen_core.models import ChatCompletionClient, SystemMessage
 
 from app.messages.message_types import (
     UserCredentials,
     UserLogin,
     UserTask,
-    AgentResponse
+    AgentResponse,
+    AgentResponseDelta,
+    ProgressEvent,
 )
 
 from app.agents.authentication_agent import AuthenticationAgent
@@ -42,59 +46,450 @@ from app.tools.delegate_tools import (
     transfer_to_capital_treasury_tool,
     transfer_to_analytics_tool
 )
+from app.routing.local_classifier import LocalDomainClassifier
+from app.routing.routing_stats import RoutingStats, SpeculationStats
+from app.routing.classification_cache import ClassificationCache
+from app.routing.classification_batcher import ClassificationBatcher
+from app.routing.session_router import StickySessionRouter
+from app.routing.handoff import build_handoff_context
+from app.routing.routing_dataset import RoutingDatasetWriter
+from app.routing.distilled_classifier import HashedNgramClassifier
+from app.routing.shadow import ShadowEvaluator
+from app.context.token_budget import ContextBudgetManager, TokenCounter
+from app.context.summarizer import ConversationSummarizer
+from app.runtime.deadline import deadline_from_budget
+from app.sessions.session_store import EVICT_CLOSED, SessionStore, create_session_store
+from app.model_clients.response_cache import CachingChatCompletionClient, SQLiteResponseStore
+from app.model_clients.single_flight import SingleFlightChatCompletionClient
+from app.model_clients.hedging import HedgingChatCompletionClient
+from app.model_clients.request_context import AgentTaggedChatCompletionClient
+from app.model_clients.model_tiers import LoadAwareChatCompletionClient
+from app.model_clients.circuit_breaker import CircuitBreaker, CircuitBreakerChatCompletionClient
+from app.model_clients.usage_accounting import UsageLedger, UsageRecordingChatCompletionClient
+from app.model_clients.rate_limiter import (
+    PRIORITY_TRIAGE,
+    AdaptiveRateLimiter,
+    PrioritizedChatCompletionClient,
+    RateLimitedChatCompletionClient,
+)
 
 
 class ConversationStateAccessor:
-    def __init__(self, state_dict, msg_context_dict):
-        self._state_dict = state_dict
-        self._msg_context_dict = msg_context_dict
+    def __init__(self, session_store: SessionStore):
+        self._sessions = session_store
+
+    async def get_status(self, session_id: str) -> str:
+        return await self._sessions.get_state(session_id, "status", "fresh")
+
+    async def set_status(self, session_id: str, val: str):
+        await self._sessions.update_state(session_id, status=val)
 
-    def get_status(self, session_id: str) -> str:
-        return self._state_dict[session_id].get("status", "fresh")
+    async def reset(self, session_id: str):
+        await self._sessions.reset_state(session_id)
 
-    def set_status(self, session_id: str, val: str):
-        self._state_dict[session_id]["status"] = val
+    async def get_last_agent(self, session_id: str):
+        return await self._sessions.get_state(session_id, "last_agent")
 
-    def reset(self, session_id: str):
-        self._state_dict[session_id] = {}
+    async def set_last_agent(self, session_id: str, agent: str):
+        await self._sessions.update_state(session_id, last_agent=agent)
 
-    def get_last_agent(self, session_id: str):
-        return self._state_dict[session_id].get("last_agent", None)
+    async def get_route(self, session_id: str):
+        route = await self._sessions.get_state(session_id, "route")
+        return tuple(route) if route is not None else None
 
-    def set_last_agent(self, session_id: str, agent: str):
-        self._state_dict[session_id]["last_agent"] = agent
+    async def set_route(self, session_id: str, agent_name: str, tool_name: str, topic: str):
+        await self._sessions.update_state(session_id, route=(agent_name, tool_name, topic))
 
-    def reset_messages(self, session_id: str):
-        self._msg_context_dict[session_id] = []
+    async def reset_messages(self, session_id: str):
+        await self._sessions.replace_messages(session_id, [])
 
 
 class HookedAgentRuntime(SingleThreadedAgentRuntime):
-    def __init__(self, on_agent_response_callback):
+    def __init__(self, on_agent_response_callback, on_agent_delta_callback=None, on_progress_callback=None):
         super().__init__()
         self._on_agent_response_callback = on_agent_response_callback
+        self._on_agent_delta_callback = on_agent_delta_callback
+        self._on_progress_callback = on_progress_callback
+
+    def forget_session(self, session_id: str):
+        # Drops the agent instances keyed by this session; a later message for the
+        # session creates fresh ones.
+        for agent_id in [agent_id for agent_id in self._instantiated_agents if agent_id.key == session_id]:
+            del self._instantiated_agents[agent_id]
 
     async def publish_message(self, message, topic_id, **kwargs):
         if isinstance(message, AgentResponse):
             self._on_agent_response_callback(message, topic_id)
+            self._progress("done", topic_id)
+        elif isinstance(message, UserTask):
+            # Every hop (classifier, domain agent, sub-agent) is a UserTask on its topic.
+            if topic_id.type == "DomainClassifier":
+                self._progress("classifying", topic_id)
+            else:
+                self._progress(f"routed_to:{topic_id.type}", topic_id)
+        # Deltas and progress events only go to the websocket; no agent subscribes to them.
+        if isinstance(message, AgentResponseDelta):
+            if self._on_agent_delta_callback is not None:
+                self._on_agent_delta_callback(message, topic_id)
+            return
+        if isinstance(message, ProgressEvent):
+            self._progress(message.stage, topic_id)
+            return
         return await super().publish_message(message, topic_id, **kwargs)
 
+    def _progress(self, stage: str, topic_id):
+        if self._on_progress_callback is not None and hasattr(topic_id, "source"):
+            self._on_progress_callback(stage, topic_id.source)
+
 
 class RuntimeManager:
-    def __init__(self):
-        self._runtime = HookedAgentRuntime(self._on_agent_response)
-        self._model_client = OpenAIChatCompletionClient(model="gpt-4o-mini", api_key=None)
+    def __init__(
+        self,
+        local_confidence_threshold: float = 0.8,
+        classification_cache_size: int = 1024,
+        classification_cache_ttl: float = 600.0,
+        batch_classification: bool = False,
+        classification_batch_size: int = 16,
+        classification_batch_wait_ms: float = 10.0,
+        speculative_routing: bool = False,
+        speculation_min_confidence: float = 0.3,
+        sticky_routing: bool = False,
+        drift_threshold: float = 0.6,
+        routing_dataset_path: str = None,
+        router_model_path: str = None,
+        shadow_router: str = None,
+        shadow_sample_rate: float = 1.0,
+        context_token_budget: int = 8000,
+        context_token_budgets: Dict[str, int] = None,
+        summarize_conversations: bool = False,
+        summary_model: str = None,
+        summary_keep_recent: int = 6,
+        summary_min_messages: int = 12,
+        stream_responses: bool = False,
+        progress_events: bool = True,
+        turn_budget_seconds: float = 30.0,
+        max_tool_iterations: int = 5,
+        response_cache_agents: List[str] = None,
+        response_cache_path: str = "llm_response_cache.sqlite3",
+        response_cache_ttl: float = 24 * 3600,
+        response_cache_max_mb: float = 64,
+        single_flight: bool = True,
+        rate_limit: bool = True,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+        max_concurrency: int = 64,
+        hedge_requests: bool = False,
+        hedge_budget: float = 0.05,
+        default_model: str = "gpt-4o-mini",
+        classifier_model: str = "gpt-4o-mini",
+        model_profiles: Dict[str, str] = None,
+        downgrade_agents: List[str] = ("Analytics", "InvestmentBanking"),
+        downgrade_model: str = None,
+        downgrade_queue_threshold: int = 8,
+        circuit_breaker: bool = True,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_timeout: float = 30.0,
+        breaker_half_open_probes: int = 1,
+        model_call_timeout: float = 20.0,
+        usage_accounting: bool = True,
+        usage_max_sessions: int = 1000,
+        usage_records_per_session: int = 200,
+        model_prices: Dict[str, tuple] = None,
+        max_sessions: int = 10_000,
+        session_idle_ttl: float = 30 * 60,
+        session_max_messages: int = 200,
+        session_max_kb: float = 512,
+        session_store_max_mb: float = 256,
+        session_sweep_interval: float = 30.0,
+        session_backend: str = "memory",
+        session_store_url: str = None,
+        agent_host_address: str = None,
+        remote_agent_groups: Sequence[str] = (),
+        model_client_factory: Callable[[str], ChatCompletionClient] = None,
+    ):
+        # With agent_host_address (e.g. "localhost:50051") this process hosts the
+        # gRPC runtime and remote_agent_groups run in app.runner.agent_worker
+        # processes; see app.runtime.distributed.
+        self._agent_host_address = agent_host_address
+        self._agent_host = None
+        self._remote_agent_types = set()
+        self._progress_events = progress_events
+        if agent_host_address is None:
+            self._runtime = HookedAgentRuntime(
+                self._on_agent_response,
+                self._on_agent_delta,
+                self._on_progress if progress_events else None,
+            )
+        else:
+            # Imported here so single-process deployments don't need grpcio.
+            from app.runtime.distributed import AgentWorkerRuntime, agent_types_for
+
+            if session_backend == "memory":
+                raise ValueError("A distributed runtime needs a shared session_backend (sqlite or redis)")
+            self._remote_agent_types = agent_types_for(remote_agent_groups)
+            self._runtime = AgentWorkerRuntime(agent_host_address, progress_events=progress_events)
+        self._model_client_factory = model_client_factory or (
+            lambda model: OpenAIChatCompletionClient(model=model, api_key=None)
+        )
+        # Model per agent type, e.g. {"Analytics": "gpt-4o"}; unlisted agents use default_model.
+        self._default_model = default_model
+        self._model_profiles = dict(model_profiles or {})
+        self._model_profiles.setdefault("DomainClassifier", classifier_model)
+        self._token_counter = TokenCounter(default_model)
+
+        # Each model gets its own stack: its own provider limits, latency profile and
+        # in-flight requests. Bottom to top: hedging, rate limiter, single-flight.
+        self._rate_limit_options = None
+        if rate_limit:
+            self._rate_limit_options = {
+                "requests_per_minute": requests_per_minute,
+                "tokens_per_minute": tokens_per_minute,
+                "max_concurrency": max_concurrency,
+            }
+        self._hedge_budget = hedge_budget if hedge_requests else None
+        self._single_flight_enabled = single_flight
+        self._rate_limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self._hedgers: Dict[str, HedgingChatCompletionClient] = {}
+        self._single_flights: Dict[str, SingleFlightChatCompletionClient] = {}
+        self._model_stacks: Dict[str, Any] = {}
+
+        # Under load, downgrade_agents move to downgrade_model (default_model if unset)
+        # so they stop queueing for the same slots as interactive traffic.
+        self._downgrade_agents = set(downgrade_agents or [])
+        self._downgrade_model = downgrade_model or default_model
+        self._downgrade_queue_threshold = downgrade_queue_threshold
+        self._tiered_clients: Dict[str, LoadAwareChatCompletionClient] = {}
+
+        # Agent types (e.g. "Insurance") whose plain text answers are cached on disk.
+        # The SQLite file can be shared by several workers on the same machine.
+        self._response_cache_agents = set(response_cache_agents or [])
+        self._response_store = None
+        self._cached_model_clients: Dict[str, CachingChatCompletionClient] = {}
+        if self._response_cache_agents:
+            self._response_store = SQLiteResponseStore(
+                response_cache_path,
+                ttl_seconds=response_cache_ttl,
+                max_bytes=int(response_cache_max_mb * 1024 * 1024),
+            )
+
+        # One breaker per agent type: after repeated failures or timeouts the agent
+        # stops waiting on the provider and answers from its fallback path instead.
+        self._breaker_options = None
+        if circuit_breaker:
+            self._breaker_options = {
+                "failure_threshold": breaker_failure_threshold,
+                "reset_timeout": breaker_reset_timeout,
+                "half_open_probes": breaker_half_open_probes,
+            }
+        self._model_call_timeout = model_call_timeout
+        self._circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+        # Tokens and wall time of every call, per session, agent type and hop.
+        # model_prices maps a model to USD per million (prompt, completion) tokens.
+        self._usage_ledger = None
+        if usage_accounting:
+            self._usage_ledger = UsageLedger(
+                max_sessions=usage_max_sessions,
+                records_per_session=usage_records_per_session,
+                model_prices=model_prices,
+            )
+
+        self._model_client = self._model_stack(default_model)
+        classifier_model = self._model_profiles["DomainClassifier"]
+        self._triage_model_client = AgentTaggedChatCompletionClient(
+            self._guarded(
+                "DomainClassifier",
+                PrioritizedChatCompletionClient(
+                    self._recorded(classifier_model, self._model_stack(classifier_model)), PRIORITY_TRIAGE
+                ),
+            ),
+            "DomainClassifier",
+        )
+
+        if router_model_path and os.path.exists(router_model_path + ".npy"):
+            print(f"Loading distilled router model from {router_model_path}")
+            self._local_classifier = HashedNgramClassifier.load(router_model_path)
+        else:
+            self._local_classifier = LocalDomainClassifier()
+        self._routing_dataset = RoutingDatasetWriter(routing_dataset_path) if routing_dataset_path else None
+
+        # shadow_router is either "tfidf" for the seed classifier or the path prefix
+        # of a model trained by app.runner.train_router.
+        self._shadow_evaluator = None
+        if shadow_router == "tfidf":
+            self._shadow_evaluator = ShadowEvaluator(LocalDomainClassifier(), "tfidf", sample_rate=shadow_sample_rate)
+        elif shadow_router:
+            self._shadow_evaluator = ShadowEvaluator(
+                HashedNgramClassifier.load(shadow_router), shadow_router, sample_rate=shadow_sample_rate
+            )
+        self._local_confidence_threshold = local_confidence_threshold
+        self._routing_stats = RoutingStats()
+        self._classification_cache = ClassificationCache(
+            max_entries=classification_cache_size,
+            ttl_seconds=classification_cache_ttl,
+        )
+
+        self._speculative_routing = speculative_routing
+        self._speculation_min_confidence = speculation_min_confidence
+        self._speculation_stats = SpeculationStats()
+
+        self._session_router = None
+        if sticky_routing:
+            self._session_router = StickySessionRouter(self._local_classifier, drift_threshold=drift_threshold)
+
+        self._classifier_system_message = SystemMessage(content="You are the triage agent for banking queries.")
+        self._classification_batcher = None
+        if batch_classification:
+            self._classification_batcher = ClassificationBatcher(
+                self._triage_model_client,
+                self._classifier_system_message,
+                max_batch_size=classification_batch_size,
+                max_wait_ms=classification_batch_wait_ms,
+            )
+
+        # Per-agent input budgets are keyed by agent type, e.g. {"Analytics": 4000}.
+        self._context_budget = ContextBudgetManager(
+            default_budget=context_token_budget,
+            budgets=context_token_budgets,
+            counter=self._token_counter,
+        )
+
+        # Compaction runs after a response has been sent. summary_model=None uses
+        # the extractive summary instead of a model call.
+        self._summarizer = None
+        if summarize_conversations:
+            summary_client = None
+            if summary_model:
+                summary_client = AgentTaggedChatCompletionClient(
+                    self._guarded("Summarizer", self._recorded(summary_model, self._model_stack(summary_model))),
+                    "Summarizer",
+                )
+            self._summarizer = ConversationSummarizer(
+                summary_client,
+                keep_recent_messages=summary_keep_recent,
+                min_messages=summary_min_messages,
+            )
+        self._compaction_tasks: Dict[str, asyncio.Task] = {}
+        self._compaction_stats = {"scheduled": 0, "applied": 0, "discarded": 0, "failed": 0, "messages_removed": 0}
+
+        self._stream_responses = stream_responses
+        self._ws_send_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._turn_started: Dict[str, float] = {}
+        self._turn_budget_seconds = turn_budget_seconds
+        self._max_tool_iterations = max_tool_iterations
 
-        self._response_queues: Dict[str, List[AgentResponse]] = defaultdict(list)
         self._websockets: Dict[str, WebSocket] = {}
-        self._conversation_context: Dict[str, List] = defaultdict(list)
-        self._conversation_state: Dict[str, Dict[str, Any]] = defaultdict(dict)
 
-        self.conversation_accessor = ConversationStateAccessor(
-            self._conversation_state,
-            self._conversation_context
+        # Messages, routing state and undelivered responses per session, bounded in
+        # count, idle time and size. Evicted sessions lose their websocket and agents.
+        # "sqlite" (a file path) or "redis" (a redis:// URL) share sessions between
+        # uvicorn workers; agent instances and caches stay per worker.
+        self._sessions = create_session_store(
+            session_backend,
+            session_store_url,
+            max_sessions=max_sessions,
+            idle_ttl=session_idle_ttl,
+            max_messages=session_max_messages,
+            max_session_bytes=int(session_max_kb * 1024),
+            max_total_bytes=int(session_store_max_mb * 1024 * 1024),
         )
+        self._sessions.add_eviction_listener(self._on_session_evicted)
+        self._session_sweep_interval = session_sweep_interval
+        self._session_sweeper = None
+
+        self.conversation_accessor = ConversationStateAccessor(self._sessions)
 
     async def start_runtime(self):
+        if self._agent_host_address is None:
+            await self._register_agents(self._runtime)
+            self._runtime.start()
+        else:
+            from app.runtime.distributed import register_user_topic_relay, start_agent_host
+
+            self._agent_host = start_agent_host(self._agent_host_address)
+            await self._runtime.start_when_ready()
+            await register_user_topic_relay(
+                self._runtime,
+                self._on_agent_response,
+                self._on_agent_delta,
+                self._on_progress if self._progress_events else None,
+            )
+            await self._register_agents(self._runtime, exclude=self._remote_agent_types)
+        self._session_sweeper = asyncio.create_task(self._sweep_sessions())
+
+    async def stop_runtime(self):
+        if self._session_sweeper is not None:
+            self._session_sweeper.cancel()
+            self._session_sweeper = None
+        if self._agent_host_address is None:
+            await self._runtime.stop_when_idle()
+        else:
+            await self._runtime.stop()
+            await self._agent_host.stop()
+            self._agent_host = None
+        if self._routing_dataset is not None:
+            await self._routing_dataset.close()
+        await self._sessions.close()
+
+    async def run_agent_worker(self, agent_groups: Sequence[str]):
+        # Serves agent_groups (see app.runtime.distributed.AGENT_GROUPS) for the
+        # front end at agent_host_address until SIGINT or SIGTERM.
+        from app.runtime.distributed import agent_types_for
+
+        agent_types = agent_types_for(agent_groups)
+        await self._runtime.start_when_ready()
+        await self._register_agents(self._runtime, include=agent_types)
+        print(f"Agent worker serving {', '.join(sorted(agent_types))} via {self._agent_host_address}", flush=True)
+        try:
+            await self._runtime.stop_when_signal()
+        finally:
+            if self._routing_dataset is not None:
+                await self._routing_dataset.close()
+            await self._sessions.close()
+
+    async def _register_agents(self, runtime, include: Set[str] = None, exclude: Set[str] = frozenset()):
+        # Registers every agent type, or only those in include; exclude names the
+        # types an agent worker serves instead of this process.
+        agent_options = {
+            "context_budget": self._context_budget,
+            "stream_responses": self._stream_responses,
+            "max_tool_iterations": self._max_tool_iterations,
+        }
+        registrations = {
+            "DomainClassifier": lambda: self._register_classifier(runtime),
+            "Auth": lambda: self._register_auth(runtime),
+            "RetailBanking": lambda: register_retail_banking_agent(
+                runtime, self._client_for("RetailBanking"), **agent_options
+            ),
+            "CheckBalance": lambda: register_check_balance_agent(runtime, self._model_client),
+            "MakePayment": lambda: register_make_payment_agent(runtime, self._model_client),
+            "Payments": lambda: register_payments_agent(
+                runtime, self._client_for("Payments"), self.conversation_accessor, **agent_options
+            ),
+            "CorporateBanking": lambda: register_corporate_banking_agent(
+                runtime, self._client_for("CorporateBanking"), **agent_options
+            ),
+            "InvestmentBanking": lambda: register_investment_banking_agent(
+                runtime, self._client_for("InvestmentBanking"), **agent_options
+            ),
+            "WealthManagement": lambda: register_wealth_management_agent(
+                runtime, self._client_for("WealthManagement"), **agent_options
+            ),
+            "RiskManagement": lambda: register_risk_management_agent(
+                runtime, self._client_for("RiskManagement"), **agent_options
+            ),
+            "Insurance": lambda: register_insurance_agent(runtime, self._client_for("Insurance"), **agent_options),
+            "ITOps": lambda: register_it_ops_agent(runtime, self._client_for("ITOps"), **agent_options),
+            "CapitalTreasury": lambda: register_capital_treasury_agent(
+                runtime, self._client_for("CapitalTreasury"), **agent_options
+            ),
+            "Analytics": lambda: register_analytics_agent(runtime, self._client_for("Analytics"), **agent_options),
+        }
+        for agent_type, register in registrations.items():
+            if (include is None or agent_type in include) and agent_type not in exclude:
+                await register()
+
+    async def _register_classifier(self, runtime):
         delegate_tools = [
             transfer_to_retail_banking_tool,
             transfer_to_corporate_banking_tool,
@@ -108,54 +503,61 @@ class RuntimeManager:
             transfer_to_analytics_tool
         ]
 
-        # Register DomainClassifierAgent
         classifier_type = await DomainClassifierAgent.register(
-            self._runtime,
+            runtime,
             type="DomainClassifier",
             factory=lambda: DomainClassifierAgent(
                 description="DomainClassifierAgent",
-                system_message=SystemMessage(content="You are the triage agent for banking queries."),
-                model_client=self._model_client,
+                system_message=self._classifier_system_message,
+                model_client=self._triage_model_client,
                 delegate_tools=delegate_tools,
                 my_topic_type="DomainClassifier",
                 user_topic_type="User",
                 conversation_state_accessor=self.conversation_accessor,
+                local_classifier=self._local_classifier,
+                local_confidence_threshold=self._local_confidence_threshold,
+                routing_stats=self._routing_stats,
+                classification_cache=self._classification_cache,
+                classification_batcher=self._classification_batcher,
+                speculative_routing=self._speculative_routing,
+                speculation_min_confidence=self._speculation_min_confidence,
+                speculation_stats=self._speculation_stats,
+                routing_dataset=self._routing_dataset,
+                shadow_evaluator=self._shadow_evaluator,
             )
         )
-        await self._runtime.add_subscription(
+        await runtime.add_subscription(
             TypeSubscription(topic_type="DomainClassifier", agent_type=classifier_type.type)
         )
 
+    async def _register_auth(self, runtime):
         credentials_csv = (
             "C:/Users/akstiwari/OneDrive - Deloitte (O365D)/Desktop/Laptop Files/Desktop Backup/"
             "learning/Autogen-MultiAgent/banking_chatbot/app/credentials/users.csv"
         )
         auth_type = await AuthenticationAgent.register(
-            self._runtime,
+            runtime,
             type="Auth",
             factory=lambda: AuthenticationAgent(credentials_csv_path=credentials_csv, user_topic="User")
         )
-        await self._runtime.add_subscription(
+        await runtime.add_subscription(
             TypeSubscription(topic_type="Auth", agent_type=auth_type.type)
         )
 
-        await register_retail_banking_agent(self._runtime, self._model_client)
-        await register_check_balance_agent(self._runtime, self._model_client)
-        await register_make_payment_agent(self._runtime, self._model_client)
-        await register_payments_agent(self._runtime, self._model_client, self.conversation_accessor)
-        await register_corporate_banking_agent(self._runtime, self._model_client)
-        await register_investment_banking_agent(self._runtime, self._model_client)
-        await register_wealth_management_agent(self._runtime, self._model_client)
-        await register_risk_management_agent(self._runtime, self._model_client)
-        await register_insurance_agent(self._runtime, self._model_client)
-        await register_it_ops_agent(self._runtime, self._model_client)
-        await register_capital_treasury_agent(self._runtime, self._model_client)
-        await register_analytics_agent(self._runtime, self._model_client)
-
-        self._runtime.start()
-
-    async def stop_runtime(self):
-        await self._runtime.stop_when_idle()
+    async def _sweep_sessions(self):
+        while True:
+            await asyncio.sleep(self._session_sweep_interval)
+            try:
+                evicted = await self._sessions.sweep()
+                if evicted:
+                    print(f"Evicted {evicted} idle sessions", flush=True)
+                # With a shared store another worker may have evicted a session whose
+                # websocket is held here; its listener fired there, not here.
+                for session_id in list(self._websockets):
+                    if not await self._sessions.contains(session_id):
+                        self._on_session_evicted(session_id, EVICT_CLOSED)
+            except Exception as e:
+                print(f"Session sweep failed: {e!r}", flush=True)
 
     async def publish_credentials(self, creds: UserCredentials, session_id: str):
         await self._runtime.publish_message(
@@ -167,17 +569,30 @@ class RuntimeManager:
         from autogen_core.models import UserMessage
         from app.messages.message_types import UserTask
 
-        self._conversation_context[session_id].append(UserMessage(content=user_text, source="User"))
-        user_task = UserTask(context=self._conversation_context[session_id])
+        self._cancel_compaction(session_id)
+        self._turn_started[session_id] = time.time()
+        context = await self._sessions.append_message(session_id, UserMessage(content=user_text, source="User"))
+        deadline = deadline_from_budget(self._turn_budget_seconds)
+        user_task = UserTask(context=context, deadline=deadline)
 
-        st = self._conversation_state[session_id].get("status", "fresh")
-        last_agent = self._conversation_state[session_id].get("last_agent", None)
+        st = await self._sessions.get_state(session_id, "status", "fresh")
+        last_agent = await self._sessions.get_state(session_id, "last_agent")
 
         if st == "follow_up" and last_agent is not None:
             await self._runtime.send_message(
                 user_task,
                 agent_id=TopicId(last_agent, source=session_id)
             )
+        elif await self._try_sticky_route(user_text, session_id, st):
+            _, tool_name, topic = await self.conversation_accessor.get_route(session_id)
+            print(f"Sticky routing session {session_id} to topic: {topic}", flush=True)
+            await self._runtime.publish_message(
+                UserTask(
+                    context=build_handoff_context(context, tool_name, topic, "DomainClassifier"),
+                    deadline=deadline,
+                ),
+                topic_id=TopicId(topic, source=session_id)
+            )
         elif st == "post_action":
             await self._runtime.publish_message(
                 user_task,
@@ -189,30 +604,265 @@ class RuntimeManager:
                 topic_id=TopicId("DomainClassifier", source=session_id)
             )
 
-    def register_websocket(self, session_id: str, ws: WebSocket):
+    async def _try_sticky_route(self, user_text: str, session_id: str, status: str) -> bool:
+        if self._session_router is None:
+            return False
+        # Yes/no answers in post_action drive the classifier's follow-up flow.
+        if status == "post_action" and user_text.strip().lower() in ["yes", "y", "no", "n"]:
+            return False
+        if status not in ["fresh", "post_action"]:
+            return False
+        route = await self.conversation_accessor.get_route(session_id)
+        if route is None:
+            return False
+        return not self._session_router.has_drifted(user_text, route[0])
+
+    async def register_websocket(self, session_id: str, ws: WebSocket):
+        await self._sessions.touch(session_id)
         self._websockets[session_id] = ws
 
     def unregister_websocket(self, session_id: str):
         if session_id in self._websockets:
             del self._websockets[session_id]
+        self._ws_send_locks.pop(session_id, None)
+        self._turn_started.pop(session_id, None)
+
+    async def drain_agent_responses(self, session_id: str):
+        return await self._sessions.drain_responses(session_id)
+
+    async def set_post_action_state(self, session_id: str, agent_type: str):
+        await self._sessions.update_state(session_id, status="post_action", last_agent=agent_type)
+
+    async def set_follow_up_state(self, session_id: str, agent_type: str):
+        await self._sessions.update_state(session_id, status="follow_up", last_agent=agent_type)
+
+    async def reset_state(self, session_id: str):
+        await self._sessions.reset_state(session_id)
+
+    async def get_session_metrics(self) -> dict:
+        metrics = await self._sessions.stats()
+        metrics["websockets"] = len(self._websockets)
+        return metrics
+
+    def _on_session_evicted(self, session_id: str, reason: str):
+        print(f"Session {session_id} evicted ({reason})", flush=True)
+        self._cancel_compaction(session_id)
+        self._turn_started.pop(session_id, None)
+        self._runtime.forget_session(session_id)
+        ws = self._websockets.pop(session_id, None)
+        if ws is not None:
+            asyncio.create_task(self._close_websocket(session_id, ws, reason))
+        else:
+            self._ws_send_locks.pop(session_id, None)
+
+    async def _close_websocket(self, session_id: str, ws: WebSocket, reason: str):
+        # Queued frames go out first; then the client is told why and the socket closed.
+        try:
+            async with self._ws_send_locks[session_id]:
+                await ws.send_json({"type": "session_closed", "reason": reason})
+                await ws.close(code=1001, reason=f"session {reason}")
+        except Exception as e:
+            print(f"Closing websocket of session {session_id} failed: {e}")
+        finally:
+            if session_id not in self._websockets:
+                self._ws_send_locks.pop(session_id, None)
+
+    def get_routing_metrics(self) -> dict:
+        metrics = self._routing_stats.snapshot()
+        metrics["cache"] = self._classification_cache.stats()
+        if self._classification_batcher is not None:
+            metrics["batching"] = self._classification_batcher.stats()
+        if self._speculative_routing:
+            metrics["speculation"] = self._speculation_stats.snapshot()
+        if self._session_router is not None:
+            metrics["sticky"] = self._session_router.stats()
+        if self._shadow_evaluator is not None:
+            metrics["shadow"] = self._shadow_evaluator.stats()
+        return metrics
+
+    def _model_stack(self, model: str):
+        if model in self._model_stacks:
+            return self._model_stacks[model]
+        model_client = self._model_client_factory(model)
+        limiter = None
+        if self._rate_limit_options is not None:
+            limiter = self._rate_limiters[model] = AdaptiveRateLimiter(**self._rate_limit_options)
+
+        # Calls slower than the caller's p95 get a duplicate request; first answer wins.
+        # This sits below the limiter, so it measures provider latency and each
+        # duplicate needs a limiter slot that is free right now, and below
+        # single-flight so the duplicate isn't coalesced with the original.
+        if self._hedge_budget is not None:
+            self._hedgers[model] = HedgingChatCompletionClient(
+                model_client, budget=self._hedge_budget, limiter=limiter, counter=TokenCounter(model)
+            )
+            model_client = self._hedgers[model]
+
+        # Calls queue for an RPM/TPM budget and an adaptive concurrency limit;
+        # classifier calls are admitted ahead of domain-agent calls. The breakers'
+        # call timeout is enforced here, from admission, not from the queue.
+        if limiter is not None:
+            model_client = RateLimitedChatCompletionClient(
+                model_client,
+                limiter,
+                counter=TokenCounter(model),
+                call_timeout=self._model_call_timeout if self._breaker_options is not None else None,
+            )
 
-    def drain_agent_responses(self, session_id: str):
-        if session_id not in self._response_queues:
-            return []
-        arr = self._response_queues[session_id][:]
-        self._response_queues[session_id].clear()
-        return arr
-
-    def set_post_action_state(self, session_id: str, agent_type: str):
-        self._conversation_state[session_id]["status"] = "post_action"
-        self._conversation_state[session_id]["last_agent"] = agent_type
+        # Identical requests in flight at the same moment share one provider call.
+        if self._single_flight_enabled:
+            self._single_flights[model] = SingleFlightChatCompletionClient(model_client, namespace=model)
+            model_client = self._single_flights[model]
 
-    def set_follow_up_state(self, session_id: str, agent_type: str):
-        self._conversation_state[session_id]["status"] = "follow_up"
-        self._conversation_state[session_id]["last_agent"] = agent_type
+        self._model_stacks[model] = model_client
+        return model_client
 
-    def reset_state(self, session_id: str):
-        self._conversation_state[session_id] = {}
+    def _cacheable_stack(self, model: str, agent_type: str):
+        if agent_type not in self._response_cache_agents:
+            return self._model_stack(model)
+        if model not in self._cached_model_clients:
+            self._cached_model_clients[model] = CachingChatCompletionClient(
+                self._model_stack(model), self._response_store, namespace=model
+            )
+        return self._cached_model_clients[model]
+
+    def _client_for(self, agent_type: str):
+        model = self._model_profiles.get(agent_type, self._default_model)
+        model_client = self._recorded(model, self._cacheable_stack(model, agent_type))
+        limiter = self._rate_limiters.get(model)
+        if agent_type in self._downgrade_agents and model != self._downgrade_model and limiter is not None:
+            model_client = LoadAwareChatCompletionClient(
+                model_client,
+                self._recorded(self._downgrade_model, self._cacheable_stack(self._downgrade_model, agent_type)),
+                load=limiter.queue_depth,
+                high_watermark=self._downgrade_queue_threshold,
+            )
+            self._tiered_clients[agent_type] = model_client
+        return AgentTaggedChatCompletionClient(self._guarded(agent_type, model_client), agent_type)
+
+    def _recorded(self, model: str, model_client):
+        if self._usage_ledger is None:
+            return model_client
+        return UsageRecordingChatCompletionClient(model_client, self._usage_ledger, model)
+
+    def get_usage_metrics(self, recent: int = 20) -> dict:
+        if self._usage_ledger is None:
+            return {}
+        return self._usage_ledger.summary(recent)
+
+    def get_session_usage(self, session_id: str):
+        if self._usage_ledger is None:
+            return None
+        return self._usage_ledger.session(session_id)
+
+    def _guarded(self, agent_type: str, model_client):
+        if self._breaker_options is None:
+            return model_client
+        breaker = self._circuit_breakers.setdefault(agent_type, CircuitBreaker(name=agent_type, **self._breaker_options))
+        # With rate limiting the timeout starts at admission, in the limiter.
+        call_timeout = self._model_call_timeout if self._rate_limit_options is None else None
+        return CircuitBreakerChatCompletionClient(model_client, breaker, call_timeout=call_timeout)
+
+    def get_circuit_breaker_metrics(self) -> dict:
+        return {agent_type: breaker.stats() for agent_type, breaker in sorted(self._circuit_breakers.items())}
+
+    def get_model_client_metrics(self) -> dict:
+        metrics = {
+            "models": {
+                agent_type: self._model_profiles.get(agent_type, self._default_model)
+                for agent_type in sorted(set(self._model_profiles) | self._downgrade_agents)
+            },
+            "default_model": self._default_model,
+        }
+        if self._rate_limiters:
+            metrics["rate_limiter"] = {model: limiter.stats() for model, limiter in self._rate_limiters.items()}
+        if self._hedgers:
+            metrics["hedging"] = {model: hedger.stats() for model, hedger in self._hedgers.items()}
+        if self._single_flights:
+            metrics["single_flight"] = {model: flights.stats() for model, flights in self._single_flights.items()}
+        if self._tiered_clients:
+            metrics["downgrade"] = {
+                agent_type: dict(client.stats(), model=self._downgrade_model)
+                for agent_type, client in self._tiered_clients.items()
+            }
+        if self._response_store is not None:
+            metrics["response_cache"] = self._response_store.stats()
+            metrics["response_cache"]["agents"] = sorted(self._response_cache_agents)
+            metrics["response_cache"]["models"] = {
+                model: cached.stats() for model, cached in self._cached_model_clients.items()
+            }
+        return metrics
+
+    def get_context_metrics(self) -> dict:
+        metrics = self._context_budget.stats()
+        if self._summarizer is not None:
+            metrics["summaries"] = dict(self._compaction_stats)
+        return metrics
+
+    async def _schedule_compaction(self, session_id: str):
+        if self._summarizer is None or session_id in self._compaction_tasks:
+            return
+        if not self._summarizer.should_compact(await self._sessions.messages(session_id)):
+            return
+        if session_id in self._compaction_tasks:
+            return
+        self._compaction_stats["scheduled"] += 1
+        task = asyncio.create_task(self._compact_conversation(session_id))
+        self._compaction_tasks[session_id] = task
+        task.add_done_callback(lambda t, s=session_id: self._compaction_tasks.pop(s, None))
+
+    def _cancel_compaction(self, session_id: str):
+        # A new user message makes any summary in flight stale.
+        task = self._compaction_tasks.pop(session_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            self._compaction_stats["discarded"] += 1
+
+    async def _compact_conversation(self, session_id: str):
+        # Version first: an append landing before the messages are read only
+        # makes the compare-and-set below fail, never gets overwritten.
+        version = await self._sessions.version(session_id)
+        context = list(await self._sessions.messages(session_id))
+        cut = len(context) - self._summarizer.keep_recent_messages
+        try:
+            replacement = await self._summarizer.compact(context)
+        except Exception as e:
+            self._compaction_stats["failed"] += 1
+            print(f"Compaction of session {session_id} failed: {e}")
+            return
+        if len(replacement) >= cut:
+            # Everything older is pinned or already summarized.
+            return
+        # Only apply the summary if the context is still exactly what was summarized.
+        if not await self._sessions.replace_messages(session_id, replacement + context[cut:], expected_version=version):
+            self._compaction_stats["discarded"] += 1
+            print(f"Discarding stale summary for session {session_id}")
+            return
+        self._compaction_stats["applied"] += 1
+        self._compaction_stats["messages_removed"] += cut - len(replacement)
+        print(f"Compacted {cut} messages of session {session_id} into a summary")
+
+    def _on_agent_delta(self, delta: AgentResponseDelta, topic_id):
+        ws = self._websockets.get(topic_id.source)
+        if ws is not None:
+            payload = {"type": "agent_response_delta", "text": delta.delta}
+            asyncio.create_task(self._send_json(topic_id.source, ws, payload))
+
+    def _on_progress(self, stage: str, session_id: str):
+        ws = self._websockets.get(session_id)
+        if ws is None:
+            return
+        now = time.time()
+        payload = {"type": "progress", "stage": stage, "ts": now}
+        if session_id in self._turn_started:
+            payload["elapsed_ms"] = round((now - self._turn_started[session_id]) * 1000, 1)
+        asyncio.create_task(self._send_json(session_id, ws, payload))
+
+    async def _send_json(self, session_id: str, ws: WebSocket, payload: dict):
+        # asyncio.Lock wakes waiters in FIFO order, so frames leave in the order
+        # they were produced and the final agent_response follows its deltas.
+        async with self._ws_send_locks[session_id]:
+            await ws.send_json(payload)
 
     def _on_agent_response(self, response: AgentResponse, topic_id):
        
@@ -233,6 +883,16 @@ class RuntimeManager:
                     texts.append(str(msg.content))
             joined = "\n".join(texts)
             payload = {"type": "agent_response", "text": joined}
-            asyncio.create_task(ws.send_json(payload))
+            asyncio.create_task(self._send_json(session_id, ws, payload))
+            asyncio.create_task(self._after_agent_response(session_id))
         else:
-            self._response_queues[session_id].append(response)
+            asyncio.create_task(self._after_agent_response(session_id, response))
+
+    async def _after_agent_response(self, session_id: str, undelivered: AgentResponse = None):
+        # Store work for a response, off the runtime's synchronous callback.
+        try:
+            if undelivered is not None and await self._sessions.contains(session_id):
+                await self._sessions.queue_response(session_id, undelivered)
+            await self._schedule_compaction(session_id)
+        except Exception as e:
+            print(f"Session store update after response for {session_id} failed: {e!r}", flush=True)
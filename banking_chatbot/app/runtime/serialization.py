@@ -0,0 +1,31 @@
+from autogen_core import try_get_known_serializers_for_type
+
+from app.messages.message_types import (
+    AgentResponse,
+    AgentResponseDelta,
+    ProgressEvent,
+    SpeculativeResult,
+    SpeculativeTask,
+    UserCredentials,
+    UserLogin,
+    UserTask,
+)
+
+# Every message that can cross a process boundary. The front end and every
+# agent worker register the same list; a type missing here fails to serialize
+# on the sending side.
+MESSAGE_TYPES = [
+    UserLogin,
+    UserCredentials,
+    UserTask,
+    SpeculativeTask,
+    SpeculativeResult,
+    AgentResponse,
+    AgentResponseDelta,
+    ProgressEvent,
+]
+
+
+def register_message_serializers(runtime):
+    for message_type in MESSAGE_TYPES:
+        runtime.add_message_serializer(try_get_known_serializers_for_type(message_type))
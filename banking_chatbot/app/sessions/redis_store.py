@@ -0,0 +1,256 @@
+import json
+import math
+import time
+from typing import List
+
+from autogen_core.models import LLMMessage
+
+from app.messages.message_types import AgentResponse
+from app.sessions.resp_client import RespClient
+from app.sessions.session_store import (
+    EVICT_CAPACITY,
+    EVICT_CLOSED,
+    EVICT_IDLE,
+    EVICT_MEMORY,
+    BlockingSessionStore,
+    dump_message,
+    dump_response,
+    load_message,
+    load_response,
+    trim_range,
+)
+
+
+class RedisSessionStore(BlockingSessionStore):
+    """
+    SessionStore on a Redis-protocol server, shared by any number of workers.
+
+    Per session: a hash {prefix}:s:{id} with version and byte counts, a hash
+    {prefix}:st:{id} with one JSON field per state entry (its own key, so a
+    reset is one DEL), and lists {prefix}:m:{id} (messages) and
+    {prefix}:r:{id} (queued responses). The sorted set {prefix}:active
+    scores sessions by last activity, which is what capacity and idle
+    eviction use. Keys also get an EXPIRE of twice the idle TTL so they
+    disappear even if no worker is left to sweep. The total byte budget is
+    enforced by sweep().
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://127.0.0.1:6379/0",
+        prefix: str = "banking",
+        max_sessions: int = 10_000,
+        idle_ttl: float = 30 * 60,
+        max_messages: int = 200,
+        max_session_bytes: int = 512 * 1024,
+        max_total_bytes: int = 256 * 1024 * 1024,
+        max_queued_responses: int = 20,
+        client: RespClient = None,
+        clock=time.time,
+    ):
+        super().__init__()
+        self._client = client or RespClient(url)
+        self._prefix = prefix
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl
+        self._max_messages = max_messages
+        self._max_session_bytes = max_session_bytes
+        self._max_total_bytes = max_total_bytes
+        self._max_queued_responses = max_queued_responses
+        self._clock = clock
+        self._active = f"{prefix}:active"
+        self._expire_seconds = max(1, math.ceil(idle_ttl * 2))
+
+    def _keys(self, session_id: str):
+        return f"{self._prefix}:s:{session_id}", f"{self._prefix}:m:{session_id}", f"{self._prefix}:r:{session_id}"
+
+    def _state_key(self, session_id: str) -> str:
+        return f"{self._prefix}:st:{session_id}"
+
+    def _touch_commands(self, session_id: str) -> List[tuple]:
+        meta, msgs, responses = self._keys(session_id)
+        expire = self._expire_seconds
+        return [
+            ("ZADD", self._active, self._clock(), session_id),
+            ("HSET", meta, "id", session_id),
+            ("EXPIRE", meta, expire),
+            ("EXPIRE", msgs, expire),
+            ("EXPIRE", responses, expire),
+            ("EXPIRE", self._state_key(session_id), expire),
+        ]
+
+    def _write(self, session_id: str, commands: List[tuple]) -> list:
+        # Touches the session and runs commands in one MULTI/EXEC; returns the
+        # replies to commands. Evicts over capacity if the session is new.
+        touch = self._touch_commands(session_id)
+        replies = self._client.pipeline(touch + commands, transaction=True)
+        if replies[0]:
+            self._enforce_capacity(session_id)
+        return replies[len(touch):]
+
+    def _contains(self, session_id: str) -> bool:
+        return self._client.execute("ZSCORE", self._active, session_id) is not None
+
+    def _count(self) -> int:
+        return self._client.execute("ZCARD", self._active)
+
+    def _messages(self, session_id: str) -> List[LLMMessage]:
+        return [load_message(raw) for raw in self._client.execute("LRANGE", self._keys(session_id)[1], 0, -1)]
+
+    def _version(self, session_id: str) -> int:
+        return int(self._client.execute("HGET", self._keys(session_id)[0], "version") or 0)
+
+    def _get_state(self, session_id: str, key: str, default=None):
+        raw = self._client.execute("HGET", self._state_key(session_id), key)
+        return default if raw is None else json.loads(raw)
+
+    def _touch(self, session_id: str):
+        self._write(session_id, [])
+
+    def _append_message(self, session_id: str, message: LLMMessage) -> List[LLMMessage]:
+        meta, msgs, _ = self._keys(session_id)
+        body = dump_message(message)
+        _, _, size, raws = self._write(session_id, [
+            ("RPUSH", msgs, body),
+            ("HINCRBY", meta, "version", 1),
+            ("HINCRBY", meta, "message_bytes", len(body)),
+            ("LRANGE", msgs, 0, -1),
+        ])
+        messages = [load_message(raw) for raw in raws]
+        if len(messages) > self._max_messages or size > self._max_session_bytes:
+            messages = self._trim(session_id, messages, raws)
+        return messages
+
+    def _replace_messages(self, session_id: str, messages: List[LLMMessage], expected_version: int = None) -> bool:
+        meta, msgs, _ = self._keys(session_id)
+        bodies = [dump_message(m) for m in messages]
+        commands = [("DEL", msgs)]
+        if bodies:
+            commands.append(("RPUSH", msgs, *bodies))
+        commands += [
+            ("HINCRBY", meta, "version", 1),
+            ("HSET", meta, "message_bytes", sum(len(body) for body in bodies)),
+        ]
+        if expected_version is None:
+            self._write(session_id, commands)
+        else:
+            # Every message write changes the list, so watching it catches an
+            # append (or a removal) landing after the version was read.
+            def build(replies):
+                if int(replies[0] or 0) != expected_version:
+                    return None
+                return self._touch_commands(session_id) + commands
+
+            if self._client.watch_transaction([msgs], [("HGET", meta, "version")], build) is None:
+                return False
+        if len(bodies) > self._max_messages or sum(len(body) for body in bodies) > self._max_session_bytes:
+            self._trim(session_id, list(messages), bodies)
+        return True
+
+    def _update_state(self, session_id: str, **fields):
+        state = self._state_key(session_id)
+        pairs = [x for key, value in fields.items() for x in (key, json.dumps(value))]
+        self._write(session_id, [("HSET", state, *pairs), ("EXPIRE", state, self._expire_seconds)])
+
+    def _reset_state(self, session_id: str):
+        self._client.execute("DEL", self._state_key(session_id))
+
+    def _queue_response(self, session_id: str, response: AgentResponse):
+        meta, _, responses = self._keys(session_id)
+        _, _, raws = self._write(session_id, [
+            ("RPUSH", responses, dump_response(response)),
+            ("LTRIM", responses, -self._max_queued_responses, -1),
+            ("LRANGE", responses, 0, -1),
+        ])
+        self._client.execute("HSET", meta, "response_bytes", sum(len(raw) for raw in raws))
+
+    def _drain_responses(self, session_id: str) -> List[AgentResponse]:
+        meta, _, responses = self._keys(session_id)
+        raws, _, _ = self._client.pipeline([
+            ("LRANGE", responses, 0, -1),
+            ("DEL", responses),
+            ("HSET", meta, "response_bytes", 0),
+        ], transaction=True)
+        if not raws:
+            # Don't leave a bare hash behind for a session that doesn't exist.
+            if not self._contains(session_id):
+                self._client.execute("DEL", meta)
+            return []
+        return [load_response(raw) for raw in raws]
+
+    def _remove(self, session_id: str, reason: str = EVICT_CLOSED) -> bool:
+        removed = self._client.pipeline([
+            ("ZREM", self._active, session_id),
+            ("DEL", *self._keys(session_id), self._state_key(session_id)),
+        ])[0]
+        # Several workers may race to evict the same session; only one reports it.
+        if removed:
+            self._evicted(session_id, reason)
+        return bool(removed)
+
+    def _sweep(self) -> int:
+        evicted = 0
+        cutoff = self._clock() - self._idle_ttl
+        for session_id in self._client.execute("ZRANGEBYSCORE", self._active, "-inf", cutoff):
+            evicted += self._remove(session_id, EVICT_IDLE)
+        sizes = self._session_sizes()
+        total = sum(size for _, size in sizes)
+        for session_id, size in sizes:
+            if total <= self._max_total_bytes:
+                break
+            evicted += self._remove(session_id, EVICT_MEMORY)
+            total -= size
+        return evicted
+
+    def _session_sizes(self):
+        # (session_id, bytes) for every session, least recently active first.
+        session_ids = self._client.execute("ZRANGE", self._active, 0, -1)
+        if not session_ids:
+            return []
+        replies = self._client.pipeline([
+            ("HMGET", self._keys(session_id)[0], "message_bytes", "response_bytes") for session_id in session_ids
+        ])
+        return [
+            (session_id, sum(int(v or 0) for v in reply)) for session_id, reply in zip(session_ids, replies)
+        ]
+
+    def _enforce_capacity(self, session_id: str):
+        excess = self._client.execute("ZCARD", self._active) - self._max_sessions
+        if excess <= 0:
+            return
+        for oldest in self._client.execute("ZRANGE", self._active, 0, excess):
+            if oldest != session_id and excess > 0:
+                self._remove(oldest, EVICT_CAPACITY)
+                excess -= 1
+
+    def _trim(self, session_id: str, messages: List[LLMMessage], raws: List[str]) -> List[LLMMessage]:
+        meta, msgs, _ = self._keys(session_id)
+        sizes = [len(raw) for raw in raws]
+        start, dropped = trim_range(messages[0], sizes, self._max_messages, self._max_session_bytes)
+        if not dropped:
+            return messages
+        kept = raws[:start] + raws[start + dropped:]
+        self._client.pipeline([
+            ("DEL", msgs),
+            ("RPUSH", msgs, *kept),
+            ("HSET", meta, "message_bytes", sum(len(raw) for raw in kept)),
+            ("EXPIRE", msgs, self._expire_seconds),
+        ], transaction=True)
+        self.messages_trimmed += dropped
+        return messages[:start] + messages[start + dropped:]
+
+    def _stats(self) -> dict:
+        sizes = self._session_sizes()
+        return {
+            "backend": "redis",
+            "server": f"{self._client.host}:{self._client.port}/{self._client.db}",
+            "sessions": len(sizes),
+            "max_sessions": self._max_sessions,
+            "bytes": sum(size for _, size in sizes),
+            "max_total_bytes": self._max_total_bytes,
+            "messages_trimmed": self.messages_trimmed,
+            "evictions": dict(self.evictions),
+        }
+
+    def _close(self):
+        self._client.close()
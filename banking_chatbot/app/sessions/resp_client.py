@@ -0,0 +1,152 @@
+import socket
+import threading
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from the server."""
+
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, float):
+            data = repr(arg).encode()
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RespClient:
+    """
+    Minimal blocking client for the Redis protocol (RESP2): enough for
+    RedisSessionStore against Redis, Valkey or app.sessions.resp_server.
+    Bulk replies are decoded as UTF-8; error replies raise RespError. One
+    connection, shared by threads under a lock and reopened after a failure.
+    """
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self._timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._roundtrip(setup)
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._file = None
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands: List[tuple], transaction: bool = False) -> list:
+        # Sends all commands in one write. With transaction=True they run inside
+        # MULTI/EXEC and the EXEC results are returned.
+        if transaction:
+            commands = [("MULTI",)] + list(commands) + [("EXEC",)]
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                replies = self._roundtrip(commands)
+            except (OSError, ConnectionError):
+                self._disconnect()
+                raise
+        if transaction:
+            replies = replies[-1]
+            if isinstance(replies, RespError):
+                raise replies
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def watch_transaction(
+        self, keys: List[str], reads: List[tuple], build: Callable[[list], Optional[List[tuple]]]
+    ) -> Optional[list]:
+        # Optimistic transaction: WATCHes keys, runs reads and passes their
+        # replies to build, which returns the commands to run in MULTI/EXEC or
+        # None to give up. Returns the EXEC results, or None if build gave up
+        # or a watched key changed in between. Holds the connection throughout
+        # so no other thread's EXEC clears the WATCH.
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                replies = self._roundtrip([("WATCH", *keys)] + list(reads))[1:]
+                errors = [reply for reply in replies if isinstance(reply, RespError)]
+                commands = build(replies) if not errors else None
+                if commands is None:
+                    self._roundtrip([("UNWATCH",)])
+                    if errors:
+                        raise errors[0]
+                    return None
+                results = self._roundtrip([("MULTI",)] + list(commands) + [("EXEC",)])[-1]
+            except (OSError, ConnectionError):
+                self._disconnect()
+                raise
+        if results is None:
+            return None
+        if isinstance(results, RespError):
+            raise results
+        for reply in results:
+            if isinstance(reply, RespError):
+                raise reply
+        return results
+
+    def _roundtrip(self, commands) -> list:
+        self._sock.sendall(b"".join(encode_command(*command) for command in commands))
+        return [self._read_reply() for _ in commands]
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            return RespError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"unexpected reply: {line!r}")
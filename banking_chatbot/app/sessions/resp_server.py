@@ -0,0 +1,362 @@
+"""
+Local stand-in for Redis: an in-memory server speaking RESP2 with the subset
+of commands RedisSessionStore uses. For development and benchmarks only, no
+persistence.
+
+    python -m app.sessions.resp_server --port 6390
+"""
+
+import argparse
+import asyncio
+import bisect
+import fnmatch
+import time
+from typing import Dict, List
+
+
+class _WrongType(Exception):
+    pass
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, Exception):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    if isinstance(value, _Status):
+        return b"+%s\r\n" % value.text.encode("utf-8")
+    data = value if isinstance(value, bytes) else str(value).encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class _Status:
+    def __init__(self, text: str):
+        self.text = text
+
+
+OK = _Status("OK")
+QUEUED = _Status("QUEUED")
+
+
+# Commands that change the key(s) they name; WATCH notices them.
+_WRITE_COMMANDS = {b"SET", b"DEL", b"EXPIRE", b"HSET", b"HDEL", b"HINCRBY", b"RPUSH", b"LTRIM", b"ZADD", b"ZREM"}
+
+
+def _slice(items: list, start: int, stop: int) -> list:
+    # Redis ranges are inclusive and accept negative indexes.
+    n = len(items)
+    start = max(start + n if start < 0 else start, 0)
+    stop = stop + n if stop < 0 else stop
+    return items[start:stop + 1]
+
+
+def _score(raw: str) -> float:
+    # float() already understands "-inf", "+inf" and "inf".
+    return float(raw)
+
+
+class RespServer:
+    """
+    Single-threaded, so MULTI/EXEC blocks are atomic by construction. WATCH
+    compares per-key write counters; expiry does not count as a write.
+    """
+
+    def __init__(self):
+        self._data: Dict[bytes, object] = {}
+        self._expires: Dict[bytes, float] = {}
+        self._writes: Dict[bytes, int] = {}
+        self._flushes = 0
+
+    def revision(self, key: bytes):
+        return self._flushes, self._writes.get(key, 0)
+
+    # Storage helpers
+
+    def _get(self, key, kind):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        value = self._data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise _WrongType("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _get_or_create(self, key, kind):
+        value = self._get(key, kind)
+        if value is None:
+            value = self._data[key] = kind()
+        return value
+
+    def _drop_if_empty(self, key):
+        if not self._data.get(key):
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    # Commands
+
+    def cmd_ping(self, *args):
+        return args[0] if args else _Status("PONG")
+
+    def cmd_auth(self, *args):
+        return OK
+
+    def cmd_select(self, db):
+        return OK
+
+    def cmd_flushdb(self):
+        self._data.clear()
+        self._expires.clear()
+        self._writes.clear()
+        self._flushes += 1
+        return OK
+
+    def cmd_dbsize(self):
+        return len(self._data)
+
+    def cmd_keys(self, pattern):
+        return [
+            key for key in list(self._data)
+            if self._get(key, object) is not None and fnmatch.fnmatchcase(key.decode(), pattern.decode())
+        ]
+
+    def cmd_get(self, key):
+        return self._get(key, bytes)
+
+    def cmd_set(self, key, value):
+        self._data[key] = value
+        self._expires.pop(key, None)
+        return OK
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._get(key, object) is not None:
+                removed += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(self._get(key, object) is not None for key in keys)
+
+    def cmd_expire(self, key, seconds):
+        if self._get(key, object) is None:
+            return 0
+        self._expires[key] = time.time() + float(seconds)
+        return 1
+
+    def cmd_hset(self, key, *pairs):
+        h = self._get_or_create(key, dict)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in h
+            h[field] = value
+        return added
+
+    def cmd_hget(self, key, field):
+        h = self._get(key, dict)
+        return h.get(field) if h else None
+
+    def cmd_hmget(self, key, *fields):
+        h = self._get(key, dict) or {}
+        return [h.get(f) for f in fields]
+
+    def cmd_hdel(self, key, *fields):
+        h = self._get(key, dict)
+        if not h:
+            return 0
+        removed = sum(h.pop(f, None) is not None for f in fields)
+        self._drop_if_empty(key)
+        return removed
+
+    def cmd_hkeys(self, key):
+        return list(self._get(key, dict) or {})
+
+    def cmd_hgetall(self, key):
+        h = self._get(key, dict) or {}
+        return [x for pair in h.items() for x in pair]
+
+    def cmd_hincrby(self, key, field, amount):
+        h = self._get_or_create(key, dict)
+        value = int(h.get(field, b"0")) + int(amount)
+        h[field] = str(value).encode()
+        return value
+
+    def cmd_rpush(self, key, *values):
+        lst = self._get_or_create(key, list)
+        lst.extend(values)
+        return len(lst)
+
+    def cmd_llen(self, key):
+        return len(self._get(key, list) or [])
+
+    def cmd_lrange(self, key, start, stop):
+        return _slice(self._get(key, list) or [], int(start), int(stop))
+
+    def cmd_ltrim(self, key, start, stop):
+        lst = self._get(key, list)
+        if lst is not None:
+            lst[:] = self.cmd_lrange(key, start, stop)
+            self._drop_if_empty(key)
+        return OK
+
+    def cmd_zadd(self, key, *pairs):
+        z = self._get_or_create(key, _SortedSet)
+        return sum(z.add(member, float(score)) for score, member in zip(pairs[::2], pairs[1::2]))
+
+    def cmd_zrem(self, key, *members):
+        z = self._get(key, _SortedSet)
+        if z is None:
+            return 0
+        removed = sum(z.remove(m) for m in members)
+        self._drop_if_empty(key)
+        return removed
+
+    def cmd_zcard(self, key):
+        z = self._get(key, _SortedSet)
+        return len(z) if z else 0
+
+    def cmd_zscore(self, key, member):
+        z = self._get(key, _SortedSet)
+        score = z.scores.get(member) if z else None
+        return None if score is None else repr(score)
+
+    def cmd_zrange(self, key, start, stop):
+        z = self._get(key, _SortedSet)
+        if not z:
+            return []
+        return _slice([m for _, m in z.items], int(start), int(stop))
+
+    def cmd_zrangebyscore(self, key, low, high, *options):
+        z = self._get(key, _SortedSet)
+        if not z:
+            return []
+        low, high = _score(low.decode()), _score(high.decode())
+        members = [m for score, m in z.items if low <= score <= high]
+        if len(options) == 3 and options[0].upper() == b"LIMIT":
+            offset, count = int(options[1]), int(options[2])
+            members = members[offset:offset + count if count >= 0 else None]
+        return members
+
+    def execute(self, args: List[bytes]):
+        handler = getattr(self, "cmd_" + args[0].decode().lower(), None)
+        if handler is None:
+            return Exception(f"ERR unknown command '{args[0].decode()}'")
+        name = args[0].upper()
+        if name in _WRITE_COMMANDS:
+            for key in args[1:] if name == b"DEL" else args[1:2]:
+                self._writes[key] = self._writes.get(key, 0) + 1
+        try:
+            return handler(*args[1:])
+        except _WrongType as e:
+            return Exception(str(e))
+        except (TypeError, ValueError) as e:
+            return Exception(f"ERR {e}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        queued = None
+        watched = {}
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                name = args[0].upper()
+                if name == b"MULTI":
+                    queued = []
+                    reply = OK
+                elif name == b"EXEC":
+                    if queued is None:
+                        reply = Exception("ERR EXEC without MULTI")
+                    elif any(self.revision(key) != seen for key, seen in watched.items()):
+                        reply = None
+                    else:
+                        reply = [self.execute(a) for a in queued]
+                    queued = None
+                    watched = {}
+                elif name == b"DISCARD":
+                    queued = None
+                    watched = {}
+                    reply = OK
+                elif name == b"WATCH" and queued is None:
+                    watched.update((key, self.revision(key)) for key in args[1:])
+                    reply = OK
+                elif name == b"UNWATCH" and queued is None:
+                    watched = {}
+                    reply = OK
+                elif queued is not None:
+                    queued.append(args)
+                    reply = QUEUED
+                else:
+                    reply = self.execute(args)
+                writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class _SortedSet:
+    def __init__(self):
+        self.scores: Dict[bytes, float] = {}
+        self.items: List[tuple] = []
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, member: bytes, score: float) -> int:
+        existed = self.remove(member)
+        self.scores[member] = score
+        bisect.insort(self.items, (score, member))
+        return 0 if existed else 1
+
+    def remove(self, member: bytes) -> int:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return 0
+        self.items.pop(bisect.bisect_left(self.items, (score, member)))
+        return 1
+
+
+async def _read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. from telnet.
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        data = await reader.readexactly(length + 2)
+        args.append(data[:-2])
+    return args
+
+
+async def serve(host: str, port: int):
+    server = RespServer()
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"RESP stand-in listening on {host}:{port}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol server for local development.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Sequence
+
+from autogen_core.models import LLMMessage
+from pydantic import TypeAdapter
+
+from app.context.summarizer import is_summary_message
+from app.messages.message_types import AgentResponse
+
+EVICT_IDLE = "idle"
+EVICT_CAPACITY = "capacity"
+EVICT_MEMORY = "memory"
+EVICT_CLOSED = "closed"
+
+
+_MESSAGE_ADAPTER = TypeAdapter(LLMMessage)
+
+
+def message_bytes(message) -> int:
+    # Size of the serialized message; close enough to track growth per session.
+    try:
+        return len(message.model_dump_json())
+    except AttributeError:
+        return len(str(message))
+
+
+def dump_message(message: LLMMessage) -> str:
+    return message.model_dump_json()
+
+
+def load_message(raw) -> LLMMessage:
+    return _MESSAGE_ADAPTER.validate_json(raw)
+
+
+def dump_response(response: AgentResponse) -> str:
+    return response.model_dump_json()
+
+
+def load_response(raw) -> AgentResponse:
+    return AgentResponse.model_validate_json(raw)
+
+
+def trim_range(first_message: LLMMessage, sizes: Sequence[int], max_messages: int, max_bytes: int):
+    """
+    Returns (start, count): drop messages[start:start + count] to keep the
+    session within max_messages and max_bytes. A leading summary and the
+    newest message are always kept.
+    """
+    start = 1 if first_message is not None and is_summary_message(first_message) else 0
+    total = sum(sizes)
+    dropped = 0
+    while len(sizes) - dropped - start > 1 and (len(sizes) - dropped > max_messages or total > max_bytes):
+        total -= sizes[start + dropped]
+        dropped += 1
+    return start, dropped
+
+
+class SessionStore(ABC):
+    """
+    Conversation messages, routing state and undelivered responses per
+    session. Backends keep the same limits: at most max_sessions (least
+    recently active evicted first), idle sessions evicted by sweep(), a
+    per-session message and byte cap (oldest messages dropped, a leading
+    summary kept) and a total byte budget. Read methods never create a
+    session. Listeners get (session_id, reason) for every eviction made by
+    this process, on the event loop.
+
+    replace_messages with expected_version is a compare-and-set: it only
+    writes, and returns True, if the session still has that version.
+
+    Every method is a coroutine, so a backend can do its I/O off the event
+    loop. Values returned by an external backend are copies: change a session
+    through the store, not by mutating what it returned.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[str, str], None]] = []
+        self.evictions: Dict[str, int] = defaultdict(int)
+        self.messages_trimmed = 0
+
+    def add_eviction_listener(self, listener: Callable[[str, str], None]):
+        self._listeners.append(listener)
+
+    def _evicted(self, session_id: str, reason: str):
+        self.evictions[reason] += 1
+        for listener in self._listeners:
+            try:
+                listener(session_id, reason)
+            except Exception as e:
+                print(f"Session eviction listener failed for {session_id}: {e}")
+
+    @abstractmethod
+    async def contains(self, session_id: str) -> bool: ...
+
+    @abstractmethod
+    async def count(self) -> int: ...
+
+    @abstractmethod
+    async def messages(self, session_id: str) -> List[LLMMessage]: ...
+
+    @abstractmethod
+    async def version(self, session_id: str) -> int: ...
+
+    @abstractmethod
+    async def get_state(self, session_id: str, key: str, default=None): ...
+
+    @abstractmethod
+    async def touch(self, session_id: str): ...
+
+    @abstractmethod
+    async def append_message(self, session_id: str, message: LLMMessage) -> List[LLMMessage]: ...
+
+    @abstractmethod
+    async def replace_messages(self, session_id: str, messages: List[LLMMessage], expected_version: int = None) -> bool: ...
+
+    @abstractmethod
+    async def update_state(self, session_id: str, **fields): ...
+
+    @abstractmethod
+    async def reset_state(self, session_id: str): ...
+
+    @abstractmethod
+    async def queue_response(self, session_id: str, response: AgentResponse): ...
+
+    @abstractmethod
+    async def drain_responses(self, session_id: str) -> List[AgentResponse]: ...
+
+    @abstractmethod
+    async def remove(self, session_id: str, reason: str = EVICT_CLOSED): ...
+
+    @abstractmethod
+    async def sweep(self) -> int: ...
+
+    @abstractmethod
+    async def stats(self) -> dict: ...
+
+    async def close(self):
+        pass
+
+
+class BlockingSessionStore(SessionStore):
+    """
+    Base for backends whose client blocks (SQLite, RespClient). Subclasses
+    implement the blocking _contains, _messages, ... methods, which must be
+    thread-safe; the coroutines run them with asyncio.to_thread, like the
+    response cache does, so a slow disk or a server that takes its full
+    timeout never stalls the event loop. Evictions made on a worker thread
+    reach the listeners on the loop.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._loop = None
+
+    async def _run(self, method, *args, **kwargs):
+        self._loop = asyncio.get_running_loop()
+        return await asyncio.to_thread(method, *args, **kwargs)
+
+    def _evicted(self, session_id: str, reason: str):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if self._loop is None or on_loop or self._loop.is_closed():
+            super()._evicted(session_id, reason)
+        else:
+            self._loop.call_soon_threadsafe(SessionStore._evicted, self, session_id, reason)
+
+    async def contains(self, session_id: str) -> bool:
+        return await self._run(self._contains, session_id)
+
+    async def count(self) -> int:
+        return await self._run(self._count)
+
+    async def messages(self, session_id: str) -> List[LLMMessage]:
+        return await self._run(self._messages, session_id)
+
+    async def version(self, session_id: str) -> int:
+        return await self._run(self._version, session_id)
+
+    async def get_state(self, session_id: str, key: str, default=None):
+        return await self._run(self._get_state, session_id, key, default)
+
+    async def touch(self, session_id: str):
+        await self._run(self._touch, session_id)
+
+    async def append_message(self, session_id: str, message: LLMMessage) -> List[LLMMessage]:
+        return await self._run(self._append_message, session_id, message)
+
+    async def replace_messages(self, session_id: str, messages: List[LLMMessage], expected_version: int = None) -> bool:
+        return await self._run(self._replace_messages, session_id, list(messages), expected_version)
+
+    async def update_state(self, session_id: str, **fields):
+        await self._run(self._update_state, session_id, **fields)
+
+    async def reset_state(self, session_id: str):
+        await self._run(self._reset_state, session_id)
+
+    async def queue_response(self, session_id: str, response: AgentResponse):
+        await self._run(self._queue_response, session_id, response)
+
+    async def drain_responses(self, session_id: str) -> List[AgentResponse]:
+        return await self._run(self._drain_responses, session_id)
+
+    async def remove(self, session_id: str, reason: str = EVICT_CLOSED):
+        await self._run(self._remove, session_id, reason)
+
+    async def sweep(self) -> int:
+        return await self._run(self._sweep)
+
+    async def stats(self) -> dict:
+        return await self._run(self._stats)
+
+    async def close(self):
+        await self._run(self._close)
+
+    @abstractmethod
+    def _contains(self, session_id: str) -> bool: ...
+
+    @abstractmethod
+    def _count(self) -> int: ...
+
+    @abstractmethod
+    def _messages(self, session_id: str) -> List[LLMMessage]: ...
+
+    @abstractmethod
+    def _version(self, session_id: str) -> int: ...
+
+    @abstractmethod
+    def _get_state(self, session_id: str, key: str, default=None): ...
+
+    @abstractmethod
+    def _touch(self, session_id: str): ...
+
+    @abstractmethod
+    def _append_message(self, session_id: str, message: LLMMessage) -> List[LLMMessage]: ...
+
+    @abstractmethod
+    def _replace_messages(self, session_id: str, messages: List[LLMMessage], expected_version: int = None) -> bool: ...
+
+    @abstractmethod
+    def _update_state(self, session_id: str, **fields): ...
+
+    @abstractmethod
+    def _reset_state(self, session_id: str): ...
+
+    @abstractmethod
+    def _queue_response(self, session_id: str, response: AgentResponse): ...
+
+    @abstractmethod
+    def _drain_responses(self, session_id: str) -> List[AgentResponse]: ...
+
+    @abstractmethod
+    def _remove(self, session_id: str, reason: str) -> bool: ...
+
+    @abstractmethod
+    def _sweep(self) -> int: ...
+
+    @abstractmethod
+    def _stats(self) -> dict: ...
+
+    @abstractmethod
+    def _close(self): ...
+
+
+class _Session:
+    def __init__(self, now: float):
+        self.messages: List[LLMMessage] = []
+        self.state: Dict[str, Any] = {}
+        self.responses: List[Any] = []
+        self.version = 0
+        self.last_active = now
+        self.message_bytes = 0
+        self.response_bytes = 0
+
+    @property
+    def bytes(self) -> int:
+        return self.message_bytes + self.response_bytes
+
+
+class InMemorySessionStore(SessionStore):
+    """SessionStore in this process's memory; returns the live message list."""
+
+    def __init__(
+        self,
+        max_sessions: int = 10_000,
+        idle_ttl: float = 30 * 60,
+        max_messages: int = 200,
+        max_session_bytes: int = 512 * 1024,
+        max_total_bytes: int = 256 * 1024 * 1024,
+        max_queued_responses: int = 20,
+        clock=time.monotonic,
+    ):
+        super().__init__()
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl
+        self._max_messages = max_messages
+        self._max_session_bytes = max_session_bytes
+        self._max_total_bytes = max_total_bytes
+        self._max_queued_responses = max_queued_responses
+        self._clock = clock
+
+        # Least recently active first.
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._total_bytes = 0
+
+    # Nothing here blocks, so the coroutines run inline.
+
+    async def contains(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    async def count(self) -> int:
+        return len(self._sessions)
+
+    # Reads
+
+    async def messages(self, session_id: str) -> List[LLMMessage]:
+        session = self._sessions.get(session_id)
+        return session.messages if session is not None else []
+
+    async def version(self, session_id: str) -> int:
+        session = self._sessions.get(session_id)
+        return session.version if session is not None else 0
+
+    async def get_state(self, session_id: str, key: str, default=None):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return default
+        return session.state.get(key, default)
+
+    # Writes
+
+    async def touch(self, session_id: str):
+        self._session(session_id)
+
+    async def append_message(self, session_id: str, message: LLMMessage) -> List[LLMMessage]:
+        session = self._session(session_id)
+        session.messages.append(message)
+        session.version += 1
+        self._resize(session, message_bytes=session.message_bytes + message_bytes(message))
+        self._trim(session)
+        return session.messages
+
+    async def replace_messages(self, session_id: str, messages: List[LLMMessage], expected_version: int = None) -> bool:
+        if expected_version is not None and await self.version(session_id) != expected_version:
+            return False
+        session = self._session(session_id)
+        session.messages = list(messages)
+        session.version += 1
+        self._resize(session, message_bytes=sum(message_bytes(m) for m in session.messages))
+        self._trim(session)
+        return True
+
+    async def update_state(self, session_id: str, **fields):
+        self._session(session_id).state.update(fields)
+
+    async def reset_state(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.state = {}
+
+    async def queue_response(self, session_id: str, response):
+        session = self._session(session_id)
+        session.responses.append(response)
+        del session.responses[:-self._max_queued_responses]
+        self._resize(session, response_bytes=sum(message_bytes(r) for r in session.responses))
+
+    async def drain_responses(self, session_id: str) -> List[Any]:
+        session = self._sessions.get(session_id)
+        if session is None or not session.responses:
+            return []
+        responses, session.responses = session.responses, []
+        self._resize(session, response_bytes=0)
+        return responses
+
+    async def remove(self, session_id: str, reason: str = EVICT_CLOSED):
+        self._remove(session_id, reason)
+
+    def _remove(self, session_id: str, reason: str):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        self._total_bytes -= session.bytes
+        self._evicted(session_id, reason)
+
+    async def sweep(self) -> int:
+        # Evicts sessions idle for longer than idle_ttl; returns how many.
+        cutoff = self._clock() - self._idle_ttl
+        expired = []
+        for session_id, session in self._sessions.items():
+            if session.last_active > cutoff:
+                break
+            expired.append(session_id)
+        for session_id in expired:
+            self._remove(session_id, EVICT_IDLE)
+        return len(expired)
+
+    def _session(self, session_id: str) -> _Session:
+        now = self._clock()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session(now)
+            while len(self._sessions) > self._max_sessions:
+                self._remove(next(iter(self._sessions)), EVICT_CAPACITY)
+        else:
+            session.last_active = now
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _resize(self, session: _Session, message_bytes: int = None, response_bytes: int = None):
+        before = session.bytes
+        if message_bytes is not None:
+            session.message_bytes = message_bytes
+        if response_bytes is not None:
+            session.response_bytes = response_bytes
+        self._total_bytes += session.bytes - before
+        # Evict other sessions, least recently active first, never the one just written.
+        while self._total_bytes > self._max_total_bytes and len(self._sessions) > 1:
+            oldest = next(iter(self._sessions))
+            if self._sessions[oldest] is session:
+                break
+            self._remove(oldest, EVICT_MEMORY)
+
+    def _trim(self, session: _Session):
+        messages = session.messages
+        if len(messages) <= self._max_messages and session.message_bytes <= self._max_session_bytes:
+            return
+        sizes = [message_bytes(m) for m in messages]
+        start, dropped = trim_range(messages[0], sizes, self._max_messages, self._max_session_bytes)
+        if dropped:
+            del messages[start:start + dropped]
+            self.messages_trimmed += dropped
+            self._resize(session, message_bytes=sum(sizes) - sum(sizes[start:start + dropped]))
+
+    async def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "max_sessions": self._max_sessions,
+            "bytes": self._total_bytes,
+            "max_total_bytes": self._max_total_bytes,
+            "messages": sum(len(s.messages) for s in self._sessions.values()),
+            "queued_responses": sum(len(s.responses) for s in self._sessions.values()),
+            "messages_trimmed": self.messages_trimmed,
+            "evictions": dict(self.evictions),
+        }
+
+
+def create_session_store(backend: str = "memory", url: str = None, **limits) -> SessionStore:
+    """
+    backend is "memory" (this process only), "sqlite" (url is a file path,
+    shared by workers on one machine) or "redis" (url is redis://host:port/db,
+    shared by workers anywhere).
+    """
+    if backend == "memory":
+        return InMemorySessionStore(**limits)
+    if backend == "sqlite":
+        from app.sessions.sqlite_store import SQLiteSessionStore
+        return SQLiteSessionStore(url or "sessions.db", **limits)
+    if backend == "redis":
+        from app.sessions.redis_store import RedisSessionStore
+        return RedisSessionStore(url or "redis://127.0.0.1:6379/0", **limits)
+    raise ValueError(f"Unknown session backend: {backend}")
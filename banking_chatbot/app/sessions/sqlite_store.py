@@ -0,0 +1,287 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+from autogen_core.models import LLMMessage
+
+from app.messages.message_types import AgentResponse
+from app.sessions.session_store import (
+    EVICT_CAPACITY,
+    EVICT_CLOSED,
+    EVICT_IDLE,
+    EVICT_MEMORY,
+    BlockingSessionStore,
+    dump_message,
+    dump_response,
+    load_message,
+    load_response,
+    trim_range,
+)
+
+
+class SQLiteSessionStore(BlockingSessionStore):
+    """
+    SessionStore in one SQLite file in WAL mode, so several uvicorn workers on
+    the same machine can serve the same sessions. Each write is one
+    IMMEDIATE transaction. Timestamps are wall-clock so all workers agree on
+    idleness. The total byte budget is enforced by sweep().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_sessions: int = 10_000,
+        idle_ttl: float = 30 * 60,
+        max_messages: int = 200,
+        max_session_bytes: int = 512 * 1024,
+        max_total_bytes: int = 256 * 1024 * 1024,
+        max_queued_responses: int = 20,
+        clock=time.time,
+    ):
+        super().__init__()
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl
+        self._max_messages = max_messages
+        self._max_session_bytes = max_session_bytes
+        self._max_total_bytes = max_total_bytes
+        self._max_queued_responses = max_queued_responses
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL DEFAULT '{}', version INTEGER NOT NULL DEFAULT 0, "
+            "last_active REAL NOT NULL, message_bytes INTEGER NOT NULL DEFAULT 0, "
+            "response_bytes INTEGER NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions(last_active);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, body TEXT NOT NULL, size INTEGER NOT NULL, "
+            "PRIMARY KEY (session_id, seq)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, body TEXT NOT NULL, size INTEGER NOT NULL, "
+            "PRIMARY KEY (session_id, seq)) WITHOUT ROWID;"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        # Yields a list to collect (session_id, reason) evictions; listeners run
+        # after the commit, outside the lock.
+        evicted = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield evicted
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        for session_id, reason in evicted:
+            self._evicted(session_id, reason)
+
+    def _query(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _contains(self, session_id: str) -> bool:
+        return bool(self._query("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)))
+
+    def _count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM sessions")[0][0]
+
+    def _messages(self, session_id: str) -> List[LLMMessage]:
+        rows = self._query("SELECT body FROM messages WHERE session_id = ? ORDER BY seq", (session_id,))
+        return [load_message(body) for body, in rows]
+
+    def _version(self, session_id: str) -> int:
+        rows = self._query("SELECT version FROM sessions WHERE session_id = ?", (session_id,))
+        return rows[0][0] if rows else 0
+
+    def _get_state(self, session_id: str, key: str, default=None):
+        rows = self._query("SELECT state FROM sessions WHERE session_id = ?", (session_id,))
+        if not rows:
+            return default
+        return json.loads(rows[0][0]).get(key, default)
+
+    def _touch(self, session_id: str):
+        with self._transaction() as evicted:
+            self._session(session_id, evicted)
+
+    def _append_message(self, session_id: str, message: LLMMessage) -> List[LLMMessage]:
+        body = dump_message(message)
+        with self._transaction() as evicted:
+            self._session(session_id, evicted)
+            self._conn.execute(
+                "INSERT INTO messages (session_id, seq, body, size) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM messages WHERE session_id = ?",
+                (session_id, body, len(body), session_id),
+            )
+            self._conn.execute(
+                "UPDATE sessions SET version = version + 1, message_bytes = message_bytes + ? WHERE session_id = ?",
+                (len(body), session_id),
+            )
+            self._trim(session_id)
+        return self._messages(session_id)
+
+    def _replace_messages(self, session_id: str, messages: List[LLMMessage], expected_version: int = None) -> bool:
+        bodies = [dump_message(m) for m in messages]
+        with self._transaction() as evicted:
+            if expected_version is not None:
+                row = self._conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                if (row[0] if row else 0) != expected_version:
+                    return False
+            self._session(session_id, evicted)
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, seq, body, size) VALUES (?, ?, ?, ?)",
+                [(session_id, seq, body, len(body)) for seq, body in enumerate(bodies, start=1)],
+            )
+            self._conn.execute(
+                "UPDATE sessions SET version = version + 1, message_bytes = ? WHERE session_id = ?",
+                (sum(len(body) for body in bodies), session_id),
+            )
+            self._trim(session_id)
+        return True
+
+    def _update_state(self, session_id: str, **fields):
+        with self._transaction() as evicted:
+            self._session(session_id, evicted)
+            state = json.loads(
+                self._conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()[0]
+            )
+            state.update(fields)
+            self._conn.execute("UPDATE sessions SET state = ? WHERE session_id = ?", (json.dumps(state), session_id))
+
+    def _reset_state(self, session_id: str):
+        with self._transaction():
+            self._conn.execute("UPDATE sessions SET state = '{}' WHERE session_id = ?", (session_id,))
+
+    def _queue_response(self, session_id: str, response: AgentResponse):
+        body = dump_response(response)
+        with self._transaction() as evicted:
+            self._session(session_id, evicted)
+            self._conn.execute(
+                "INSERT INTO responses (session_id, seq, body, size) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM responses WHERE session_id = ?",
+                (session_id, body, len(body), session_id),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE session_id = ? AND seq NOT IN "
+                "(SELECT seq FROM responses WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                (session_id, session_id, self._max_queued_responses),
+            )
+            self._conn.execute(
+                "UPDATE sessions SET response_bytes = "
+                "(SELECT COALESCE(SUM(size), 0) FROM responses WHERE session_id = ?) WHERE session_id = ?",
+                (session_id, session_id),
+            )
+
+    def _drain_responses(self, session_id: str) -> List[AgentResponse]:
+        with self._transaction():
+            rows = self._conn.execute(
+                "SELECT body FROM responses WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+            if rows:
+                self._conn.execute("DELETE FROM responses WHERE session_id = ?", (session_id,))
+                self._conn.execute("UPDATE sessions SET response_bytes = 0 WHERE session_id = ?", (session_id,))
+        return [load_response(body) for body, in rows]
+
+    def _remove(self, session_id: str, reason: str = EVICT_CLOSED) -> bool:
+        with self._transaction() as evicted:
+            self._delete(session_id, reason, evicted)
+        return bool(evicted)
+
+    def _sweep(self) -> int:
+        cutoff = self._clock() - self._idle_ttl
+        with self._transaction() as evicted:
+            for session_id, in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_active < ?", (cutoff,)
+            ).fetchall():
+                self._delete(session_id, EVICT_IDLE, evicted)
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(message_bytes + response_bytes), 0) FROM sessions"
+            ).fetchone()[0]
+            if total > self._max_total_bytes:
+                for session_id, size in self._conn.execute(
+                    "SELECT session_id, message_bytes + response_bytes FROM sessions ORDER BY last_active"
+                ).fetchall():
+                    if total <= self._max_total_bytes:
+                        break
+                    self._delete(session_id, EVICT_MEMORY, evicted)
+                    total -= size
+        return len(evicted)
+
+    def _session(self, session_id: str, evicted: list):
+        # Inside a transaction: creates or refreshes the session.
+        now = self._clock()
+        created = self._conn.execute(
+            "INSERT OR IGNORE INTO sessions (session_id, last_active) VALUES (?, ?)", (session_id, now)
+        ).rowcount
+        if not created:
+            self._conn.execute("UPDATE sessions SET last_active = ? WHERE session_id = ?", (now, session_id))
+            return
+        excess = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self._max_sessions
+        if excess > 0:
+            for oldest, in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE session_id != ? ORDER BY last_active LIMIT ?",
+                (session_id, excess),
+            ).fetchall():
+                self._delete(oldest, EVICT_CAPACITY, evicted)
+
+    def _delete(self, session_id: str, reason: str, evicted: list):
+        if self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount:
+            evicted.append((session_id, reason))
+        self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM responses WHERE session_id = ?", (session_id,))
+
+    def _trim(self, session_id: str):
+        count, size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if count <= self._max_messages and size <= self._max_session_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT seq, size FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        first = self._conn.execute(
+            "SELECT body FROM messages WHERE session_id = ? AND seq = ?", (session_id, rows[0][0])
+        ).fetchone()[0]
+        start, dropped = trim_range(
+            load_message(first), [size for _, size in rows], self._max_messages, self._max_session_bytes
+        )
+        if not dropped:
+            return
+        doomed = rows[start:start + dropped]
+        self._conn.executemany(
+            "DELETE FROM messages WHERE session_id = ? AND seq = ?", [(session_id, seq) for seq, _ in doomed]
+        )
+        self._conn.execute(
+            "UPDATE sessions SET message_bytes = message_bytes - ? WHERE session_id = ?",
+            (sum(size for _, size in doomed), session_id),
+        )
+        self.messages_trimmed += dropped
+
+    def _stats(self) -> dict:
+        sessions, size = self._query(
+            "SELECT COUNT(*), COALESCE(SUM(message_bytes + response_bytes), 0) FROM sessions"
+        )[0]
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "max_sessions": self._max_sessions,
+            "bytes": size,
+            "max_total_bytes": self._max_total_bytes,
+            "messages": self._query("SELECT COUNT(*) FROM messages")[0][0],
+            "queued_responses": self._query("SELECT COUNT(*) FROM responses")[0][0],
+            "messages_trimmed": self.messages_trimmed,
+            "evictions": dict(self.evictions),
+        }
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()